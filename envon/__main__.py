@@ -1,19 +1,23 @@
+import sys
 
-from .cli      import parse_args
-from .assembly import disassemble_file
-from .analysis import Analysis, Optimizer
-from .graph    import make_graph_file, make_graph_memory_file
-from .pick     import print_instructions
+from .cli import parse_args
+from .run import run, run_batch
 
-fi, fo, skip, kje, pick = parse_args()
-ens = disassemble_file(fi)
-a   = Analysis()
-a.analyze(ens, skip, kje)
-o   = Optimizer()
-o.optimize(a)
+from envon.helpers import Log
 
-make_graph_file(a)
-make_graph_memory_file(a.get_entry_block().get_memphi())
+log = Log('envon')
 
-if pick:
-    print_instructions(fo, a, pick)
+fi, fo, skip, kje, pick, batch, cache, profile, budget = parse_args()
+
+if batch is not None:
+    jobs, workers = batch
+    failed = run_batch(jobs, workers, skip, pick, cache, profile, budget)
+else:
+    failed = 0
+    run(fi, fo, skip, kje, pick, cache, profile, budget)
+
+if cache is not None:
+    log.info('Result cache hits', cache.hits, 'misses', cache.misses)
+
+if failed:
+    sys.exit(1)
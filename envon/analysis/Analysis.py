@@ -2,26 +2,57 @@
 from bisect import bisect_right
 
 from .BasicBlock   import BasicBlock
+from .Valuation    import ValuationIds
 from .instructions import Instruction, Constant
-from .events       import events
+from .events       import Events
 
+from envon.assembly                import Disassembly
+from envon.assembly.EvmInstruction import (
+    instruction_list, OPCODES_TERMINATOR, OPCODE_JUMPDEST, OPCODE_POP,
+    OPCODE_PUSH1, OPCODE_PUSH32, OPCODE_DUP1, OPCODE_DUP16, OPCODE_SWAP1, OPCODE_SWAP16,
+)
 from envon.helpers import Log
 
 log = Log(__name__)
 
+STACK_LIMIT = 1024
+
 class Analysis:
 
     def __init__(self):
-        self._blocks     = []
-        self._block_list = []
-        self._block_map  = {}
-        self._known_cfg  = False
+        self._blocks           = []
+        self._block_list       = []
+        self._block_map        = {}
+        self._known_cfg        = False
+        self._known_jumps      = []
+        # set by the optimizer when it ran out of budget, see Optimizer.optimize
+        self.partial           = None
+        self.unresolved_jumps  = []
+        # set by the optimizer while it runs, see Reachability
+        self.reachability      = None
+        # The state of this analysis that would otherwise be global, so that many analyses can run
+        # one after the other or interleaved in one process and each one gives the same output
+        self.events            = Events()       # see the 'New PHI' event
+        self.valuation_ids     = ValuationIds()
+        self.latest_generation = object()       # see latest_valuation
+        self.latest_hops       = None           # see latest_valuation, a dict while profiling
+        self.graph_count       = 0              # see graph._make_graph_file
+        self._next_id          = 0              # of instructions, valuations are identified by them
 
     def __iter__(self):
         for b in self._blocks:
             if not b.skip:
                 yield b
 
+    def new_id(self):
+        i = self._next_id
+        self._next_id = i + 1
+        return i
+
+    def valuations_changed(self):
+        # a node got a new valuation, which drops the cached lookups of latest_valuation
+        self.latest_generation = object()
+
     def get_entry_block(self):
         return self._blocks[0]
 
@@ -53,20 +84,24 @@ class Analysis:
 
     def analyze(self, ens, allow_skip, known_jump_edges):
         assert not self._blocks
+        if not isinstance(ens, Disassembly):
+            ens = Disassembly.from_instructions(ens)
         self._prepare_basic_blocks(ens)
         self._fill_blocks(ens, allow_skip)
         self._link_fallthroughs()
         if known_jump_edges is not None:
-            self._known_cfg = True
+            self._known_cfg   = True
+            self._known_jumps = known_jump_edges
             self._link_known_jumps(known_jump_edges)
+            self._infer_stack_heights()
         self._refresh_phis()
 
-    def _prepare_basic_blocks(self, ens):
+    def _prepare_basic_blocks(self, dis):
         breaks = [0]
-        for en in ens:
-            if   en.is_jumpdest():   breaks.append(en.offset())
-            elif en.is_terminator(): breaks.append(en.offset() + en.size())
-        breaks.append(ens[-1].offset() + ens[-1].size())
+        for offset, op in zip(dis.offsets, dis.opcodes):
+            if   op == OPCODE_JUMPDEST:     breaks.append(offset)
+            elif op in OPCODES_TERMINATOR: breaks.append(offset + 1) # none of them is a PUSH
+        breaks.append(dis.end())
         #
         begins = iter(breaks)
         ends   = iter(breaks)
@@ -78,22 +113,27 @@ class Analysis:
                 self._block_list.append(i0)
                 self._block_map[i0] = b
 
-    def _fill_blocks(self, ens, allow_skip):
-        l = len(ens)
+    def _fill_blocks(self, dis, allow_skip):
+        offsets = dis.offsets
+        opcodes = dis.opcodes
+        l = len(dis)
         j = 0
         for b in self:
-            while j < l and ens[j].offset() < b.offset: j += 1
+            while j < l and offsets[j] < b.offset: j += 1
             while j < l:
-                en = ens[j]
-                if en.offset() >= b.end: break
+                if offsets[j] >= b.end: break
+                op = opcodes[j]
                 j += 1
                 #
-                if   en.is_jumpdest():                           continue
-                elif en.is_pop():      b.stack.pop();            continue
-                elif en.is_dup():      b.stack.dup( -en.pops()); continue
-                elif en.is_swap():     b.stack.swap(-en.pops()); continue
-                elif en.is_push():     n = Constant(   en, b, en.push_value())
-                else:                  n = Instruction(en, b)
+                # Only the instructions that become nodes need an EvmInstruction
+                if   op == OPCODE_JUMPDEST:               continue
+                elif op == OPCODE_POP:                    b.stack.pop();                            continue
+                elif OPCODE_DUP1  <= op <= OPCODE_DUP16:  b.stack.dup( -instruction_list[op][2]);   continue
+                elif OPCODE_SWAP1 <= op <= OPCODE_SWAP16: b.stack.swap(-instruction_list[op][2]);   continue
+                #
+                en = dis.instruction(j-1)
+                if OPCODE_PUSH1 <= op <= OPCODE_PUSH32:   n = Constant(   en, b, en.push_value())
+                else:                                     n = Instruction(en, b)
                 #
                 if en.needs_memory():
                     n.append_arg(b.get_mem())
@@ -113,6 +153,10 @@ class Analysis:
                 if allow_skip and en.is_rare():
                     b.skip = True
 
+    def _links_fallthrough(self, b):
+        # What _link_fallthroughs did for a block, it runs before the cfg is marked as known
+        return b is not self._blocks[-1] and not (b.ns and b.ns[-1].en().stops_fallthrough())
+
     def _link_fallthroughs(self):
         bs = list(self)
         if bs[-1] is self._blocks[-1]: bs.pop()
@@ -139,6 +183,114 @@ class Analysis:
             if b2 is None:
                 log.warning(f'Could not add known jump from {src:x} ({b}) to {dst:x} ({b2})')
 
+    def add_known_jumps(self, known_jump_edges):
+        # Continues a converged analysis with a longer list of known jumps (the old ones and some new ones),
+        # see Optimizer.resume. Blocks the optimizer killed as unreachable are revived when a new edge reaches them.
+        # Returns the blocks with new in-edges and the revived blocks, or None if an old edge is missing,
+        # a new one involves a block that is skipped for another reason or it breaks the inferred stack heights,
+        # as then the analysis has to start over.
+        if not self._known_cfg:
+            return None
+        old = set(map(tuple, self._known_jumps))
+        if not old <= set(map(tuple, known_jump_edges)):
+            return None
+        #
+        ranks = {} # (src block, dst block) -> index of the first such edge, as this is the order a fresh analysis links them
+        outs  = {} # src block -> dst offsets, to link the revived blocks
+        new   = []
+        for i, [src, dst] in enumerate(known_jump_edges):
+            b = self.get_block_containing(src)
+            if b is None:
+                continue
+            b2 = self.get_block_at(dst)
+            ranks.setdefault((b, b2), i)
+            outs.setdefault(b, []).append(dst)
+            if (src, dst) not in old:
+                if b.skip and not b.killed:                        return None
+                if b2 is not None and b2.skip and not b2.killed:   return None
+                new.append((b, dst))
+        heights = self._raised_stack_heights(new, outs)
+        if heights is None:
+            return None
+        for b, h in heights.items():
+            b.max_height = h
+        self._known_jumps = known_jump_edges
+        #
+        changed = []
+        revived = []
+        # Blocks killed because their jump had no valuation still have live in-edges, they may get one now
+        wl = [b for b in self._blocks if b.killed and any(not b2.skip for b2 in b.in_edges())]
+        for b, dst in new:
+            if not b.skip: # otherwise linked if it is revived
+                wl.append(self._link_known_jump(b, dst, changed))
+        while wl:
+            b = wl.pop()
+            if b is not None and b.killed:
+                b.killed = False
+                b.skip   = False
+                revived.append(b)
+                if self._links_fallthrough(b):
+                    wl.append(self._link_known_jump(b, b.end, changed))
+                for dst in outs.get(b, ()):
+                    wl.append(self._link_known_jump(b, dst, changed))
+        #
+        for b2 in changed:
+            b2.sort_in_edges(lambda b: -1 if b.end == b2.offset and self._links_fallthrough(b) else ranks.get((b, b2), len(known_jump_edges))) # pylint: disable=cell-var-from-loop
+        #
+        log.info('Added', len(new), 'known jumps,', len(changed), 'blocks with new in-edges,', len(revived), 'revived')
+        return changed, revived
+
+    def _raised_stack_heights(self, new, outs):
+        # The stack heights (see _infer_stack_heights) that the new edges raise, along the whole known cfg,
+        # or None if the results of _infer_stack_heights would not hold anymore and the analysis has to start over:
+        #  - a new edge reaches a block that reads the stack of its only predecessor, as it would need stack PHIs
+        #    now, e.g. the first call from another place to an internal function that had a single caller, or the
+        #    first return to another place from it
+        #  - the height of a block that read below it rises, as its dummies (underflows) may be real values now
+        # A height that rises anywhere else only raises the heights after it, the PHIs stay as they are.
+        # Without skip this is what most fallbacks are, with skip most are new edges to skipped blocks.
+        def successors(b):
+            res = [self.get_block_at(dst) for dst in outs.get(b, ())]
+            if self._links_fallthrough(b):
+                res.append(self.get_block_at(b.end))
+            return res
+        #
+        heights = {}
+        wl      = []
+        for b, dst in new:
+            b2 = self.get_block_at(dst)
+            if b2 is not None and b2.stack_from() is not None:
+                return None
+            wl.append(b)
+        while wl:
+            b = wl.pop()
+            h = heights.get(b, b.max_height)
+            if h is None or b.skip and not b.killed:
+                continue
+            h = min(h + b.stack.delta(), STACK_LIMIT)
+            if h < 0:
+                continue
+            for b2 in successors(b):
+                if b2 is None:
+                    continue
+                h2 = heights.get(b2, b2.max_height)
+                if h2 is None or h > h2:
+                    if b2.max_height is not None and b2.stack.depth() > b2.max_height:
+                        return None
+                    heights[b2] = h
+                    wl.append(b2)
+        return heights
+
+    def _link_known_jump(self, b, dst, changed):
+        b2 = self.get_block_at(dst)
+        if b2 is None or b2 == b.fallthrough_edge() or b2 in b.jump_edges():
+            return None
+        if dst == b.end: b.set_fallthrough()
+        else:            b.add_jump_to(dst)
+        if b2 not in changed:
+            changed.append(b2)
+        return b2
+
     def _link_some_jumps(self):
         for b in self:
             if b.ns:
@@ -147,9 +299,62 @@ class Analysis:
                     for dst in last.get_arg(0).some_possible_values():
                         b.add_jump_to(dst)
 
+    def _infer_stack_heights(self):
+        # With a known cfg, before the PHIs are refreshed:
+        # The highest stack at the start of each block is found along the edges from the entry block.
+        # Reading below it is a stack underflow, so such a slot is a dummy instead of a PHI that digs
+        # through the predecessors (and around loops, up to StackPhiLoopBreaker).
+        # A block with a single in-edge reads its buried slots right from the stack of that predecessor,
+        # so only the blocks where edges merge get stack PHIs.
+        entry            = self.get_entry_block()
+        entry.max_height = 0
+        wl = [entry]
+        while wl:
+            b = wl.pop()
+            h = min(b.max_height + b.stack.delta(), STACK_LIMIT)
+            if h < 0 or b.skip:
+                continue # any path through b underflows or is cut
+            for b2 in b.out_edges():
+                if b2.max_height is None or h > b2.max_height:
+                    b2.max_height = h
+                    wl.append(b2)
+        #
+        children = {}
+        wl       = []
+        for b in reversed(list(self)):
+            if b.max_height is None:
+                continue
+            ins = list(b.in_edges())
+            if b is not entry and len(ins) == 1: children.setdefault(ins[0], []).append(b)
+            else:                                wl.append(b)
+        # parents first, so blocks that only single in-edges reach (a cycle) are not reached and keep their PHIs
+        evs     = self.events.get_and_clear()
+        removed = set()
+        direct  = 0
+        while wl:
+            b = wl.pop()
+            for b2 in children.get(b, ()):
+                b2.set_stack_from(b)
+                wl.append(b2)
+                direct += 1
+            for phi in list(b.phis()):
+                if phi.is_memphi():
+                    continue
+                sp = phi.sp()
+                if   -sp > b.max_height:        n = b.create_stack_phi(sp)
+                elif b.stack_from() is not None: n = b.stack_from().stack.get(sp)
+                else:                           continue
+                b.replace_stack_phi(phi, n)
+                removed.add(phi)
+        # the PHIs that are left and the ones made in the predecessors meanwhile still need a refresh
+        for ev in evs + self.events.get_and_clear():
+            if ev[1] not in removed:
+                self.events.new_event(ev)
+        log.info('Replaced', len(removed), 'stack PHIs,', direct, 'blocks read the stack of their only predecessor')
+
     def _refresh_phis(self):
         while True:
-            evs = events.get_and_clear()
+            evs = self.events.get_and_clear()
             if not evs: return
             for ev in evs:
                 assert ev[0] == 'New PHI' # only these events should have happened so early
@@ -0,0 +1,46 @@
+import io
+
+from .Analysis import Analysis
+from .optimize import Optimizer
+
+from envon.assembly import disassemble_compact
+from envon.pick     import print_instructions
+
+# A loop that keeps its counter on the stack, and an internal function called from three places
+CONTRACTS = (
+    '60005b8054600101815560010180600a116002575000',
+    '60003580601357600e60056033565b600055005b600103602657602160076033565b600155005b602e60096033565b600255005b549056',
+)
+PICK = {'SLOAD': (None, -1), 'SSTORE': (None, -1)}
+
+def _known_jump_edges(runbin):
+    a = Analysis()
+    a.analyze(disassemble_compact(runbin), False, None)
+    Optimizer().optimize(a)
+    return [
+        [b.get_jump().en().offset(), b2.offset]
+        for b in a
+        if  b.get_jump() is not None
+        for b2 in b.out_edges()
+    ]
+
+def _analyze(runbin, kje, infer):
+    a = Analysis()
+    if not infer:
+        a._infer_stack_heights = lambda: None # pylint: disable=protected-access
+    a.analyze(disassemble_compact(runbin), False, kje)
+    phis = sum(1 for b in a for phi in b.phis() if not phi.is_memphi())
+    Optimizer().optimize(a)
+    fo = io.StringIO()
+    print_instructions(fo, a, PICK)
+    return phis, fo.getvalue()
+
+def infer_stack_heights_test():
+    # With a known cfg the stack heights replace stack PHIs, without changing the output
+    for code in CONTRACTS:
+        runbin = bytes.fromhex(code)
+        kje    = _known_jump_edges(runbin)
+        phis,  out  = _analyze(runbin, kje, True)
+        phis0, out0 = _analyze(runbin, kje, False)
+        assert phis < phis0
+        assert out == out0
@@ -8,6 +8,11 @@ from envon.helpers import Log
 
 log = Log(__name__)
 
+def _unpickle_block(offset):
+    b        = BasicBlock.__new__(BasicBlock)
+    b.offset = offset
+    return b
+
 class BasicBlock:
 
     def __init__(self, analysis, offset, end):
@@ -21,6 +26,7 @@ class BasicBlock:
         self.offset            = offset
         self.end               = end
         self.skip              = False
+        self.killed            = False
         self._in_edges         = []
         self._fallthrough_edge = None
         self._jump_edges       = set()
@@ -28,6 +34,9 @@ class BasicBlock:
         self.marked_ints       = set()
         self.marked_ons        = None
         self.marked_avail_ons  = None
+        # with a known cfg, see Analysis._infer_stack_heights
+        self.max_height        = None # the highest the stack can be at the start, None if not known
+        self._stack_from       = None # the only predecessor, whose stack the buried slots are read from
 
     def __repr__(self):
         return f'~{self.offset:x}'
@@ -35,6 +44,15 @@ class BasicBlock:
     def __iter__(self):
         return iter(self.ns)
 
+    def __hash__(self):
+        # Sets of blocks must iterate in the same order in every process (not by address),
+        # otherwise instruction ids, and thus valuation hashes, depend on the heap layout
+        return self.offset
+
+    def __reduce__(self):
+        # see Instruction.__reduce__
+        return _unpickle_block, (self.offset,), self.__dict__
+
     def new_instruction_id(self):
         i = self._id_counter
         self._id_counter = i + 1
@@ -43,12 +61,33 @@ class BasicBlock:
     def phis(self):
         return iter(self._phis)
 
+    def built_phis(self):
+        # the PHIs whose args follow the in-edges, the rest wait for their first refresh
+        return [phi for phi in self._phis if phi.args_built()]
+
     def _add_phi(self, phi):
         self._phis.append(phi)
         self.ns.appendleft(phi)
 
+    def replace_stack_phi(self, phi, n):
+        # Replaces a PHI that has no args yet with n, in the instructions and the stack of this block
+        for u in list(phi.uses()):
+            u.replace_arg(phi, n)
+        self.stack.replace(phi, n)
+        self._phis.remove(phi)
+        self.ns.remove(phi)
+
+    def stack_from(self):
+        return self._stack_from
+
+    def set_stack_from(self, b):
+        self._stack_from = b
+
     def create_stack_phi(self, sp):
-        if self.offset == 0: return DummyInstruction(self)
+        # sp is below the start of the block, at or beyond the deepest possible stack it is an underflow
+        if   self.offset == 0:                                      return DummyInstruction(self)
+        elif self.max_height is not None and -sp > self.max_height: return DummyInstruction(self)
+        elif self._stack_from is not None:                          return self._stack_from.stack.get(sp)
         else:
             if sp >= -90: phi = StackPhi(           self, sp)
             else:         phi = StackPhiLoopBreaker(self, sp) # arbitrarily stop stack dig loops
@@ -85,14 +124,29 @@ class BasicBlock:
         assert src not in self._in_edges
         self._in_edges.append(src)
         log.debug('!! NEW IN EDGE !!', src, self)
+        r = self._analysis.reachability
+        if r is not None:
+            r.edge_added(src, self)
+        # each PHI only gets the arg of the new edge, instead of rebuilding all of them
+        for phi in self._phis:
+            phi.edge_added(src)
+
+    def sort_in_edges(self, key):
+        edges          = self._in_edges
+        order          = sorted(range(len(edges)), key=lambda i: key(edges[i]))
+        self._in_edges = [edges[i] for i in order]
         for phi in self._phis:
-            phi.refresh()
+            phi.edges_reordered(order)
 
     def forget_edge(self, src):
-        self._in_edges.remove(src)
+        i = self._in_edges.index(src)
+        del self._in_edges[i]
         log.debug('!! REMOVED IN EDGE !!', src, self)
+        r = self._analysis.reachability
+        if r is not None:
+            r.edge_removed(src, self)
         for phi in self._phis:
-            phi.refresh()
+            phi.edge_removed(i)
 
     def add_jump_to(self, offset):
         b = self._analysis.get_block_at(offset)
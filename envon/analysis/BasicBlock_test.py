@@ -0,0 +1,57 @@
+import random
+
+from .Analysis     import Analysis
+from .instructions import DummyInstruction
+
+from envon.assembly import disassemble_compact
+
+# A loop and an internal function called from three places, both with stack PHIs
+CONTRACTS = (
+    '60005b8054600101815560010180600a116002575000',
+    '60003580601357600e60056033565b600055005b600103602657602160076033565b600155005b602e60096033565b600255005b549056',
+)
+
+def _build_phis(a):
+    # refreshing a PHI can create PHIs in the blocks before it
+    todo = True
+    while todo:
+        todo = False
+        for b in a:
+            for phi in list(b.phis()):
+                if not phi.args_built():
+                    phi.refresh()
+                    todo = True
+
+def _args(phi):
+    # the args of loop breakers are new dummies each time
+    return [DummyInstruction if type(n) is DummyInstruction else n for n in phi.args()]
+
+def _check_phis(a):
+    for b in a:
+        for phi in b.built_phis():
+            args = _args(phi)
+            assert phi.args_count() == len(list(b.in_edges()))
+            assert all(phi in list(n.uses()) for n in phi.args())
+            phi.refresh()
+            assert args == _args(phi), (phi, args, _args(phi))
+
+def edges_keep_phi_args_test():
+    # The PHI args kept in sync one edge at a time are the ones a refresh builds from all the in-edges
+    rnd = random.Random(1)
+    for code in CONTRACTS:
+        a = Analysis()
+        a.analyze(disassemble_compact(bytes.fromhex(code)), False, None)
+        _build_phis(a)
+        bs = list(a)
+        assert any(b.built_phis() for b in bs)
+        for _ in range(300):
+            b   = rnd.choice(bs)
+            out = b.out_edges()
+            b2  = rnd.choice(bs)
+            x   = rnd.random()
+            if   x < 0.4 and out: b.remove_edge(rnd.choice(out))
+            elif x < 0.7:         b.sort_in_edges(lambda e: rnd.random())
+            elif b2 not in out:   b.add_jump_to(b2.offset)
+            if rnd.random() < 0.2:
+                _check_phis(a)
+        _check_phis(a)
@@ -0,0 +1,185 @@
+from bisect import bisect_left
+
+# Segments per chunk, see MemoryMap
+CHUNK = 32
+
+# Segments are (start, end, node, origin) tuples and starts are unique, so bisecting a sorted list of segments
+# for (addr,) finds the first one that starts at or after addr, without ever comparing nodes.
+# The same goes for a list of chunks and ((addr,),).
+
+def _cut(segs, addr):
+    # Makes addr a segment boundary and returns the index of the first segment at or after it
+    i = bisect_left(segs, (addr,))
+    if i > 0:
+        s, e, n, o = segs[i-1]
+        if e > addr:
+            segs[i-1] = (s, addr, n, o)
+            segs.insert(i, (addr, e, n, o))
+    return i
+
+def _clear(segs, start, end):
+    # end None for everything from start on
+    i = _cut(segs, start)
+    j = _cut(segs, end) if end is not None else len(segs)
+    del segs[i:j]
+    return i
+
+def _store(segs, start, end, n, origin):
+    i = _clear(segs, start, end)
+    # merge with the neighbours that continue the same word
+    if i < len(segs):
+        s2, e2, n2, o2 = segs[i]
+        if s2 == end and n2 is n and o2 == origin:
+            end = e2
+            del segs[i]
+    if i > 0:
+        s2, e2, n2, o2 = segs[i-1]
+        if e2 == start and n2 is n and o2 == origin:
+            segs[i-1] = (s2, end, n, origin)
+            return
+    segs.insert(i, (start, end, n, origin))
+
+class MemoryMap:
+    # The known memory contents of a Mempad, as sorted non-overlapping segments (start, end, node, origin):
+    # each address i in [start, end) holds byte i - origin of the word computed by node.
+    # Adjacent segments of the same node and origin are always merged, so equal contents have equal segments.
+    # Solidity mostly stores aligned words, which take one segment each instead of 32 bytes.
+    #
+    # Every memory writing instruction starts from a copy of the previous contents, so the segments are kept
+    # in immutable chunks of up to CHUNK segments that copies share. A copy only shares the list of chunks,
+    # which is copied on its first change, and a change rebuilds only the chunks it touches.
+
+    __slots__ = ('_chunks', '_owned')
+
+    def __init__(self, chunks=None):
+        self._chunks = [] if chunks is None else chunks # tuples of segments
+        self._owned  = chunks is None
+
+    def __len__(self):
+        # known bytes
+        return sum(e - s for s, e, _, _ in self._iter())
+
+    def copy(self):
+        self._owned = False
+        return MemoryMap(self._chunks)
+
+    def segments(self):
+        return tuple(self._iter())
+
+    def _iter(self, ci=0, j=0):
+        chunks = self._chunks
+        for c in range(ci, len(chunks)):
+            segs = chunks[c]
+            for k in range(j, len(segs)):
+                yield segs[k]
+            j = 0
+
+    def _find(self, addr):
+        # The chunk and index of the last segment that starts at or before addr, clamped to the first one
+        ci = bisect_left(self._chunks, ((addr + 1,),)) - 1
+        if ci < 0:
+            return 0, 0
+        j = bisect_left(self._chunks[ci], (addr + 1,)) - 1
+        return ci, max(j, 0)
+
+    def _change(self, start, end, f, *args):
+        # Applies f to the flat segments of the chunks that [start, end] touches, including the neighbours
+        # that may be merged, and replaces those chunks. end None for everything from start on.
+        if not self._owned:
+            self._chunks = self._chunks.copy()
+            self._owned  = True
+        chunks = self._chunks
+        ci     = bisect_left(chunks, ((start,),)) - 1
+        if ci < 0:
+            ci = 0
+        if end is not None and (ci + 1 >= len(chunks) or chunks[ci+1][0][0] > end):
+            # the common case, a single chunk
+            if not chunks:
+                segs = []
+                f(segs, *args)
+                chunks.append(tuple(segs))
+                return
+            segs = list(chunks[ci])
+            f(segs, *args)
+            if 0 < len(segs) <= CHUNK:
+                chunks[ci] = tuple(segs)
+                return
+            cj = ci + 1
+        else:
+            cj   = len(chunks) if end is None else bisect_left(chunks, ((end + 1,),))
+            segs = []
+            for c in range(ci, cj):
+                segs.extend(chunks[c])
+            f(segs, *args)
+        chunks[ci:cj] = [tuple(segs[k:k+CHUNK]) for k in range(0, len(segs), CHUNK)]
+
+    def clear(self, start, end=None):
+        # end None for everything from start on
+        if end is not None and end <= start:
+            return
+        if self._chunks:
+            self._change(start, end, _clear, start, end)
+
+    def clear_all(self):
+        self._chunks = []
+        self._owned  = True
+
+    def store(self, start, end, n, origin):
+        if end <= start:
+            return
+        self._change(start, end, _store, start, end, n, origin)
+
+    def load_word(self, addr, size):
+        # The node whose word fills [addr, addr + size) from its first byte, or None
+        chunks = self._chunks
+        ci     = bisect_left(chunks, ((addr + 1,),)) - 1
+        if ci < 0:
+            return None
+        segs = chunks[ci]
+        s, e, n, o = segs[bisect_left(segs, (addr + 1,)) - 1]
+        if o == addr and e >= addr + size:
+            return n
+        return None
+
+    def load(self, addr, size):
+        # The nodes whose words fill [addr, addr + size) in order, each one from its first byte,
+        # or None if any byte is unknown or a word continues from the middle.
+        # A node repeated back to back with another origin is not reported twice, but is rejected.
+        res  = []
+        n    = None
+        base = addr
+        pos  = addr
+        end  = addr + size
+        segs = self._iter(*self._find(addr))
+        while pos < end:
+            seg = next(segs, None)
+            if seg is None:
+                return None
+            s, e, n2, o = seg
+            if s > pos or e <= pos:
+                return None
+            if not res or n2 is not n:
+                n    = n2
+                base = pos
+                res.append(n)
+            if o != base:
+                return None
+            pos = e
+        return res
+
+    def intersect(self, other):
+        # Keeps only the bytes that other also holds, from the same word at the same place
+        segs = []
+        a    = self._iter()
+        b    = other._iter() # pylint: disable=protected-access
+        s1, e1, n1, o1 = next(a, (0, 0, None, 0))
+        s2, e2, n2, o2 = next(b, (0, 0, None, 0))
+        while e1 and e2:
+            s = max(s1, s2)
+            e = min(e1, e2)
+            if s < e and n1 is n2 and o1 == o2:
+                segs.append((s, e, n1, o1))
+            if e1 <= e2: s1, e1, n1, o1 = next(a, (0, 0, None, 0))
+            else:        s2, e2, n2, o2 = next(b, (0, 0, None, 0))
+        self._chunks = [tuple(segs[k:k+CHUNK]) for k in range(0, len(segs), CHUNK)]
+        self._owned  = True
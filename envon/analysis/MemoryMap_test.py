@@ -0,0 +1,87 @@
+import random
+
+from . import MemoryMap as memory_map
+from .MemoryMap import MemoryMap
+
+# The byte per entry model that MemoryMap replaces: address -> (node, byte of its word)
+
+def _bytes(m):
+    res = {}
+    for s, e, n, o in m.segments():
+        for i in range(s, e):
+            res[i] = (n, i - o)
+    return res
+
+def _load(bm, addr, size):
+    n, _ = bm.get(addr, (None, -1))
+    res = [n]
+    i_base = addr
+    for i in range(addr, addr + size):
+        n2, offs = bm.get(i, (None, -1))
+        if n2 is None:
+            return None
+        if n2 is not n:
+            n = n2
+            res.append(n)
+            i_base = i
+        if offs != i - i_base:
+            return None
+    return res if size else []
+
+def _check_normal(m):
+    segs = m.segments()
+    for (s1, e1, n1, o1), (s2, e2, n2, o2) in zip(segs, segs[1:]):
+        assert s1 < e1 <= s2 < e2
+        assert not (e1 == s2 and n1 is n2 and o1 == o2)
+
+def _random_ops(rnd, words):
+    nodes = [object() for _ in range(3)]
+    for _ in range(200):
+        m     = MemoryMap()
+        bm    = {}
+        snaps = []
+        for _ in range(30):
+            addr = rnd.randrange(words) * 0x20 + rnd.choice((0, 0, 0, 1, 7))
+            size = rnd.choice((1, 32, 32, 64))
+            n    = rnd.choice(nodes)
+            op   = rnd.random()
+            if op < 0.6:
+                m.store(addr, addr + size, n, addr)
+                for i in range(size):
+                    bm[addr + i] = (n, i)
+            elif op < 0.8:
+                m.clear(addr, addr + size)
+                for i in range(addr, addr + size):
+                    bm.pop(i, None)
+            elif op < 0.85:
+                m.clear(addr)
+                for i in [i for i in bm if i >= addr]:
+                    del bm[i]
+            elif op < 0.9:
+                m2 = m.copy()
+                m2.store(addr, addr + size, n, addr)
+                m.intersect(m2)
+                bm = {i: v for i, v in bm.items() if _bytes(m2).get(i) == v}
+            else:
+                snaps.append((m.copy(), bm.copy()))
+            _check_normal(m)
+            assert _bytes(m) == bm
+            assert len(m) == len(bm)
+            for addr in (0, 1, 0x20, 0x40, 0x41):
+                assert m.load(addr, 64) == _load(bm, addr, 64)
+                w = _load(bm, addr, 32)
+                assert m.load_word(addr, 32) is (w[0] if w is not None and len(w) == 1 else None)
+        # copies do not see the later changes
+        for m2, bm2 in snaps:
+            assert _bytes(m2) == bm2
+
+def random_ops_test():
+    _random_ops(random.Random(1), 4)
+
+def random_ops_chunked_test():
+    chunk = memory_map.CHUNK
+    memory_map.CHUNK = 3
+    try:
+        _random_ops(random.Random(2), 24)
+    finally:
+        memory_map.CHUNK = chunk
@@ -1,5 +1,5 @@
 
-from .Valuation import Valuation
+from .Valuation import Valuation, valuation_ids_of
 
 from envon.helpers import Log
 
@@ -7,9 +7,9 @@ log = Log(__name__)
 
 class Mempad(Valuation):
 
-    def __init__(self, node, name, avs, avsh, bytemap, *, no_value=None):
+    def __init__(self, node, name, avs, avsh, memory, *, no_value=None):
         super().__init__(node, name, avs, avsh, no_value=no_value, _hash=0)
-        self._bytemap = bytemap
+        self._memory = memory # MemoryMap
 
     def __hash__(self):
         h = self._hash
@@ -18,101 +18,66 @@ class Mempad(Valuation):
 
     def finalize(self, extras=None):
         assert self._hash == 0
+        ids = valuation_ids_of(self.node)
         if extras is not None:
-            self._hash = hash((self.name, extras, tuple(self._bytemap.items())))
+            self._hash = ids.intern_node(extras, (self.name, extras, self._memory.segments()))
         else:
-            self._hash = hash((self.name, self.avsh))
-        # if  self._bytemap is None:
-        #     self._bytemap = {}
-        # self._hash = hash((self.name, self.node._id, tuple(self._bytemap.items())))
+            self._hash = ids.intern((self.name, self.avsh))
+        # if  self._memory is None:
+        #     self._memory = MemoryMap()
+        # self._hash = ids.intern((self.name, self.node._id, self._memory.segments()))
         # assert self._hash != 0
 
     def meet(self, others):
         assert self._hash == 0
-        a = self._bytemap
+        a = self._memory
         for other in others:
             if other is not None:
-                b = other._bytemap # pylint: disable=protected-access
+                b = other._memory # pylint: disable=protected-access
                 if a is not None:
                     # strict merge
-                    t = [k for k, v in a.items() if b.get(k) != v]
-                    for k in t: del a[k]
-                    # # lenient merge # has issues with loops
-                    # for k, v in b.items():
-                    #     v2 = a.get(k)
-                    #     if   v2 is None: a[k] = v
-                    #     elif v2 != v:    del a[k]
+                    a.intersect(b)
                 else:
                     a = b.copy()
-                    self._bytemap = a
+                    self._memory = a
 
     def __repr__(self):
-        return super().__repr__() + f'-{len(self._bytemap)}B'
+        return super().__repr__() + f'-{len(self._memory)}B'
 
-    def bytemap_copy(self):
-        return self._bytemap.copy()
+    def memory_copy(self):
+        return self._memory.copy()
 
     def clear(self, addr):
         assert self._hash == 0
-        if addr in self._bytemap:
-            del    self._bytemap[addr]
+        self._memory.clear(addr, addr + 1)
 
     def clear_region(self, addr, size):
         assert self._hash == 0
         if size == 'inf':
-            size = max(self._bytemap) - addr + 1
-        for i in range(addr, addr + size):
-            if i in self._bytemap:
-                del self._bytemap[i]
+            self._memory.clear(addr)
+        else:
+            self._memory.clear(addr, addr + size)
 
     def clear_all(self):
         assert self._hash == 0
-        self._bytemap.clear()
+        self._memory.clear_all()
 
     def store(self, addr, n):
         assert self._hash == 0
-        self._bytemap[addr] = (n, 0)
+        self._memory.store(addr, addr + 1, n, addr)
 
     def store_region(self, addr, size, n):
         assert self._hash == 0
-        for i in range(size):
-            self._bytemap[addr+i] = (n, i)
+        self._memory.store(addr, addr + size, n, addr)
 
     def store32(self, addr, n):
         assert self._hash == 0
         self.store_region(addr, 32, n)
 
     def load32(self, addr):
-        n, _ = self._bytemap.get(addr, (None, -1))
-        if n is None:
-            return None
-        # start from 0 to check index!
-        for i in range(32):
-            n2, offs = self._bytemap.get(addr+i, (None, -1))
-            if n2 != n or offs != i:
-                # we can only return aligned words for now
-                log.debug('n2 != n or offs != i', n2, n, offs, i)
-                return None
-        return n
+        # we can only return aligned words for now
+        return self._memory.load_word(addr, 32)
 
     def load_region(self, addr, size):
         assert size >= 0
-        if size == 0:
-            return []
-        # log.debug(addr, size, self._bytemap)
-        n, _ = self._bytemap.get(addr, (None, -1))
-        res = [n]
-        i_base = addr
-        for i in range(addr, addr + size):
-            n2, offs = self._bytemap.get(i, (None, -1))
-            if n2 is None:
-                log.debug('n2 is None')
-                return None
-            if n2 != n:
-                n = n2
-                res.append(n)
-                i_base = i
-            if offs != i - i_base:
-                log.debug('offs != i - i_base', offs, i, i_base)
-                return None
-        return res
+        return self._memory.load(addr, size)
@@ -0,0 +1,104 @@
+from envon.helpers import Log
+
+log = Log(__name__)
+
+def _offset(b):
+    return b.offset
+
+class Reachability:
+    # Tracks the blocks that are reachable from the entry block (through blocks that are not skipped)
+    # and the blocks whose jump has no valuation yet, so that the optimizer does not have to scan
+    # the whole analysis every time its worklist drains.
+    #
+    # The reached blocks form a spanning tree. BasicBlock.accept_edge grows it right away, while
+    # BasicBlock.forget_edge only cuts the subtree below a removed tree edge, which is checked again
+    # the next time the unreachable blocks are asked for. Removing any other edge changes nothing.
+
+    def __init__(self, analysis):
+        self._entry    = analysis.get_entry_block()
+        self._parent   = {}    # reached block -> the block it was reached from, None for the entry
+        self._children = {}    # reached block -> the blocks it is the parent of
+        self._cut      = []    # roots of the subtrees cut off since the last check
+        self._dead     = []    # unreached blocks that have not been reported yet
+        self._unvalued = set() # blocks whose jump has no valuation
+        self._reach(self._entry, None)
+        for b in analysis:
+            if b not in self._parent:
+                self._dead.append(b)
+            n = b.get_jump()
+            if n is not None and n.valuation is None:
+                self._unvalued.add(b)
+
+    def _reach(self, b, parent):
+        wl = [(b, parent)]
+        while wl:
+            b, parent = wl.pop()
+            if b in self._parent:
+                continue
+            self._parent[  b] = parent
+            self._children[b] = set()
+            if parent is not None:
+                self._children[parent].add(b)
+            for b2 in b.out_edges():
+                if not b2.skip and b2 not in self._parent:
+                    wl.append((b2, b))
+
+    def edge_added(self, src, dst):
+        if src in self._parent and not dst.skip and dst not in self._parent:
+            self._reach(dst, src)
+
+    def edge_removed(self, src, dst):
+        if self._parent.get(dst) is src:
+            self._children[src].discard(dst)
+            self._cut.append(dst)
+
+    def jump_valued(self, b):
+        self._unvalued.discard(b)
+
+    def _check_cut(self):
+        # The cut subtrees are unreached, except for the blocks reached again from outside of them
+        cut = []
+        wl  = self._cut
+        self._cut = []
+        while wl:
+            b = wl.pop()
+            if b in self._parent:
+                del self._parent[b]
+                cut.append(b)
+                wl.extend(self._children.pop(b))
+        for b in cut:
+            if not b.skip and b not in self._parent:
+                for p in b.in_edges():
+                    if p in self._parent and (p is self._entry or not p.skip):
+                        self._reach(b, p)
+                        break
+        for b in cut:
+            if not b.skip and b not in self._parent:
+                self._dead.append(b)
+        if cut:
+            log.debug('Checked', len(cut), 'cut off blocks')
+
+    def pop_unreachable(self):
+        # The blocks found unreachable since the last call, in order
+        if self._cut:
+            self._check_cut()
+        res = [
+            b
+            for b in self._dead
+            if  not b.skip and b not in self._parent
+        ]
+        self._dead.clear()
+        res.sort(key=_offset)
+        return res
+
+    def pop_unvalued(self):
+        # The blocks whose jump has no valuation, in order. A jump without valuation means the block
+        # is effectively unreachable (connected but impossible), so the caller kills them all.
+        res = [
+            b
+            for b in self._unvalued
+            if  not b.skip
+        ]
+        self._unvalued.clear()
+        res.sort(key=_offset)
+        return res
@@ -0,0 +1,95 @@
+import random
+
+from .Analysis     import Analysis
+from .optimize     import Optimizer
+from .Reachability import Reachability
+
+from envon.assembly import disassemble_compact
+
+# A loop, an internal function called from three places, and a JUMPI that is always taken, cutting off its fallthrough
+CONTRACTS = (
+    '60005b8054600101815560010180600a116002575000',
+    '60003580601357600e60056033565b600055005b600103602657602160076033565b600155005b602e60096033565b600255005b549056',
+    '6001600957600054005b60015400',
+)
+
+def _analysis(code, kje=None):
+    a = Analysis()
+    a.analyze(disassemble_compact(bytes.fromhex(code)), False, kje)
+    return a
+
+def _reached(a):
+    # the full scan the tracking replaces
+    entry = a.get_entry_block()
+    res   = {entry}
+    wl    = [entry]
+    while wl:
+        for b2 in wl.pop().out_edges():
+            if not b2.skip and b2 not in res:
+                res.add(b2)
+                wl.append(b2)
+    return res
+
+def _unreachable(a):
+    reached = _reached(a)
+    return [b for b in a if not b.skip and b not in reached]
+
+def _unvalued(a):
+    return [b for b in a if not b.skip and b.get_jump() is not None and b.get_jump().valuation is None]
+
+class _CheckedOptimizer(Optimizer):
+    # compares every answer of the tracking with a full scan, the analysis blocks are in offset order
+
+    def __init__(self):
+        super().__init__()
+        self.found = 0
+
+    def _scan(self, f):
+        res  = super()._scan(f)
+        full = {'pop_unreachable': _unreachable, 'pop_unvalued': _unvalued}[f.__name__](self.analysis)
+        assert res == full, (f.__name__, res, full)
+        self.found += len(res)
+        return res
+
+def optimizer_scans_test():
+    found = 0
+    for code in CONTRACTS:
+        a = _analysis(code)
+        o = _CheckedOptimizer()
+        o.optimize(a)
+        kje = [
+            [b.get_jump().en().offset(), b2.offset]
+            for b in a
+            if  b.get_jump() is not None
+            for b2 in b.out_edges()
+        ]
+        o2 = _CheckedOptimizer()
+        o2.optimize(_analysis(code, kje))
+        found += o.found + o2.found
+    assert found > 0
+
+def random_edges_test():
+    # Random edges added and removed, each unreachable block is reported once until it is reached again
+    rnd = random.Random(1)
+    for code in CONTRACTS:
+        a  = _analysis(code)
+        r  = Reachability(a)
+        a.reachability = r
+        bs   = list(a)
+        dead = set(r.pop_unreachable())
+        assert dead == set(_unreachable(a))
+        for _ in range(500):
+            b   = rnd.choice(bs)
+            out = b.out_edges()
+            b2  = rnd.choice(bs)
+            if out and rnd.random() < 0.6:
+                b.remove_edge(rnd.choice(out))
+            elif b2 not in out:
+                b.add_jump_to(b2.offset)
+            if rnd.random() < 0.3:
+                reached = _reached(a)
+                res     = r.pop_unreachable()
+                assert len(res) == len(set(res))
+                dead    = set(b for b in dead if b not in reached) | set(res)
+                assert dead == set(bs) - reached
+        a.reachability = None
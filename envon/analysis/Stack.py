@@ -30,6 +30,20 @@ class Stack:
             self._buried[sp] = n
         return n
 
+    def delta(self):
+        # the height at the end of the block minus the one at its start
+        return len(self._raw) - self._pops
+
+    def depth(self):
+        # how far below the start of the block it was read
+        return -min(self._buried, default=0)
+
+    def replace(self, n, n2):
+        self._raw = [n2 if x is n else x for x in self._raw]
+        for sp, x in self._buried.items():
+            if x is n:
+                self._buried[sp] = n2
+
     def get(self, diff):
         assert diff < 0
         idx = len(self._raw) + diff
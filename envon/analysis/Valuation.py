@@ -1,8 +1,50 @@
 
-from collections import defaultdict
+def _unpickle_valuation(cls, _hash):
+    v       = cls.__new__(cls)
+    v._hash = _hash
+    return v
+
+class ValuationIds:
+    # Interns the keys that valuations are identified by, such as (name, argument key), per analysis.
+    # Equal keys get the same small id, so different values can not be merged by a hash collision.
+    # Ids start from 1, 0 marks a Mempad that is not finalized.
+    #
+    # It names values, it does not share them: every node keeps a Valuation of its own, as its node and origin
+    # say where the value is computed, so this saves no memory. A PHI or memory PHI is identified by its own id
+    # and a state that only goes one way while the optimizer runs (its possible values grow, its known memory
+    # shrinks), so only the latest such key of each node is kept, see intern_node.
+
+    def __init__(self):
+        self._ids   = {}
+        self._nodes = {} # node id -> its latest key of intern_node
+        self._next  = 1
+
+    def __len__(self):
+        return len(self._ids)
+
+    def intern(self, key):
+        i = self._ids.get(key)
+        if i is None:
+            i = self._ids[key] = self._next
+            self._next += 1
+        return i
+
+    def intern_node(self, node_id, key):
+        # A dropped key that is asked for again gets a new id, which only makes the valuations that still
+        # have the old one look changed, and those are being recomputed anyway
+        old = self._nodes.get(node_id)
+        if old is not None and old != key:
+            self._ids.pop(old, None)
+        self._nodes[node_id] = key
+        return self.intern(key)
+
 
 class Valuation:
 
+    # (generation, latest valuation) of latest_valuation and latest_origin_valuation
+    _latest        = None
+    _latest_origin = None
+
     def __init__(self, node, name, avs, avsh, *, no_value=None, origin=None, _hash=None, possible_values=None):
         self.node            = node
         self.name            = name
@@ -10,7 +52,7 @@ class Valuation:
         self.avsh            = avsh
         self.no_value        = node.en().pushes() == 0 if no_value is None else no_value
         self.origin          = node                    if origin   is None else origin
-        self._hash           = hash((name, avsh))      if _hash    is None else _hash
+        self._hash           = valuation_ids_of(node).intern((name, avsh)) if _hash is None else _hash # the interned id
         self.possible_values = possible_values
         assert possible_values is None or all(type(v) is int for v in possible_values)
 
@@ -18,13 +60,22 @@ class Valuation:
         return self._hash
 
     def __eq__(self, other):
-        return hash(self) == hash(other)
+        # the same interned id, forwarded valuations have the id of the one they forward
+        return self is other or (isinstance(other, Valuation) and self._hash == other._hash)
+
+    def __reduce__(self):
+        # see Instruction.__reduce__
+        # without the latest lookups, they are stale in any other process
+        state = self.__dict__.copy()
+        state.pop('_latest',        None)
+        state.pop('_latest_origin', None)
+        return _unpickle_valuation, (type(self), self._hash), state
 
     def __repr__(self):
-        return 'v' + repr(self.node) + '-' + self.name + hex(self._hash&0xfffff)[1:6]
+        return 'v' + repr(self.node) + '-' + self.name + hex(self._hash)[1:]
 
     def __str__(self):
-        s = 'V' + repr(self.node) + '-' + self.name + '(' + ', '.join(f'#{v:x}' if type(v) is int else repr(v) for v in self.avs) + ')-' + hex(self._hash&0xfffff)[1:6]
+        s = 'V' + repr(self.node) + '-' + self.name + '(' + ', '.join(f'#{v:x}' if type(v) is int else repr(v) for v in self.avs) + ')-' + hex(self._hash)[1:]
         # if self.possible_values:
         #     s += repr(self.possible_values)
         if self.no_value:
@@ -41,47 +92,81 @@ class Valuation:
 def is_valuation(v):
     return isinstance(v, Valuation)
 
-def latest_valuation(v): #, resolve_origin=False):
-    # v_orig = v
-    i = 0
-    # j = 0
+def valuation_ids_of(node):
+    return node._block._analysis.valuation_ids # pylint: disable=protected-access
+
+def args_key(n, avs):
+    # What the arguments of n are identified by: constants as they are (u256, so >= 0), valuations by their id
+    # and the ones that come from n itself through a loop by the id of n, encoded apart as negative numbers
+    return tuple(
+        a                    if not is_valuation(a) else
+        -2 * a._hash         if a.origin.is_origin  else # pylint: disable=protected-access
+        -2 * n._id - 1                                   # pylint: disable=protected-access
+        for a in avs
+    )
+
+def order_key(a):
+    # Orders the arguments of commutative instructions the same way every time, constants first
+    return (1, a._hash) if is_valuation(a) else (0, a) # pylint: disable=protected-access
+
+# The latest valuations are looked up many times for the same stale valuations while picking, so every
+# valuation on a walked chain remembers where it ended, stamped with the generation of its analysis.
+# Any new node valuation starts a new generation (see Analysis.valuations_changed), which drops all of them at once.
+# While profiling, Analysis.latest_hops counts ('latest', hops) and ('latest_origin', node hops, origin hops).
+
+def latest_valuation(v):
+    # Follows v.node.valuation until it stays the same
+    if not is_valuation(v):
+        return v
+    a    = v.node._block._analysis # pylint: disable=protected-access
+    gen  = a.latest_generation
+    seen = []
     while is_valuation(v):
+        c = v._latest # pylint: disable=protected-access
+        if c is not None and c[0] is gen:
+            v = c[1]
+            break
         _v = v.node.valuation
-        if _v is not v:
-            v = _v
-            i += 1
-            continue
-        # if resolve_origin and v.origin is not None:
-        #     v = v.origin.valuation
-        #     j += 1
-        #     continue
-        break
-    latest_valuation.stats[i] += 1
-    # latest_valuation.stats[(i,j)] += 1
-    # if i + j != 0:
-    #     print(hash(v_orig), v_orig, '->', hash(v), v)
+        if _v is v:
+            break
+        seen.append(v)
+        v = _v
+    c = gen, v
+    for v2 in seen:
+        v2._latest = c # pylint: disable=protected-access
+    hops = a.latest_hops
+    if hops is not None:
+        k = 'latest', len(seen)
+        hops[k] = hops.get(k, 0) + 1
     return v
 
-latest_valuation.stats = defaultdict(int)
-
 def latest_origin_valuation(v):
-    # v_orig = v
-    i = 0
-    j = 0
+    # Same as latest_valuation, also following v.origin.valuation until both stay the same
+    if not is_valuation(v):
+        return v
+    a    = v.node._block._analysis # pylint: disable=protected-access
+    gen  = a.latest_generation
+    seen = []
+    i    = 0
     while is_valuation(v):
+        c = v._latest_origin # pylint: disable=protected-access
+        if c is not None and c[0] is gen:
+            v = c[1]
+            break
         _v = v.node.valuation
         if _v is not v:
-            v = _v
             i += 1
-            continue
-        if _v is not v.origin.valuation:
-            v = v.origin.valuation
-            j += 1
-            continue
-        break
-    latest_origin_valuation.stats[(i,j)] += 1
-    # if i + j != 0:
-    #     print(hash(v_orig), v_orig, '->', hash(v), v)
+        elif _v is not v.origin.valuation:
+            _v = v.origin.valuation
+        else:
+            break
+        seen.append(v)
+        v = _v
+    c = gen, v
+    for v2 in seen:
+        v2._latest_origin = c # pylint: disable=protected-access
+    hops = a.latest_hops
+    if hops is not None:
+        k = 'latest_origin', i, len(seen) - i
+        hops[k] = hops.get(k, 0) + 1
     return v
-
-latest_origin_valuation.stats = defaultdict(int)
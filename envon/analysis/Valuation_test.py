@@ -0,0 +1,15 @@
+from .Valuation import ValuationIds
+
+def valuation_ids_test():
+    ids = ValuationIds()
+    a   = ids.intern(('ADD', (1, 2)))
+    assert a == 1
+    assert ids.intern(('ADD', (1, 2))) == a
+    assert ids.intern(('ADD', (2, 1))) != a
+    # only the latest key of a node is kept, and ids are never reused
+    p1 = ids.intern_node(7, ('PHI', 7, (1,)))
+    p2 = ids.intern_node(7, ('PHI', 7, (1, 2)))
+    assert ids.intern_node(7, ('PHI', 7, (1, 2))) == p2
+    assert len(ids) == 3
+    assert ids.intern_node(7, ('PHI', 7, (1,))) not in (a, p1, p2)
+    assert ids.intern_node(8, ('PHI', 8, (1,))) != ids.intern_node(7, ('PHI', 7, (1,)))
@@ -16,5 +16,3 @@ class Events:
         res = self._pending
         self._pending = []
         return res
-
-events = Events()
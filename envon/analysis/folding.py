@@ -0,0 +1,132 @@
+from envon.assembly.EvmInstruction import instruction_list, instruction_map
+from envon.helpers                 import u256, s256, FF32
+
+# Constant folding of the pure (no memory, no control flow) opcodes, see ValuationUpdate.apply
+#
+# Each fold takes the argument valuations (ints or Valuations) and returns the folded value,
+# one of the arguments, or NOT_FOLDED when a new Valuation has to be made.
+# Comparisons keep the argument on the left side (`a0 == 0`), so that Valuation.__eq__ compares interned ids.
+NOT_FOLDED = '?'
+
+_SAME = object() # x op x = x
+
+def _commutative(op, neutral, absorbing=None, same=None):
+    # the identities are checked in this order: absorbing, neutral, same arguments, both constant
+    def fold(a0, a1):
+        if absorbing is not None:
+            if   a0 == absorbing:                 return absorbing
+            elif a1 == absorbing:                 return absorbing
+        if   a0 == neutral:                       return a1
+        elif a1 == neutral:                       return a0
+        if same is not None and a0 == a1:         return a0 if same is _SAME else same
+        if type(a0) is int and type(a1) is int:   return op(a0, a1)
+        return NOT_FOLDED
+    return fold
+
+def _shift(limit, op):
+    # a0 is the shift amount, anything shifted by at least `limit` is 0
+    def fold(a0, a1):
+        if type(a0) is int:
+            if a0 >= limit:                       return 0
+            elif type(a1) is int:                 return op(a0, a1)
+        return NOT_FOLDED
+    return fold
+
+def _sub(a0, a1):
+    if   a1 == 0:                                 return a0
+    elif a0 == a1:                                return 0
+    elif type(a0) is int and type(a1) is int:     return u256(a0 - a1)
+    return NOT_FOLDED
+
+def _div(a0, a1):
+    if   a0 == 0:                                 return 0
+    elif a1 == 0:                                 return 0
+    elif a1 == 1:                                 return a0
+    # elif a0 == a1:                                return 1 # can't do because 0/0=0
+    elif type(a0) is int and type(a1) is int:     return a0 // a1
+    return NOT_FOLDED
+
+def _mod(a0, a1):
+    if   a0 == 0:                                 return 0
+    elif a1 in (0, 1, -1):                        return 0
+    elif a0 == a1:                                return 0
+    elif type(a0) is int and type(a1) is int:     return a0 % a1
+    return NOT_FOLDED
+
+def _addmod(a0, a1, a2):
+    if   a2 in (0, 1, -1):                        return 0
+    elif type(a0) is int and type(a1) is int and type(a2) is int:
+                                                  return (a0 + a1) % a2
+    return NOT_FOLDED
+
+def _mulmod(a0, a1, a2):
+    if   a0 == 0:                                 return 0
+    elif a1 == 0:                                 return 0
+    elif a2 in (0, 1, -1):                        return 0
+    elif type(a0) is int and type(a1) is int and type(a2) is int:
+                                                  return (a0 * a1) % a2
+    return NOT_FOLDED
+
+def _exp(a0, a1):
+    if   a1 == 0:                                 return 1 # 0**0 = 1 (yellowpaper p.21)
+    elif a0 == 0:                                 return 0
+    elif a0 == 1:                                 return 1
+    elif a1 == 1:                                 return a0
+    elif type(a0) is int and type(a1) is int:     return u256(a0 ** a1)
+    return NOT_FOLDED
+
+def _lt(a0, a1):
+    if   a1 == 0:                                 return 0
+    elif type(a0) is int and type(a1) is int:     return 1 if a0 < a1 else 0
+    return NOT_FOLDED
+
+def _gt(a0, a1):
+    if   a0 == 0:                                 return 0
+    elif type(a0) is int and type(a1) is int:     return 1 if a0 > a1 else 0
+    return NOT_FOLDED
+
+def _eq(a0, a1):
+    if   a0 == a1:                                return 1
+    elif type(a0) is int and type(a1) is int:     return 1 if a0 == a1 else 0
+    return NOT_FOLDED
+
+def _iszero(a0):
+    if   type(a0) is int:                         return 1 if a0 == 0 else 0
+    return NOT_FOLDED
+
+def _not(a0):
+    if   type(a0) is int:                         return u256(~a0)
+    return NOT_FOLDED
+
+def _chainid():
+    return 1
+
+FOLDS_BY_NAME = {
+    'ADD':     _commutative(lambda a0, a1: u256(a0 + a1), 0),
+    'MUL':     _commutative(lambda a0, a1: u256(a0 * a1), 1,    absorbing=0),
+    'AND':     _commutative(lambda a0, a1: a0 & a1,       FF32, absorbing=0, same=_SAME),
+    'OR':      _commutative(lambda a0, a1: a0 | a1,       0,                 same=_SAME),
+    'XOR':     _commutative(lambda a0, a1: a0 ^ a1,       0,                 same=0),
+    'SUB':     _sub,
+    'DIV':     _div,
+    'MOD':     _mod,
+    'ADDMOD':  _addmod,
+    'MULMOD':  _mulmod,
+    'EXP':     _exp,
+    'LT':      _lt,
+    'GT':      _gt,
+    'EQ':      _eq,
+    'ISZERO':  _iszero,
+    'NOT':     _not,
+    'BYTE':    _shift(32,  lambda a0, a1: (a1 << (8 * a0)) & 0xFF00000000000000000000000000000000000000000000000000000000000000),
+    'SHL':     _shift(256, lambda a0, a1: u256(a1 << a0)),
+    'SHR':     _shift(256, lambda a0, a1: u256(a1 >> a0)),
+    'SAR':     _shift(256, lambda a0, a1: u256(s256(a1) >> a0)),
+    'CHAINID': _chainid,
+}
+
+# indexed by opcode, None for the opcodes that are not folded here
+FOLDS = [None] * len(instruction_list)
+
+for _name, _fold in FOLDS_BY_NAME.items():
+    FOLDS[instruction_map[_name]] = _fold
@@ -3,6 +3,8 @@ from .Instruction import Instruction
 
 class Constant(Instruction):
 
+    __slots__ = ('_value',)
+
     def __init__(self, en, block, value):
         super().__init__(en, block)
         self._value = value
@@ -5,6 +5,8 @@ from envon.assembly import DummyEvmInstruction
 
 class DummyInstruction(Instruction):
 
+    __slots__ = ()
+
     def __init__(self, block):
         en = DummyEvmInstruction(block.offset)
         super().__init__(en, block)
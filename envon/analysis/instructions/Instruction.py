@@ -1,23 +1,27 @@
 
 from envon.analysis.Valuation import is_valuation
 
-ID_COUNTER = 0
+def _unpickle_instruction(cls, _id):
+    n     = cls.__new__(cls)
+    n._id = _id
+    return n
 
-def NEW_ID():
-    global ID_COUNTER
-    i = ID_COUNTER
-    ID_COUNTER = i + 1
-    return i
+def _slot_names(cls):
+    return [s for c in cls.__mro__ for s in c.__dict__.get('__slots__', ())]
 
 class Instruction:
+    # Large contracts keep many instructions alive, so they have no per-instance __dict__,
+    # each subclass lists the attributes it adds in __slots__
+
+    __slots__ = ('_id', '_lid', '_en', '_block', '_args', '_uses', 'comment', 'valuation', 'marked', 'is_origin')
 
     def __init__(self, en, block):
-        self._id       = NEW_ID()
+        self._id       = block._analysis.new_id() # pylint: disable=protected-access
         self._lid      = block.new_instruction_id()
         self._en       = en
         self._block    = block
         self._args     = []
-        self._uses     = set()
+        self._uses     = [] # a list is a fraction of a set's size, and there are few uses
         self.comment   = None
         self.valuation = None
         self.marked    = False
@@ -52,6 +56,15 @@ class Instruction:
     def __hash__(self):
         return hash(('Instruction', self._id))
 
+    def __reduce__(self):
+        # Sets of instructions are rebuilt while unpickling a saved analysis, before the state of their members,
+        # so the id that the hash depends on must be set on creation. The rest is set as slots.
+        return _unpickle_instruction, (type(self), self._id), (None, {
+            name: getattr(self, name)
+            for name in _slot_names(type(self))
+            if  name != '_id'
+        })
+
     def en(self):
         return self._en
 
@@ -77,10 +90,12 @@ class Instruction:
         return iter(self._uses)
 
     def add_use(self, a):
-        self._uses.add(a)
+        if a not in self._uses:
+            self._uses.append(a)
 
     def remove_use(self, a):
-        self._uses.discard(a)
+        if a in self._uses:
+            self._uses.remove(a)
 
     def get_arg(self, i):
         return self._args[i]
@@ -89,6 +104,19 @@ class Instruction:
         self._args.append(a)
         a.add_use(self)
 
+    def replace_arg(self, a, a2):
+        self._args = [a2 if x is a else x for x in self._args]
+        a.remove_use(self)
+        a2.add_use(self)
+
+    def remove_arg(self, i):
+        a = self._args.pop(i)
+        if a not in self._args:
+            a.remove_use(self)
+
+    def reorder_args(self, order):
+        self._args = [self._args[i] for i in order]
+
     def clear_args(self):
         for a in self._args:
             a.remove_use(self)
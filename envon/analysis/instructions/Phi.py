@@ -2,15 +2,17 @@
 from .Instruction      import Instruction
 from .DummyInstruction import DummyInstruction
 
-from envon.assembly        import PhiEvmInstruction
-from envon.analysis.events import events
+from envon.assembly import PhiEvmInstruction
 
 class Phi(Instruction):
 
+    __slots__ = ('_built',)
+
     def __init__(self, block):
         en = PhiEvmInstruction(block.offset)
         super().__init__(en, block)
-        events.new_event(('New PHI', self))
+        self._built = False # whether the args were built, see refresh
+        block._analysis.events.new_event(('New PHI', self)) # pylint: disable=protected-access
 
     def repr_name(self):
         return 'PHI' + repr(self._block)
@@ -19,10 +21,32 @@ class Phi(Instruction):
         return True
 
     def refresh(self):
+        # Rebuilds the args from all the in-edges, one per edge in the same order.
+        # Afterwards the block keeps them in sync one edge at a time, see BasicBlock.accept_edge
         self.clear_args()
         for edge in self._block.in_edges():
             n = self._get_arg_from(edge)
             self.append_arg(n)
+        self._built = True
+
+    def args_built(self):
+        # otherwise it waits for its refresh, see the 'New PHI' event
+        return self._built
+
+    def edge_added(self, edge):
+        # edge was appended to the in-edges
+        if self._built:
+            self.append_arg(self._get_arg_from(edge))
+
+    def edge_removed(self, i):
+        # the in-edge at index i was removed
+        if self._built:
+            self.remove_arg(i)
+
+    def edges_reordered(self, order):
+        # the in-edges are now the old ones at these indices
+        if self._built:
+            self.reorder_args(order)
 
     def _get_arg_from(self, edge):
         raise NotImplementedError
@@ -30,6 +54,8 @@ class Phi(Instruction):
 
 class StackPhi(Phi):
 
+    __slots__ = ('_sp',)
+
     def __init__(self, block, sp):
         assert sp < 0
         super().__init__(block)
@@ -38,12 +64,17 @@ class StackPhi(Phi):
     def repr_name(self):
         return super().repr_name() + f'[{self._sp}]'
 
+    def sp(self):
+        return self._sp
+
     def _get_arg_from(self, edge):
         return edge.stack.get(self._sp)
 
 
 class StackPhiLoopBreaker(StackPhi):
 
+    __slots__ = ()
+
     def repr_name(self):
         return f'PHI~LB[{self._sp}]'
 
@@ -53,6 +84,8 @@ class StackPhiLoopBreaker(StackPhi):
 
 class MemPhi(Phi):
 
+    __slots__ = ()
+
     def is_memphi(self):
         return True
 
@@ -2,21 +2,30 @@
 import sys
 import time
 
-from collections import deque #, defaultdict
+from itertools import chain
 
 from .Mempad       import Mempad
-from .Valuation    import Valuation, is_valuation, latest_valuation
-from .events       import events
+from .MemoryMap    import MemoryMap
+from .Reachability import Reachability
+from .Valuation    import Valuation, is_valuation, latest_valuation, args_key, order_key
+from .folding      import FOLDS
 
-from envon         import graph
-from envon.helpers import Log, u256, s256, FF32
+from envon                         import graph
+from envon.assembly.EvmInstruction import instruction_list, instruction_map
+from envon.helpers                 import Log, u256
 
 log = Log(__name__)
 
+# The budget is checked every BUDGET_MASK + 1 updates, see Optimizer._run
+BUDGET_MASK = 0x3FF
+
 def _debug(*args, **kwargs):
     print(*args, **kwargs, file=sys.stderr)
 
-def general_worklist(initial_updates):
+def general_worklist(initial_updates, profile=None, phase=None):
+    if profile is not None:
+        yield from _profiled_worklist(initial_updates, profile, phase)
+        return
     # wl = deque()
     wl = []
     wl.extend(initial_updates)
@@ -43,43 +52,56 @@ def general_worklist(initial_updates):
         # wl.extendleft(new_updates) # DFS if popleft()
         yield wl
 
+def _profiled_worklist(initial_updates, profile, phase):
+    # Same as general_worklist, kept separate so that the common case pays nothing for profiling
+    w  = profile.worklist_started(phase)
+    wl = []
+    wl.extend(initial_updates)
+    wl.reverse()
+    for u in wl:
+        profile.enqueued(u)
+    #
+    seen = set(u.node for u in wl if type(u) is ValuationUpdate)
+    while wl:
+        u = wl.pop()
+        #
+        t0 = time.perf_counter_ns()
+        if type(u) is ValuationUpdate: seen.discard(u.node)
+        new_updates = []
+        for u2 in u.apply():
+            if type(u2) is ValuationUpdate:
+                if u2.node in seen:
+                    profile.deduplicated(u2)
+                    continue
+                seen.add(u2.node)
+            new_updates.append(u2)
+        wl.extend(new_updates)
+        dt = time.perf_counter_ns() - t0
+        #
+        profile.applied(u, dt)
+        for u2 in new_updates:
+            profile.enqueued(u2)
+        profile.worklist_step(w, wl, dt)
+        yield wl
+
 def find_heads(analysis):
     for b in analysis:
         for n in b:
             if not n.args_count():
                 yield n
 
-def find_unreachable_blocks(analysis):
-    seen = set()
-    wl   = deque()
-    wl.append(analysis.get_entry_block())
-    while wl:
-        b = wl.popleft()
-        if b not in seen:
-            seen.add(b)
-            for b2 in b.out_edges():
-                if not b2.skip:
-                    wl.append(b2)
-    return [
-        b
-        for b in analysis
-        if  b not in seen
-    ]
-
-def find_blocks_without_terminator_valuation(analysis):
-    res = []
-    for b in analysis:
-        n = b.get_jump()
-        if n is not None and n.valuation is None:
-            # a jump without valuation means this block is effectively unreachable (connected but impossible)
-            res.append(b)
-    return res
-
 class Optimizer:
 
-    def __init__(self):
+    def __init__(self, profile=None, max_updates=None, max_time=None):
         self.graph_requested = True
         self.todo_phis       = set()
+        self.profile         = profile
+        self.max_updates     = max_updates # None for the default budget, based on the code size
+        self.max_time        = max_time    # ms, None for the default budget
+        self.partial         = False
+        self.reachability    = None
+        self.analysis        = None # the one being optimized
+        self.valuation_ids   = None # of the analysis, see ValuationIds
         self.use_possible_values         = True
         self.link_new_jumps              = True
         self.unlink_old_jumps            = True
@@ -89,6 +111,65 @@ class Optimizer:
         self.unlink_certain_fallthroughs = True
 
     def optimize(self, analysis):
+        self._configure(analysis)
+        #
+        graph.make_graph_file(analysis)
+        #
+        for _ in general_worklist([
+            BlockSkipUpdate(b)
+            for b in analysis
+        ], self.profile, 'skip'): pass
+        #
+        self._track(analysis)
+        #
+        if analysis.jumps_are_known():
+            for _ in general_worklist([
+                KillBlockUpdate(self, b)
+                for b in self._scan(self.reachability.pop_unreachable)
+            ], self.profile, 'kill'): pass
+            self.todo_phis.clear()
+        #
+        iu = []
+        assert not analysis.events.get_and_clear()
+        #
+        for h in find_heads(analysis):
+            iu.append(ValuationUpdate(self, h))
+        #
+        graph.make_graph_file(analysis, set(u.node for u in iu))
+        #
+        self._run(analysis, iu)
+
+    def resume(self, analysis, changed, revived):
+        # Continues a converged analysis after Analysis.add_known_jumps. Only the PHIs of the blocks with new in-edges,
+        # the new PHIs their refresh created and the instructions of revived blocks need updates.
+        self._configure(analysis)
+        #
+        for _ in general_worklist([
+            BlockSkipUpdate(b)
+            for b in revived
+        ], self.profile, 'skip'): pass
+        #
+        self._track(analysis)
+        #
+        iu = [
+            PHIRefreshUpdate(self, ev[1])
+            for ev in analysis.events.get_and_clear()
+        ]
+        revived_set = set(revived)
+        for b in changed:
+            if not b.skip and b not in revived_set:
+                for phi in b.phis():
+                    iu.append(ValuationUpdate(self, phi))
+        for b in revived:
+            if not b.skip:
+                for n in b:
+                    iu.append(ValuationUpdate(self, n))
+        log.info('Resuming optimizer from', len(iu), 'updates')
+        self._run(analysis, iu)
+
+    def _configure(self, analysis):
+        self.analysis                    = analysis
+        self.valuation_ids               = analysis.valuation_ids
         self.use_possible_values         = not analysis.jumps_are_known() or not analysis.fallthroughs_are_known()
         self.link_new_jumps              = not analysis.jumps_are_known()
         self.unlink_old_jumps            = not analysis.jumps_are_known()
@@ -105,43 +186,30 @@ class Optimizer:
         log.debug('  link_certain_fallthroughs  ', self.link_certain_fallthroughs)
         log.debug('  link_uncertain_fallthroughs', self.link_uncertain_fallthroughs)
         log.debug('  unlink_certain_fallthroughs', self.unlink_certain_fallthroughs)
-        #
+
+    def _run(self, analysis, iu):
+        # The optimizer stops when it has exceeded both budgets, so either can be set to 0 to use only the other one
         i_max = analysis.get_end() * 20 + 100_000
         t_max = i_max * 100_000
+        if self.max_updates is not None: i_max = self.max_updates
+        if self.max_time    is not None: t_max = self.max_time * 1_000_000
         log.info('Running optimizer for up to', t_max // 1_000_000, 'ms, around', i_max, 'updates')
-        #
-        graph.make_graph_file(analysis)
-        #
-        for _ in general_worklist([
-            BlockSkipUpdate(b)
-            for b in analysis
-        ]): pass
-        #
-        if analysis.jumps_are_known():
-            for _ in general_worklist([
-                KillBlockUpdate(self, b)
-                for b in find_unreachable_blocks(analysis)
-            ]): pass
-            self.todo_phis.clear()
-        #
-        iu = []
-        assert not events.get_and_clear()
-        #
-        for h in find_heads(analysis):
-            iu.append(ValuationUpdate(self, h))
-        #
-        graph.make_graph_file(analysis, set(u.node for u in iu))
+        budget = {
+            'max_updates': i_max,
+            'max_time':    t_max // 1_000_000,
+        }
         #
         i = 0
         t_max += time.monotonic_ns()
         # graphs = 1000
-        for i, wl in enumerate(general_worklist(iu)):
+        for i, wl in enumerate(general_worklist(iu, self.profile, 'valuation')):
             #
             if i & 0x7FFF == 0:
                 log.info('Reached', i, 'updates')
-                if i > i_max and time.monotonic_ns() > t_max:
-                    log.error('Time exceeded')
-                    sys.exit(1)
+            if i > i_max and i & BUDGET_MASK == 0 and time.monotonic_ns() > t_max:
+                log.warning('Analysis budget exhausted after', i, 'updates, the output will be partial')
+                self.partial = True
+                break
             #
             # if self.graph_requested or i > i_max:
             # if i > i_max:
@@ -165,27 +233,77 @@ class Optimizer:
             #
             if not wl:
                 if not wl:
-                    wl.extend([
+                    self._extend(wl, [
                         KillBlockUpdate(self, b)
-                        for b in find_unreachable_blocks(analysis)
+                        for b in self._scan(self.reachability.pop_unreachable)
                     ])
                 if not wl:
-                    wl.extend([
+                    self._extend(wl, [
                         ValuationUpdate(self, phi)
                         for phi in self.todo_phis
                     ])
                     self.todo_phis.clear()
                 if not wl:
-                    wl.extend([
+                    self._extend(wl, [
                         KillBlockUpdate(self, b)
-                        for b in find_blocks_without_terminator_valuation(analysis)
+                        for b in self._scan(self.reachability.pop_unvalued)
                     ])
                 # _debug(wl)
         #
-        log.info('Optimizer complete after', i, 'updates')
+        if self.partial:
+            self._finish_partial(analysis)
+            analysis.partial = {'updates': i, **budget}
+        else:
+            log.info('Optimizer complete after', i, 'updates')
+        self._untrack(analysis)
+
+    def _track(self, analysis):
+        # from now on, BasicBlock.accept_edge and forget_edge keep the reachable blocks up to date
+        self.reachability     = Reachability(analysis)
+        analysis.reachability = self.reachability
+
+    def _untrack(self, analysis):
+        self.reachability     = None
+        analysis.reachability = None
+
+    def _finish_partial(self, analysis):
+        # The valuations have not converged, so nothing is dropped: a block whose jump was never evaluated
+        # is not proven dead, and an unresolved jump may lead to any block that looks unreachable so far.
+        # The nodes without a valuation are evaluated once, without changing any edges, and the jumps that
+        # may go elsewhere than the edges found so far are printed as computed jumps, see print_calc_with_jumps.
+        analysis.events.get_and_clear()
+        self.todo_phis.clear()
+        unvalued = self.reachability.pop_unvalued()
+        self.link_new_jumps              = False
+        self.unlink_old_jumps            = False
+        self.unlink_certain_jumps        = False
+        self.link_certain_fallthroughs   = False
+        self.link_uncertain_fallthroughs = False
+        self.unlink_certain_fallthroughs = False
+        for _ in general_worklist([
+            FinishValuationUpdate(self, n)
+            for b in analysis
+            if  not b.skip
+            for n in chain(b.phis(), b)
+            if  n.valuation is None
+        ]): pass
+        analysis.events.get_and_clear()
+        self.todo_phis.clear()
+        analysis.unresolved_jumps = [
+            n
+            for n in (b.get_jump() for b in analysis if not b.skip)
+            if  n is not None and type(n.get_arg(0).valuation) is not int
+        ]
+        # their edges were never linked, whatever the target
+        analysis.unresolved_jumps.extend(
+            n
+            for n in (b.get_jump() for b in unvalued)
+            if  n is not None and type(n.get_arg(0).valuation) is int
+        )
+        log.warning('Partial analysis has', len(analysis.unresolved_jumps), 'unresolved jumps,', len(unvalued), 'of them not evaluated')
 
     def processEvents(self, wl):
-        for ev in events.get_and_clear():
+        for ev in self.analysis.events.get_and_clear():
             t    = ev[0]
             args = ev[1:]
             if t == 'New PHI':
@@ -193,9 +311,25 @@ class Optimizer:
                 u = PHIRefreshUpdate(self, phi)
                 # log.debug('ev', ev, '->', u)
                 wl.append(u)
+                if self.profile is not None:
+                    self.profile.enqueued(u)
             else:
                 raise NotImplementedError('event: ' + repr(t))
 
+    def _extend(self, wl, updates):
+        wl.extend(updates)
+        if self.profile is not None:
+            for u in updates:
+                self.profile.enqueued(u)
+
+    def _scan(self, f):
+        if self.profile is None:
+            return f()
+        t0  = time.perf_counter_ns()
+        res = f()
+        self.profile.scanned(f.__name__, time.perf_counter_ns() - t0, len(res))
+        return res
+
 
 class KillBlockUpdate:
 
@@ -209,13 +343,15 @@ class KillBlockUpdate:
     def apply(self):
         res    = []
         b      = self.block
+        if not b.skip:
+            b.killed = True # as opposed to skipped, see Analysis.add_known_jumps
         b.skip = True
         for b2 in b.out_edges():
             b.remove_edge(b2)
             if all(e.skip for e in b2.in_edges()):
                 res.append(KillBlockUpdate(self.optimizer, b2))
             else:
-                self.optimizer.todo_phis.update(b2.phis())
+                self.optimizer.todo_phis.update(b2.built_phis())
         return res
 
 
@@ -256,21 +392,20 @@ class ValuationUpdate:
         n.valuation = None
         was_origin  = n.is_origin
         n.is_origin = False
-        name        = n.en().name()
+        en          = n.en()
+        name        = en.name()
         avs         = tuple(a.valuation for a in n.args())
-        if n.en().commutes_first_second():
+        if not n.is_phi() and any(a is None for a in avs):
+            n.valuation = v_old
+            n.is_origin = was_origin
+            return res
+        if en.commutes_first_second():
             a0, a1 = avs[:2]
-            if hash(a0) > hash(a1):
+            if order_key(a0) > order_key(a1):
                 avs = (a1, a0, *avs[2:])
-        avsh = hash(tuple(
-            a if not is_valuation(a) or a.origin.is_origin else n._id
-            for a in avs
-        ))
+        avsh = self.optimizer.valuation_ids.intern(args_key(n, avs))
         #
-        if (
-            (is_valuation(v_old) and v_old.avsh == avsh) or
-            (not n.is_phi() and any(a is None for a in avs))
-        ):
+        if is_valuation(v_old) and v_old.avsh == avsh:
             n.valuation = v_old
             n.is_origin = was_origin
             return res
@@ -281,7 +416,7 @@ class ValuationUpdate:
         elif n.is_phi():
             #
             if n.is_memphi():
-                v = Mempad(n, name, avs, avsh, {}, no_value=True)
+                v = Mempad(n, name, avs, avsh, MemoryMap(), no_value=True)
                 v.meet(avs)
                 v.finalize(n._id)
             else:
@@ -318,260 +453,20 @@ class ValuationUpdate:
                 # q2 = q.copy()
                 if   len(q) == 0: v = None
                 elif len(q) == 1: v = _forward(q.pop(), n, avs, avsh)
-                else:             v = Valuation(n, name, avs, avsh, no_value=False, _hash=hash(('PHI', n._id, t)), possible_values=t)
-            #
-        elif name == 'PC':
-            v = n.en().offset()
+                else:             v = Valuation(n, name, avs, avsh, no_value=False, _hash=self.optimizer.valuation_ids.intern_node(n._id, ('PHI', n._id, t)), possible_values=t)
             #
-        elif name == 'CHAINID':
-            v = 1
-            #
-        elif name == 'ADD':
-            a0, a1 = avs
-            if   a0 == 0:                             v = a1
-            elif a1 == 0:                             v = a0
-            elif type(a0) is int and type(a1) is int: v = u256(a0 + a1)
-            #
-        elif name == 'SUB':
-            a0, a1 = avs
-            if   a1 == 0:                             v = a0
-            elif a0 == a1:                            v = 0
-            elif type(a0) is int and type(a1) is int: v = u256(a0 - a1)
-            #
-        elif name == 'MUL':
-            a0, a1 = avs
-            if   a0 == 0:                             v = 0
-            elif a1 == 0:                             v = 0
-            elif a0 == 1:                             v = a1
-            elif a1 == 1:                             v = a0
-            elif type(a0) is int and type(a1) is int: v = u256(a0 * a1)
-            #
-        elif name == 'DIV':
-            a0, a1 = avs
-            if   a0 == 0:                             v = 0
-            elif a1 == 0:                             v = 0
-            elif a1 == 1:                             v = a0
-            # elif a0 == a1:                            v = 1 # can't do because 0/0=0
-            elif type(a0) is int and type(a1) is int: v = a0 // a1
-            #
-        elif name == 'MOD':
-            a0, a1 = avs
-            if   a0 == 0:                             v = 0
-            elif a1 in (0, 1, -1):                    v = 0
-            elif a0 == a1:                            v = 0
-            elif type(a0) is int and type(a1) is int: v = a0 % a1
-            #
-        elif name == 'ADDMOD':
-            a0, a1, a2 = avs
-            if   a2 in (0, 1, -1):                    v = 0
-            elif all(type(a) is int for a in avs):    v = (a0 + a1) % a2
-            #
-        elif name == 'MULMOD':
-            a0, a1, a2 = avs
-            if   a0 == 0:                             v = 0
-            elif a1 == 0:                             v = 0
-            elif a2 in (0, 1, -1):                    v = 0
-            elif all(type(a) is int for a in avs):    v = (a0 * a1) % a2
-            #
-        elif name == 'EXP':
-            a0, a1 = avs
-            if   a1 == 0:                             v = 1 # 0**0 = 1 (yellowpaper p.21)
-            elif a0 == 0:                             v = 0
-            elif a0 == 1:                             v = 1
-            elif a1 == 1:                             v = a0
-            elif type(a0) is int and type(a1) is int: v = u256(a0 ** a1)
-            #
-        elif name == 'LT':
-            a0, a1 = avs
-            if   a1 == 0:                             v = 0
-            elif type(a0) is int and type(a1) is int: v = 1 if a0 < a1 else 0
-            #
-        elif name == 'GT':
-            a0, a1 = avs
-            if   a0 == 0:                             v = 0
-            elif type(a0) is int and type(a1) is int: v = 1 if a0 > a1 else 0
-            #
-        elif name == 'EQ':
-            a0, a1 = avs
-            if   a0 == a1:                            v = 1
-            elif type(a0) is int and type(a1) is int: v = 1 if a0 == a1 else 0
-            #
-        elif name == 'ISZERO':
-            a0, = avs
-            if   type(a0) is int:                     v = 1 if a0 == 0 else 0
-            #
-        elif name == 'AND':
-            a0, a1 = avs
-            if   a0 == 0:                             v = 0
-            elif a1 == 0:                             v = 0
-            elif a0 == FF32:                          v = a1
-            elif a1 == FF32:                          v = a0
-            elif a0 == a1:                            v = a0
-            elif type(a0) is int and type(a1) is int: v = a0 & a1
-            #
-        elif name == 'OR':
-            a0, a1 = avs
-            if   a0 == 0:                             v = a1
-            elif a1 == 0:                             v = a0
-            elif a0 == a1:                            v = a0
-            elif type(a0) is int and type(a1) is int: v = a0 | a1
-            #
-        elif name == 'XOR':
-            a0, a1 = avs
-            if   a0 == 0:                             v = a1
-            elif a1 == 0:                             v = a0
-            elif a0 == a1:                            v = 0
-            elif type(a0) is int and type(a1) is int: v = a0 ^ a1
-            #
-        elif name == 'NOT':
-            a0, = avs
-            if   type(a0) is int:                     v = u256(~a0)
-            #
-        elif name == 'BYTE':
-            a0, a1 = avs
-            if type(a0) is int:
-                if a0 >= 32:                          v = 0
-                elif type(a1) is int:                 v = (a1 << (8 * a0)) & 0xFF00000000000000000000000000000000000000000000000000000000000000
-        elif name == 'SHL':
-            a0, a1 = avs
-            if type(a0) is int:
-                if a0 >= 256:                         v = 0
-                elif type(a1) is int:                 v = u256(a1 << a0)
-            #
-        elif name == 'SHR':
-            a0, a1 = avs
-            if type(a0) is int:
-                if a0 >= 256:                         v = 0
-                elif type(a1) is int:                 v = u256(a1 >> a0)
-            #
-        elif name == 'SAR':
-            a0, a1 = avs
-            if type(a0) is int:
-                if a0 >= 256:                         v = 0
-                elif type(a1) is int:                 v = u256(s256(a1) >> a0)
-            #
-        elif name in ('JUMP', 'JUMPI'):
-            #
-            b        = n._block
-            can_jump = True
-            #
-            if name == 'JUMP':
-                a0,    = avs
-            else:
-                a0, a1 = avs
-                if type(a1) is int:
-                    if a1 == 0:
-                        #
-                        log.debug('!! CERTAIN EDGE (NT) !!', b)
-                        if self.optimizer.unlink_certain_jumps:
-                            can_jump = False
-                            for b2 in list(b.jump_edges()):
-                                b.remove_jump_edge(b2)
-                                self._edge_update(res, b2)
-                        #
-                        if self.optimizer.link_certain_fallthroughs:
-                            b2 = b.set_fallthrough()
-                            self._edge_update(res, b2)
-                    else:
-                        log.debug('!! CERTAIN EDGE (T) !!', b)
-                        if self.optimizer.unlink_certain_fallthroughs:
-                            b2 = b.remove_fallthrough_edge()
-                            self._edge_update(res, b2)
-                        #
-                        # jumps will be linked below (can_jump == True)
-                else:
-                    if self.optimizer.link_uncertain_fallthroughs:
-                        b2 = b.set_fallthrough()
-                        self._edge_update(res, b2)
-            #
-            if can_jump:
-                dsts = n.get_arg(0).some_possible_values()
-                # add missing jump edges
-                if self.optimizer.link_new_jumps:
-                    for dst in dsts:
-                        b2 = b.add_jump_to(dst)
-                        self._edge_update(res, b2)
-                # remove unneeded jump edges
-                if self.optimizer.unlink_old_jumps:
-                    to_remove = [
-                        b2 for b2 in b.jump_edges() if b2.offset not in dsts
-                    ]
-                    for b2 in to_remove:
-                        b.remove_jump_edge(b2)
-                        self._edge_update(res, b2)
-            #
-            if type(a0) is int:
-                res.append(BlockSkipUpdate(b))
-            #
-        elif name == 'MSTORE':
-            m, a1, a2 = avs
-            if type(a1) is int:
-                v = Mempad(n, name, avs, avsh, m.bytemap_copy())
-                v.store32(a1, n.get_arg(2))
+        else:
+            op   = en.opcode()
+            fold = FOLDS[op]
+            if fold is not None:
+                v = fold(*avs)
             else:
-                v = Mempad(n, name, avs, avsh, {})
-            v.finalize()
-            #
-        elif name == 'MSTORE8':
-            m, a1, a2 = avs
-            if type(a1) is int:
-                v = Mempad(n, name, avs, avsh, m.bytemap_copy())
-                v.store(  a1, n.get_arg(2))
-            else:
-                v = Mempad(n, name, avs, avsh, {})
-            v.finalize()
-            #
-        elif name == 'MLOAD':
-            m, a1 = avs
-            if type(a1) is int:
-                t = m.load32(a1)
-                if t is not None:
-                    v = t.valuation
-            # if v is None:
-            #     v = Valuation(n, 'MLOAD', (), avsh, _hash=hash(('MLOAD', n._id)))
-            #
-        # elif name == 'SHA3':
-        #     m, a1, a2 = avs
-        #     if type(a1) is int and type(a2) is int:
-        #         ans = m.load_region(a1, a2)
-        #         if ans is not None:
-        #             v = Valuation(n, 'SHA3i', tuple(an.valuation for an in ans), avsh)
-        #     #
-        elif name in ('CALL', 'CALLCODE'):
-            m, a1, a2, a3, _, a5, a6, a7 = avs
-            if type(a6) is int and type(a7) is int:
-                v = Mempad(n, name, avs, avsh, m.bytemap_copy())
-                v.clear_region(a6, a7)
-            else:
-                v = Mempad(n, name, avs, avsh, {})
-            v.finalize()
-            #
-        elif name in ('DELEGATECALL', 'STATICCALL'):
-            m, a1, a2, a3, _, a5, a6 = avs
-            if type(a5) is int and type(a6) is int:
-                v = Mempad(n, name, avs, avsh, m.bytemap_copy())
-                v.clear_region(a5, a6)
-            else:
-                v = Mempad(n, name, avs, avsh, {})
-            v.finalize()
-            #
-        elif name == 'CODECOPY':
-            m, a1, a2, a3 = avs
-            if type(a1) is int:
-                v = Mempad(n, name, avs, avsh, m.bytemap_copy())
-                if type(a3) is int:
-                    v.clear_region(a1, a3)
-                    # v.store_region(a1, a3, n) # can't do that now, n needs to be replaced
-                    # TODO if a2 is also int, we can lookup the exact value from the bytecode
-                else:
-                    v.clear_region(a1, 'inf')
-            else:
-                v = Mempad(n, name, avs, avsh, {})
-            v.finalize()
-            #
-        elif n.en().writes_memory():
-            v = Mempad(n, name, avs, avsh, {})
-            v.finalize()
+                handler = HANDLERS[op]
+                if handler is not None:
+                    v = handler(self, n, name, avs, avsh, res)
+                elif en.writes_memory():
+                    v = Mempad(n, name, avs, avsh, MemoryMap())
+                    v.finalize()
         #
         if v == '?':
             v = Valuation(n, name, avs, avsh)
@@ -579,6 +474,8 @@ class ValuationUpdate:
         if v != v_old:
             for r in self.node.uses():
                 res.append(ValuationUpdate(self.optimizer, r))
+        if v is not v_old:
+            self.optimizer.analysis.valuations_changed()
         n.valuation = v
         n.is_origin = is_valuation(v) and v.origin == n
         if not graph.config.DISABLED:
@@ -593,9 +490,189 @@ class ValuationUpdate:
     def _edge_update(self, res, b2):
         if b2 is not None:
             # self.optimizer.graph_requested = True
-            for phi in b2.phis():
+            # the new PHIs are refreshed and updated through their event
+            for phi in b2.built_phis():
                 res.append(ValuationUpdate(self.optimizer, phi))
 
+    # Handlers of the opcodes that are not pure folds (see folding.py), looked up in HANDLERS by apply
+    # They return the new valuation, or '?' for a new Valuation of the node
+
+    def _pc(self, n, name, avs, avsh, res):
+        # pylint: disable=unused-argument
+        return n.en().offset()
+
+    def _jump(self, n, name, avs, avsh, res):
+        # pylint: disable=unused-argument
+        # pylint: disable=too-many-branches
+        b        = n._block
+        can_jump = True
+        self.optimizer.reachability.jump_valued(b) # the result is a valuation in any case
+        #
+        if name == 'JUMP':
+            a0,    = avs
+        else:
+            a0, a1 = avs
+            if type(a1) is int:
+                if a1 == 0:
+                    #
+                    log.debug('!! CERTAIN EDGE (NT) !!', b)
+                    if self.optimizer.unlink_certain_jumps:
+                        can_jump = False
+                        for b2 in list(b.jump_edges()):
+                            b.remove_jump_edge(b2)
+                            self._edge_update(res, b2)
+                    #
+                    if self.optimizer.link_certain_fallthroughs:
+                        b2 = b.set_fallthrough()
+                        self._edge_update(res, b2)
+                else:
+                    log.debug('!! CERTAIN EDGE (T) !!', b)
+                    if self.optimizer.unlink_certain_fallthroughs:
+                        b2 = b.remove_fallthrough_edge()
+                        self._edge_update(res, b2)
+                    #
+                    # jumps will be linked below (can_jump == True)
+            else:
+                if self.optimizer.link_uncertain_fallthroughs:
+                    b2 = b.set_fallthrough()
+                    self._edge_update(res, b2)
+        #
+        if can_jump:
+            dsts = n.get_arg(0).some_possible_values()
+            # add missing jump edges
+            if self.optimizer.link_new_jumps:
+                for dst in dsts:
+                    b2 = b.add_jump_to(dst)
+                    self._edge_update(res, b2)
+            # remove unneeded jump edges
+            if self.optimizer.unlink_old_jumps:
+                to_remove = [
+                    b2 for b2 in b.jump_edges() if b2.offset not in dsts
+                ]
+                for b2 in to_remove:
+                    b.remove_jump_edge(b2)
+                    self._edge_update(res, b2)
+        #
+        if type(a0) is int:
+            res.append(BlockSkipUpdate(b))
+        return '?'
+
+    def _mstore(self, n, name, avs, avsh, res):
+        # pylint: disable=unused-argument
+        m, a1, _ = avs
+        if type(a1) is int:
+            v = Mempad(n, name, avs, avsh, m.memory_copy())
+            v.store32(a1, n.get_arg(2))
+        else:
+            v = Mempad(n, name, avs, avsh, MemoryMap())
+        v.finalize()
+        return v
+
+    def _mstore8(self, n, name, avs, avsh, res):
+        # pylint: disable=unused-argument
+        m, a1, _ = avs
+        if type(a1) is int:
+            v = Mempad(n, name, avs, avsh, m.memory_copy())
+            v.store(  a1, n.get_arg(2))
+        else:
+            v = Mempad(n, name, avs, avsh, MemoryMap())
+        v.finalize()
+        return v
+
+    def _mload(self, n, name, avs, avsh, res):
+        # pylint: disable=unused-argument
+        m, a1 = avs
+        if type(a1) is int:
+            t = m.load32(a1)
+            if t is not None:
+                return t.valuation
+        # return Valuation(n, 'MLOAD', (), avsh, _hash=hash(('MLOAD', n._id)))
+        return '?'
+
+    # def _sha3(self, n, name, avs, avsh, res):
+    #     m, a1, a2 = avs
+    #     if type(a1) is int and type(a2) is int:
+    #         ans = m.load_region(a1, a2)
+    #         if ans is not None:
+    #             return Valuation(n, 'SHA3i', tuple(an.valuation for an in ans), avsh)
+    #     return '?'
+
+    def _call(self, n, name, avs, avsh, res):
+        # pylint: disable=unused-argument
+        m, _, _, _, _, _, a6, a7 = avs
+        if type(a6) is int and type(a7) is int:
+            v = Mempad(n, name, avs, avsh, m.memory_copy())
+            v.clear_region(a6, a7)
+        else:
+            v = Mempad(n, name, avs, avsh, MemoryMap())
+        v.finalize()
+        return v
+
+    def _delegatecall(self, n, name, avs, avsh, res):
+        # pylint: disable=unused-argument
+        m, _, _, _, _, a5, a6 = avs
+        if type(a5) is int and type(a6) is int:
+            v = Mempad(n, name, avs, avsh, m.memory_copy())
+            v.clear_region(a5, a6)
+        else:
+            v = Mempad(n, name, avs, avsh, MemoryMap())
+        v.finalize()
+        return v
+
+    def _codecopy(self, n, name, avs, avsh, res):
+        # pylint: disable=unused-argument
+        m, a1, _, a3 = avs
+        if type(a1) is int:
+            v = Mempad(n, name, avs, avsh, m.memory_copy())
+            if type(a3) is int:
+                v.clear_region(a1, a3)
+                # v.store_region(a1, a3, n) # can't do that now, n needs to be replaced
+                # TODO if a2 is also int, we can lookup the exact value from the bytecode
+            else:
+                v.clear_region(a1, 'inf')
+        else:
+            v = Mempad(n, name, avs, avsh, MemoryMap())
+        v.finalize()
+        return v
+
+# indexed by opcode, None for the opcodes without a handler
+HANDLERS = [None] * len(instruction_list)
+
+# pylint: disable=protected-access
+for _name, _handler in (
+    ('PC',           ValuationUpdate._pc),
+    ('JUMP',         ValuationUpdate._jump),
+    ('JUMPI',        ValuationUpdate._jump),
+    ('MSTORE',       ValuationUpdate._mstore),
+    ('MSTORE8',      ValuationUpdate._mstore8),
+    ('MLOAD',        ValuationUpdate._mload),
+    ('CALL',         ValuationUpdate._call),
+    ('CALLCODE',     ValuationUpdate._call),
+    ('DELEGATECALL', ValuationUpdate._delegatecall),
+    ('STATICCALL',   ValuationUpdate._delegatecall),
+    ('CODECOPY',     ValuationUpdate._codecopy),
+):
+    HANDLERS[instruction_map[_name]] = _handler
+# pylint: enable=protected-access
+
+
+class FinishValuationUpdate(ValuationUpdate):
+    # A ValuationUpdate of Optimizer._finish_partial, which goes on only to the uses without a valuation,
+    # so that it ends once no more nodes can be evaluated. A PHI without any valued input yet is unknown.
+
+    def apply(self):
+        res = super().apply()
+        n   = self.node
+        if n.valuation is None and n.is_phi() and not n.is_memphi():
+            n.valuation = Valuation(n, n.en().name(), tuple(a.valuation for a in n.args()), None, no_value=False,
+                                    _hash=self.optimizer.valuation_ids.intern_node(n._id, ('PHI', n._id, None)))
+            res = [ValuationUpdate(self.optimizer, r) for r in n.uses()]
+        return [
+            FinishValuationUpdate(self.optimizer, u.node)
+            for u in res
+            if  type(u) is ValuationUpdate and u.node.valuation is None
+        ]
+
 
 def is_final(b):
     return b.ns and b.ns[-1].en().is_final()
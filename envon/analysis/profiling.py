@@ -0,0 +1,185 @@
+import sys
+import json
+import time
+import logging
+import argparse
+
+from envon.helpers import Log
+
+log = Log(__name__)
+
+# Opt-in statistics for the optimizer worklists, see general_worklist in optimize.py
+#
+# Report (one JSON object per contract):
+#   classes:    per update class: updates, time_ns, enqueued, reenqueued, deduplicated
+#   targets:    per (update class, node or block), the TOP_TARGETS with the most time
+#   scans:      per check for dead blocks between worklist rounds: calls, time_ns, found
+#   worklists:  per general_worklist call: phase, updates, time_ns, high_water
+#   latest_hops: per latest_valuation / latest_origin_valuation chain length while picking, the lookups
+TOP_TARGETS = 1000
+
+def _target(u):
+    for attr in ('node', 'block', 'valuation'):
+        t = getattr(u, attr, None)
+        if t is not None:
+            return t
+    return None
+
+class WorklistProfile:
+
+    def __init__(self):
+        self.classes    = {} # class name     -> [updates, time_ns, enqueued, reenqueued, deduplicated]
+        self.targets    = {} # (class, target) -> [updates, time_ns, enqueued]
+        self.scans      = {} # scan name      -> [calls, time_ns, found]
+        self.worklists  = []
+        self.hops       = {} # see Analysis.latest_hops
+        self.high_water = 0
+        self.t_start    = time.perf_counter_ns()
+
+    def _class(self, u):
+        name = type(u).__name__
+        c    = self.classes.get(name)
+        if c is None:
+            c = self.classes[name] = [0, 0, 0, 0, 0]
+        return c
+
+    def _target(self, u):
+        k = type(u).__name__, _target(u)
+        t = self.targets.get(k)
+        if t is None:
+            t = self.targets[k] = [0, 0, 0]
+        return t
+
+    def enqueued(self, u):
+        c = self._class(u)
+        t = self._target(u)
+        c[2] += 1
+        if t[2]:
+            c[3] += 1
+        t[2] += 1
+
+    def deduplicated(self, u):
+        self._class(u)[4] += 1
+
+    def applied(self, u, dt):
+        c = self._class(u)
+        t = self._target(u)
+        c[0] += 1
+        c[1] += dt
+        t[0] += 1
+        t[1] += dt
+
+    def worklist_started(self, phase):
+        self.worklists.append([phase, 0, 0, 0])
+        return self.worklists[-1]
+
+    def worklist_step(self, w, wl, dt):
+        w[1] += 1
+        w[2] += dt
+        if len(wl) > w[3]:
+            w[3] = len(wl)
+            if w[3] > self.high_water:
+                self.high_water = w[3]
+
+    def scanned(self, name, dt, found):
+        s = self.scans.get(name)
+        if s is None:
+            s = self.scans[name] = [0, 0, 0]
+        s[0] += 1
+        s[1] += dt
+        s[2] += found
+
+    def report(self, contract=None, top=TOP_TARGETS):
+        targets = sorted(self.targets.items(), key=lambda kv: kv[1][1], reverse=True)
+        return {
+            'contract':   contract,
+            'time_ns':    time.perf_counter_ns() - self.t_start,
+            'updates':    sum(c[0] for c in self.classes.values()),
+            'high_water': self.high_water,
+            'classes':    {
+                name: {
+                    'updates':      c[0],
+                    'time_ns':      c[1],
+                    'enqueued':     c[2],
+                    'reenqueued':   c[3],
+                    'deduplicated': c[4],
+                }
+                for name, c in sorted(self.classes.items())
+            },
+            'targets_total': len(targets),
+            'targets':    [
+                {
+                    'class':      name,
+                    'target':     repr(target),
+                    'updates':    t[0],
+                    'time_ns':    t[1],
+                    'enqueued':   t[2],
+                    'reenqueued': max(t[2] - 1, 0),
+                }
+                for (name, target), t in targets[:top]
+            ],
+            'scans':      {
+                name: {
+                    'calls':   s[0],
+                    'time_ns': s[1],
+                    'found':   s[2],
+                }
+                for name, s in sorted(self.scans.items())
+            },
+            'worklists':  [
+                {
+                    'phase':      phase,
+                    'updates':    n,
+                    'time_ns':    dt,
+                    'high_water': hw,
+                }
+                for phase, n, dt, hw in self.worklists
+            ],
+            'latest_hops': {
+                ' '.join(map(str, k)): n
+                for k, n in sorted(self.hops.items())
+            },
+        }
+
+    def write(self, fname, contract=None):
+        log.info('Writing worklist profile to', fname)
+        with open(fname, 'w') as f:
+            json.dump(self.report(contract), f, indent=1)
+            f.write('\n')
+
+
+def aggregate(fnames):
+    # Sums the per class and per scan statistics of many reports
+    res = {
+        'contracts':  0,
+        'time_ns':    0,
+        'updates':    0,
+        'high_water': 0,
+        'classes':    {},
+        'scans':      {},
+        'latest_hops': {},
+    }
+    for fname in fnames:
+        with open(fname) as f:
+            r = json.load(f)
+        res['contracts'] += 1
+        res['time_ns']   += r['time_ns']
+        res['updates']   += r['updates']
+        res['high_water'] = max(res['high_water'], r['high_water'])
+        for k in ('classes', 'scans'):
+            for name, d in r[k].items():
+                acc = res[k].setdefault(name, {})
+                for stat, x in d.items():
+                    acc[stat] = acc.get(stat, 0) + x
+        for k, n in r.get('latest_hops', {}).items():
+            res['latest_hops'][k] = res['latest_hops'].get(k, 0) + n
+    return res
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='envon.analysis.profiling', description='Aggregate worklist profile reports of many contracts.')
+    parser.add_argument('reports', type=str, nargs='+', help='JSON files written with envon --profile')
+    args = parser.parse_args()
+    #
+    logging.basicConfig(format='%(levelname)-7s %(name)-40s %(filename)20s:%(lineno)-4d | %(message)s', level='INFO', stream=sys.stderr)
+    json.dump(aggregate(args.reports), sys.stdout, indent=1)
+    print()
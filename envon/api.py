@@ -0,0 +1,56 @@
+import io
+
+from .run  import run_runbin
+from .pick import parse_pick
+
+# Analyzing contracts from python, without the command line, files or a process per contract:
+#
+#   from envon.api import analyze
+#   e = analyze(bytes.fromhex('6000546001...'), 'SLOAD,SSTORE[0]=STOUCH', skip=True)
+#   e.text     # what `python -m envon` would write
+#   e.lines()  # what tools/execute.py Program takes
+#
+# Errors are raised as exceptions. Nothing is kept between calls other than the cache, so a process
+# can analyze any number of contracts in a row.
+# The envon package itself imports nothing, so that the tools using envon.helpers do not load the analyzer.
+
+class Evmlike:
+    # The evmlike code of a contract, see envon.pick
+
+    def __init__(self, text, partial):
+        self.text    = text    # as written by `python -m envon`
+        self.partial = partial # the optimizer ran out of budget, see the '// PARTIAL' line
+
+    def __repr__(self):
+        return f'Evmlike({len(self.text)} chars' + (', partial)' if self.partial else ')')
+
+    def lines(self):
+        return self.text.splitlines()
+
+    def outputs(self):
+        # The output numbers of the picked instructions, from the '[...]' line after the code
+        for line in reversed(self.lines()):
+            if line[:1] == '[':
+                return [int(on) for on in line[1:-1].split(',') if on]
+        return []
+
+
+def analyze(runbin, pick, skip=False, known_jump_edges=None, max_updates=None, max_time=None, cache=None):
+    # runbin           the runtime bytecode, bytes or hex
+    # pick             as --pick, 'SLOAD,SSTORE[0]=STOUCH', or a dict as returned by envon.pick.parse_pick
+    # skip             as --skip
+    # known_jump_edges [[src, dst], ...] as in the --jumps file, None for none
+    # max_updates      as --max-updates, None for the default
+    # max_time         as --max-time in ms, None for the default
+    # cache            an envon.cache.ResultCache, None for none
+    if isinstance(runbin, str):
+        runbin = bytes.fromhex(runbin.strip())
+    if isinstance(pick, str):
+        pick = parse_pick(pick)
+    if not pick:
+        raise ValueError('Nothing to pick')
+    if known_jump_edges is not None:
+        known_jump_edges = [list(e) for e in known_jump_edges]
+    fo      = io.StringIO()
+    partial = run_runbin(runbin, fo, skip, known_jump_edges, pick, cache, None, (max_updates, max_time))
+    return Evmlike(fo.getvalue(), partial)
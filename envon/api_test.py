@@ -0,0 +1,20 @@
+import io
+
+from .api import analyze
+from .run import run
+
+# An internal function called from two places, with the stored value picked as an argument
+CODE = '600760016017565b600055601260026017565b600155005b549056'
+
+def analyze_test():
+    fo = io.StringIO()
+    fi = io.StringIO(CODE)
+    fi.name = 'api_test.runbin.hex'
+    run(fi, fo, True, None, {'SLOAD': (None, -1), 'SSTORE': ('STOUCH', 0)})
+    #
+    e = analyze(bytes.fromhex(CODE), 'SLOAD,SSTORE[0]=STOUCH', skip=True)
+    assert e.text == fo.getvalue()
+    assert not e.partial
+    assert e.lines()[0] == '~0 | ENTRY'
+    assert len(e.outputs()) == 3
+    assert analyze(CODE, 'SLOAD,SSTORE[0]=STOUCH', skip=True).text == e.text
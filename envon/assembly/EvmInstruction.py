@@ -365,37 +365,85 @@ OPCODES_COMMUTE_FIRST_SECOND = tuple(instruction_map[t] for t in (
     'XOR',
 ))
 
+FLAG_VALID                = 1 <<  0
+FLAG_POP                  = 1 <<  1
+FLAG_PUSH                 = 1 <<  2
+FLAG_DUP                  = 1 <<  3
+FLAG_SWAP                 = 1 <<  4
+FLAG_JUMPDEST             = 1 <<  5
+FLAG_RARE                 = 1 <<  6
+FLAG_JUMP                 = 1 <<  7
+FLAG_TERMINATOR           = 1 <<  8
+FLAG_FINAL                = 1 <<  9
+FLAG_STOP_FALLTHROUGH     = 1 << 10
+FLAG_READ_MEMORY          = 1 << 11
+FLAG_WRITE_MEMORY         = 1 << 12
+FLAG_COMMUTE_FIRST_SECOND = 1 << 13
+FLAG_NEED_MEMORY          = FLAG_READ_MEMORY | FLAG_WRITE_MEMORY
+
+def _make_flags():
+    flags = [0] * len(instruction_list)
+    for t in instruction_list:
+        if t:
+            flags[t[0]] |= FLAG_VALID
+    for opcodes, flag in (
+        ((OPCODE_POP,),                          FLAG_POP),
+        (range(OPCODE_PUSH1, OPCODE_PUSH32 + 1), FLAG_PUSH),
+        (range(OPCODE_DUP1,  OPCODE_DUP16  + 1), FLAG_DUP),
+        (range(OPCODE_SWAP1, OPCODE_SWAP16 + 1), FLAG_SWAP),
+        ((OPCODE_JUMPDEST,),                     FLAG_JUMPDEST),
+        (OPCODES_RARE,                           FLAG_RARE),
+        (OPCODES_JUMP,                           FLAG_JUMP),
+        (OPCODES_TERMINATOR,                     FLAG_TERMINATOR),
+        (OPCODES_FINAL,                          FLAG_FINAL),
+        (OPCODES_STOP_FALLTHROUGH,               FLAG_STOP_FALLTHROUGH),
+        (OPCODES_READ_MEMORY,                    FLAG_READ_MEMORY),
+        (OPCODES_WRITE_MEMORY,                   FLAG_WRITE_MEMORY),
+        (OPCODES_COMMUTE_FIRST_SECOND,           FLAG_COMMUTE_FIRST_SECOND),
+    ):
+        for opcode in opcodes:
+            flags[opcode] |= flag
+    return tuple(flags)
+
+# one bitmask per opcode (pseudo-instructions included), so predicates are a single lookup
+instruction_flags  = _make_flags()
+instruction_names  = tuple(t[1] if t else None for t in instruction_list)
+instruction_pops   = tuple(t[2] if t else None for t in instruction_list)
+instruction_pushes = tuple(t[3] if t else None for t in instruction_list)
+
 class EvmInstruction:
 
+    __slots__ = ('_offset', '_opcode', '_push_value')
+
     def __init__(self, offset, opcode, push_value=None):
         self._offset     = offset
         self._opcode     = opcode
         self._push_value = push_value
-        if not self.data():
+        if not instruction_flags[opcode] & FLAG_VALID:
             raise ValueError('Bad opcode ' + repr(opcode))
 
     def offset(    self): return self._offset
     def opcode(    self): return self._opcode
     def push_value(self): return self._push_value
-    def data(      self): return instruction_list[self._opcode]
-    def name(      self): return self.data()[1]
-    def pops(      self): return self.data()[2]
-    def pushes(    self): return self.data()[3]
+    def data(      self): return instruction_list[  self._opcode]
+    def name(      self): return instruction_names[ self._opcode]
+    def pops(      self): return instruction_pops[  self._opcode]
+    def pushes(    self): return instruction_pushes[self._opcode]
 
-    def is_pop(               self): return self._opcode == OPCODE_POP
-    def is_push(              self): return OPCODE_PUSH1 <= self._opcode <= OPCODE_PUSH32
-    def is_dup(               self): return OPCODE_DUP1  <= self._opcode <= OPCODE_DUP16
-    def is_swap(              self): return OPCODE_SWAP1 <= self._opcode <= OPCODE_SWAP16
-    def is_jumpdest(          self): return self._opcode == OPCODE_JUMPDEST
-    def is_rare(              self): return self._opcode in OPCODES_RARE
-    def is_jump(              self): return self._opcode in OPCODES_JUMP
-    def is_terminator(        self): return self._opcode in OPCODES_TERMINATOR
-    def is_final(             self): return self._opcode in OPCODES_FINAL
-    def  stops_fallthrough(   self): return self._opcode in OPCODES_STOP_FALLTHROUGH
-    def  reads_memory(        self): return self._opcode in OPCODES_READ_MEMORY
-    def writes_memory(        self): return self._opcode in OPCODES_WRITE_MEMORY
-    def  needs_memory(        self): return self.reads_memory() or self.writes_memory()
-    def commutes_first_second(self): return self._opcode in OPCODES_COMMUTE_FIRST_SECOND
+    def is_pop(               self): return instruction_flags[self._opcode] & FLAG_POP                  != 0
+    def is_push(              self): return instruction_flags[self._opcode] & FLAG_PUSH                 != 0
+    def is_dup(               self): return instruction_flags[self._opcode] & FLAG_DUP                  != 0
+    def is_swap(              self): return instruction_flags[self._opcode] & FLAG_SWAP                 != 0
+    def is_jumpdest(          self): return instruction_flags[self._opcode] & FLAG_JUMPDEST             != 0
+    def is_rare(              self): return instruction_flags[self._opcode] & FLAG_RARE                 != 0
+    def is_jump(              self): return instruction_flags[self._opcode] & FLAG_JUMP                 != 0
+    def is_terminator(        self): return instruction_flags[self._opcode] & FLAG_TERMINATOR           != 0
+    def is_final(             self): return instruction_flags[self._opcode] & FLAG_FINAL                != 0
+    def  stops_fallthrough(   self): return instruction_flags[self._opcode] & FLAG_STOP_FALLTHROUGH     != 0
+    def  reads_memory(        self): return instruction_flags[self._opcode] & FLAG_READ_MEMORY          != 0
+    def writes_memory(        self): return instruction_flags[self._opcode] & FLAG_WRITE_MEMORY         != 0
+    def  needs_memory(        self): return instruction_flags[self._opcode] & FLAG_NEED_MEMORY          != 0
+    def commutes_first_second(self): return instruction_flags[self._opcode] & FLAG_COMMUTE_FIRST_SECOND != 0
 
     def size(self):
         if self.is_push(): return 2 + self._opcode - OPCODE_PUSH1
@@ -1,5 +1,4 @@
-
-from .EvmInstruction import instruction_list
+from .EvmInstruction import instruction_list, EvmInstruction, OPCODES_READ_MEMORY, OPCODES_WRITE_MEMORY, OPCODES_TERMINATOR
 
 from envon.helpers import Log
 
@@ -19,3 +18,23 @@ def instruction_list_test():
     except (ValueError, AssertionError):
         log.error('In instruction_list i =', i, 't =', t)
         raise
+
+def instruction_flags_test():
+    for t in instruction_list:
+        if t:
+            opcode, name, pops, pushes = t
+            en = EvmInstruction(0, opcode)
+            assert en.name()          == name
+            assert en.pops()          == pops
+            assert en.pushes()        == pushes
+            assert en.reads_memory()  == (opcode in OPCODES_READ_MEMORY)
+            assert en.writes_memory() == (opcode in OPCODES_WRITE_MEMORY)
+            assert en.needs_memory()  == (opcode in OPCODES_READ_MEMORY or opcode in OPCODES_WRITE_MEMORY)
+            assert en.is_terminator() == (opcode in OPCODES_TERMINATOR)
+            assert en.is_push()       == name.startswith('PUSH')
+    for opcode in (0x0c, 0xef):
+        try:
+            EvmInstruction(0, opcode)
+            assert False
+        except ValueError:
+            pass
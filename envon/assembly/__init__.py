@@ -1,2 +1,2 @@
-from .disassemble    import disassemble_file
+from .disassemble    import disassemble_file, disassemble, disassemble_compact, read_runbin, Disassembly
 from .EvmInstruction import DummyEvmInstruction, PhiEvmInstruction
@@ -1,15 +1,20 @@
 
-from .EvmInstruction import EvmInstruction
+from array import array
+
+from .EvmInstruction import EvmInstruction, instruction_list, OPCODE_PUSH1, OPCODE_PUSH32
 
 from envon.helpers import Log
 
 log = Log(__name__)
 
 def disassemble_file(f):
+    return disassemble(read_runbin(f))
+
+def read_runbin(f):
     c = f.read()
     c = bytes.fromhex(c.strip())
     # c = strip_metadata(c)
-    return disassemble(c)
+    return c
 
 def strip_metadata(runbin):
     r = runbin
@@ -40,3 +45,72 @@ def disassemble(runbin):
     except (AssertionError, IndexError, KeyError, ValueError) as e:
         log.info('At byte', i, repr(e))
     return res
+
+
+class Disassembly:
+    # Compact disassembler output, in parallel arrays instead of one EvmInstruction per opcode.
+    # Indexing or iterating gives EvmInstruction views, created on demand.
+
+    def __init__(self):
+        self.offsets     = array('I')
+        self.opcodes     = array('B')
+        self.push_index  = array('i') # index in push_values, or -1 if not a PUSH
+        self.push_values = []
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __getitem__(self, j):
+        return self.instruction(j)
+
+    def __iter__(self):
+        for j in range(len(self.opcodes)):
+            yield self.instruction(j)
+
+    def instruction(self, j):
+        pi = self.push_index[j]
+        return EvmInstruction(self.offsets[j], self.opcodes[j], self.push_values[pi] if pi >= 0 else None)
+
+    def end(self):
+        j = len(self.opcodes) - 1
+        if j < 0: return 0
+        op = self.opcodes[j]
+        return self.offsets[j] + (2 + op - OPCODE_PUSH1 if OPCODE_PUSH1 <= op <= OPCODE_PUSH32 else 1)
+
+    def append(self, offset, opcode, push_value=None):
+        self.offsets.append(offset)
+        self.opcodes.append(opcode)
+        if push_value is not None:
+            self.push_index.append(len(self.push_values))
+            self.push_values.append(push_value)
+        else:
+            self.push_index.append(-1)
+
+    @staticmethod
+    def from_instructions(ens):
+        res = Disassembly()
+        for en in ens:
+            res.append(en.offset(), en.opcode(), en.push_value())
+        return res
+
+def disassemble_compact(runbin):
+    # Same as disassemble(), without creating an object per opcode
+    res = Disassembly()
+    i   = 0
+    l   = len(runbin)
+    try:
+        while i < l:
+            op = runbin[i]
+            if not instruction_list[op]:
+                raise ValueError('Bad opcode ' + repr(op))
+            if OPCODE_PUSH1 <= op <= OPCODE_PUSH32:
+                s  = 2 + op - OPCODE_PUSH1
+                assert i + s < l, (i, s, l)
+                res.append(i, op, int.from_bytes(runbin[i+1:i+s], 'big'))
+                i += s
+            else:
+                res.append(i, op)
+                i += 1
+    except (AssertionError, IndexError, KeyError, ValueError) as e:
+        log.info('At byte', i, repr(e))
+    return res
@@ -0,0 +1,170 @@
+
+import os
+import sys
+import json
+import pickle
+import hashlib
+import threading
+
+from envon.helpers import Log
+
+log = Log(__name__)
+
+def analyzer_version():
+    # Digest of the analyzer's own source, so that any change to it invalidates cached results
+    d    = hashlib.sha256()
+    root = os.path.dirname(os.path.abspath(__file__))
+    for path, dnames, fnames in os.walk(root):
+        dnames.sort()
+        for fname in sorted(fnames):
+            if fname.endswith('.py') and not fname.endswith('_test.py'):
+                full = os.path.join(path, fname)
+                d.update(os.path.relpath(full, root).encode() + b'\0')
+                with open(full, 'rb') as f:
+                    d.update(f.read())
+    return d.hexdigest()
+
+# Analyses are deep object graphs, so they are pickled on a thread with a big stack and recursion limit
+PICKLE_STACK_SIZE = 512 << 20
+PICKLE_RECURSION  = 10_000_000
+
+def _with_deep_stack(f, *args):
+    res = [None, None]
+    def w():
+        try:                   res[0] = f(*args)
+        except Exception as e: res[1] = e # pylint: disable=broad-except
+    limit = sys.getrecursionlimit()
+    size  = threading.stack_size(PICKLE_STACK_SIZE)
+    sys.setrecursionlimit(PICKLE_RECURSION)
+    try:
+        t = threading.Thread(target=w)
+        t.start()
+        t.join()
+    finally:
+        threading.stack_size(size)
+        sys.setrecursionlimit(limit)
+    if res[1] is not None:
+        raise res[1]
+    return res[0]
+
+class ResultCache:
+    # On-disk cache of *.evmlike outputs, one file per key, evicting the least recently used files over max_bytes.
+    # Several processes can share a directory: files are written atomically and the size is re-checked on eviction.
+    # With analyses, it also keeps the latest converged analysis of each code, to continue it when more known jumps
+    # arrive. Saving and loading one costs about as much as analyzing the code again, and a run with skip starts
+    # over more often than not (see Analysis.add_known_jumps), so that only pays off for codes whose known jumps
+    # grow a few at a time.
+
+    def __init__(self, directory, max_bytes, analyses=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.analyses  = analyses
+        self.hits      = 0
+        self.misses    = 0
+        self._size     = None
+        self._version  = analyzer_version()
+        try:                    os.mkdir(directory)
+        except FileExistsError: pass
+
+    def __repr__(self):
+        return f'ResultCache({self.directory}, {self.max_bytes // 1_000_000}MB, ' + ('analyses, ' if self.analyses else '') + f'hits={self.hits}, misses={self.misses})'
+
+    def key(self, runbin, skip, kje, pick):
+        options = json.dumps([
+            self._version,
+            bool(skip),
+            sorted(pick.items()),
+            kje,
+        ], separators=(',', ':'))
+        return (
+            hashlib.sha256(runbin).hexdigest() + '_' +
+            hashlib.sha256(options.encode()).hexdigest()[:32]
+        )
+
+    def analysis_key(self, runbin, skip):
+        # Not the known jumps, the saved analysis is continued with the new ones
+        options = json.dumps([
+            self._version,
+            bool(skip),
+            'analysis',
+        ], separators=(',', ':'))
+        return (
+            hashlib.sha256(runbin).hexdigest() + '_' +
+            hashlib.sha256(options.encode()).hexdigest()[:32]
+        )
+
+    def _path(self, key, suffix='.evmlike'):
+        return os.path.join(self.directory, key + suffix)
+
+    def get(self, key):
+        p = self._path(key)
+        try:
+            with open(p) as f:
+                res = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        try:                      os.utime(p) # mark as recently used
+        except FileNotFoundError: pass        # evicted meanwhile, still a hit
+        self.hits += 1
+        return res
+
+    def put(self, key, content):
+        self._write(self._path(key), 'w', content)
+
+    def get_analysis(self, key):
+        # Returns the analysis or None, it continues its own instruction ids
+        p = self._path(key, '.analysis')
+        try:
+            with open(p, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:                      os.utime(p)
+        except FileNotFoundError: pass
+        return _with_deep_stack(pickle.loads, data)
+
+    def put_analysis(self, key, analysis):
+        data = _with_deep_stack(pickle.dumps, analysis, pickle.HIGHEST_PROTOCOL)
+        self._write(self._path(key, '.analysis'), 'wb', data)
+
+    def _write(self, p, mode, content):
+        tmp = f'{p}.{os.getpid()}.tmp'
+        with open(tmp, mode) as f:
+            f.write(content)
+        os.replace(tmp, p)
+        #
+        if self._size is None:
+            self._size = self._scan_size()
+        self._size += len(content)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        res = []
+        for e in os.scandir(self.directory):
+            if e.name.endswith(('.evmlike', '.analysis')):
+                try:                      st = e.stat()
+                except FileNotFoundError: continue
+                res.append((st.st_mtime, st.st_size, e.path))
+        return res
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        # Trim to 90% of the limit, so that eviction does not run on every put once full
+        es     = self._entries()
+        size   = sum(size for _, size, _ in es)
+        target = self.max_bytes * 9 // 10
+        n      = 0
+        if size > self.max_bytes:
+            es.sort()
+            for _, s, p in es:
+                if size <= target: break
+                try:                      os.remove(p)
+                except FileNotFoundError: pass
+                size -= s
+                n    += 1
+            log.info('Evicted', n, 'cached results')
+        self._size = size
@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+from .cache import ResultCache
+
+RUNBIN = bytes.fromhex('60005460010160005500')
+PICK   = {'SLOAD': (None, -1), 'SSTORE': ('STOUCH', 0)}
+
+def key_test():
+    with tempfile.TemporaryDirectory() as d:
+        c = ResultCache(d, 1_000_000)
+        k = c.key(RUNBIN, False, None, PICK)
+        assert c.key(RUNBIN, 0, None, dict(reversed(PICK.items()))) == k
+        others = [
+            c.key(RUNBIN + b'\0', False, None,         PICK),
+            c.key(RUNBIN,         True,  None,         PICK),
+            c.key(RUNBIN,         False, [],           PICK),
+            c.key(RUNBIN,         False, [[0, 5]],     PICK),
+            c.key(RUNBIN,         False, None,         {'SLOAD': (None, -1)}),
+            c.analysis_key(RUNBIN, False),
+            c.analysis_key(RUNBIN, True),
+        ]
+        assert len(set(others + [k])) == len(others) + 1
+        # any change to the analyzer's source gives other keys
+        c2 = ResultCache(d, 1_000_000)
+        c2._version = 'other' # pylint: disable=protected-access
+        assert c2.key(RUNBIN, False, None, PICK) != k
+        assert c2.analysis_key(RUNBIN, False) != c.analysis_key(RUNBIN, False)
+        #
+        c.put(k, 'output')
+        assert c.get(k) == 'output'
+        for k2 in others:
+            assert c.get(k2) is None
+        assert (c.hits, c.misses) == (1, len(others))
+
+def evict_test():
+    with tempfile.TemporaryDirectory() as d:
+        c    = ResultCache(d, 1000)
+        keys = [f'k{i}' for i in range(11)]
+        for i, k in enumerate(keys[:10]):
+            c.put(k, 'x' * 100) # exactly full, nothing evicted yet
+            os.utime(os.path.join(d, k + '.evmlike'), (1000 + i, 1000 + i))
+        assert c.get(keys[0]) is not None # now the most recently used
+        # over the limit, the least recently used go until 90% is left
+        c.put(keys[10], 'x' * 100)
+        left = [k for k in keys if os.path.exists(os.path.join(d, k + '.evmlike'))]
+        assert left == [keys[0]] + keys[3:]
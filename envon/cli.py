@@ -1,25 +1,38 @@
 
+import os
 import sys
 import json
 import logging
 import argparse
 
-# from bisect import bisect_right
-
 from envon.helpers import Log
+from envon.jumps   import open_index
+from envon.cache   import ResultCache
+from envon.pick    import parse_pick
 from envon         import graph
 
 log = Log(__name__)
 
 def parse_args():
     parser = argparse.ArgumentParser(prog='envon', description='Create EVM-like code using selected instructions of a given EVM runtime binary code file.')
-    parser.add_argument('--input',     '-i', type=argparse.FileType('r'),                      help='File containing evm runtime bytecode in hex, typ *.runbin.hex')
-    parser.add_argument('--jumps',     '-j', type=argparse.FileType('r'),                      help='JSON file containing known jump edges')
-    parser.add_argument('--skip',      '-s',                              action='store_true', help='Skip blocks with rare instrunctions')
-    parser.add_argument('--pick',      '-p', type=str,                    default='',          help='Comma-separated list of instrunction names needed in the output code')
-    parser.add_argument('--output',    '-o', type=argparse.FileType('w'), default=sys.stdout,  help='File to write code to, typ *.evmlike, [stdout]')
-    parser.add_argument('--log',       '-l', type=argparse.FileType('w'), default=sys.stderr,  help='File to write log to, [stderr]')
-    parser.add_argument('--log-level', '-L', type=str,                    default='info',      help='Minimum log level, see https://docs.python.org/3/library/logging.html#levels, [Info]')
+    parser.add_argument('--input',       '-i', type=argparse.FileType('r'),                      help='File containing evm runtime bytecode in hex, typ *.runbin.hex')
+    parser.add_argument('--jumps',       '-j', type=argparse.FileType('r'),                      help='JSON file containing known jump edges, uses <jumps>.idx if it exists, see envon.jumps')
+    parser.add_argument('--skip',        '-s',                              action='store_true', help='Skip blocks with rare instrunctions')
+    parser.add_argument('--pick',        '-p', type=str,                    default='',          help='Comma-separated list of instrunction names needed in the output code')
+    parser.add_argument('--output',      '-o', type=argparse.FileType('w'), default=sys.stdout,  help='File to write code to, typ *.evmlike, [stdout]')
+    parser.add_argument('--log',         '-l', type=argparse.FileType('w'), default=sys.stderr,  help='File to write log to, [stderr]')
+    parser.add_argument('--log-level',   '-L', type=str,                    default='info',      help='Minimum log level, see https://docs.python.org/3/library/logging.html#levels, [Info]')
+    parser.add_argument('--input-dir',   '-I', type=str,                                         help='Batch mode: directory with *.runbin.hex files to analyze, instead of --input')
+    parser.add_argument('--output-dir',  '-O', type=str,                                         help='Batch mode: directory to write h_<hash>.evmlike files to, instead of --output')
+    parser.add_argument('--workers',     '-w', type=int,                    default=0,           help='Batch mode: number of worker processes, [all cores]')
+    parser.add_argument('--cache-dir',   '-c', type=str,                                         help='Directory to cache results in, reused for the same bytecode, options and known jump edges')
+    parser.add_argument('--cache-size',  '-C', type=int,                    default=1024,        help='Maximum size of the cache directory in MB, [1024]')
+    parser.add_argument('--resumable',   '-R',                              action='store_true', help='With --cache-dir and --jumps: also cache converged analyses, to continue them when more known jumps arrive')
+    parser.add_argument('--profile',     '-P', type=str,                                         help='File to write a JSON profile of the optimizer worklist to, in batch mode a directory for <hash>.profile.json files')
+    parser.add_argument('--max-updates', '-u', type=int,                                         help='Optimizer budget in worklist updates, the output is partial when both budgets are exceeded, [20 per code byte + 100000]')
+    parser.add_argument('--max-time',    '-t', type=int,                                         help='Optimizer budget in ms, the output is partial when both budgets are exceeded, [0.1ms per update of the default update budget]')
+    parser.add_argument('--graph-jobs',  '-g', type=int,                    default=2,           help='With debug logging: number of dot processes rendering graphs at a time, [2]')
+    parser.add_argument('--graph-size',  '-G', type=int,                    default=4000,        help='With debug logging: graphs bigger than this in KB are written as .dot but not rendered, [4000]')
     try:
         args = parser.parse_args()
         #
@@ -30,73 +43,135 @@ def parse_args():
         except ValueError:
             pass
         if 'DEBUG' in ll:
-            graph.config.DISABLED = False
+            graph.config.DISABLED        = False
+            graph.config.RENDER_JOBS     = args.graph_jobs
+            graph.config.RENDER_MAX_SIZE = args.graph_size * 1000
         logging.basicConfig(format='%(levelname)-7s %(name)-40s %(filename)20s:%(lineno)-4d | %(message)s', level=ll, stream=fl)
         #
-        fi   = args.input
-        fo   = args.output
         skip = args.skip
-        assert fi is not None
-        assert fo is not None
-        #
-        log.info('Analyzing', fi.name)
-        log.info('Output is', fo.name)
         log.info('Skip is', 'enabled' if skip else 'disabled')
         #
-        kje = None
-        fj  = args.jumps
+        fj = args.jumps
         if fj:
             log.info('Using known jump edge file', fj.name)
-            code_hash = fi.name.rpartition('/')[2].partition('.')[0]
-            #
+        #
+        if args.input_dir:
+            fi = None
+            fo = None
             kje = None
+            batch = _prepare_batch(args.input_dir, args.output_dir, args.workers, fj)
+        else:
+            fi = args.input
+            fo = args.output
+            assert fi is not None
+            assert fo is not None
             #
-            # The file is sorted so we can binary search it first and keep only the relevant line,
-            # but this needs to be done without reading all lines.
-            # "h_001dd42ca6f50d3cb606eca69dc5127ee42608656b4db9b5ac7fc0485bccd282":[[1382,4228],[97,98],[108,109],[1311,1316],[141,142]],\n
-            # lines = fj.readlines()
-            # i     = bisect_right(lines[1:-1], '"' + code_hash) + 1 # won't exist exactly, so left/right doesn't matter
-            # if lines[i][1:67] == code_hash:
-            #     kje = json.loads(lines[i][69:-2])
+            log.info('Analyzing', fi.name)
+            log.info('Output is', fo.name)
             #
-            # A simple linear scan is ok
-            for line in fj:
-                t = line[1:67]
-                if   t >  code_hash: break
-                elif t == code_hash:
-                    kje = json.loads(line[69:-2])
-                    break
-            #
-            if kje is None:
-                log.warning('Code hash', code_hash, 'not found in jump edges file')
-            elif not kje:
-                log.warning('Known jump list for code hash', code_hash, 'is empty')
+            batch = None
+            kje   = None
+            if fj:
+                code_hash = _code_hash(fi.name)
+                kje = load_known_jump_edges(fj, [code_hash]).get(code_hash)
+                _check_known_jump_edges(code_hash, kje)
         #
         pick = {}
         if args.pick:
             log.info('Will pick', args.pick)
-            log.debug('---- Will pick instructions ----')
-            for name in args.pick.split(','):
-                abc, _, d = name.partition('=')
-                ab,  _, c =  abc.partition(']')
-                a,   _, b =   ab.partition('[')
-                assert not c, name
-                name     = a
-                _ai      = b
-                new_name = d
-                if _ai:
-                    assert new_name, name
-                    ai = int(_ai)
-                    log.debug(f' -> arg {ai:4} of {name:15}' + ('as '+new_name if new_name else ' '))
-                    pick[name] = new_name, ai
-                else:
-                    log.debug(f' -> all args of {  name:15}')
-                    pick[name] =     None, -1
-            log.debug('--------------------------------')
+            pick = parse_pick(args.pick)
+        #
+        cache = None
+        if args.cache_dir:
+            cache = ResultCache(args.cache_dir, args.cache_size * 1_000_000, args.resumable)
+            log.info('Using', cache)
+        #
+        profile = args.profile
+        if profile:
+            log.info('Writing worklist profiles to', profile)
+            if batch is not None:
+                try:                    os.mkdir(profile)
+                except FileExistsError: pass
         #
-        return fi, fo, skip, kje, pick
+        budget = args.max_updates, args.max_time
+        #
+        return fi, fo, skip, kje, pick, batch, cache, profile, budget
         #
     except Exception as e: # pylint: disable=broad-except
         log.exception(e)
         print('\n' + parser.format_help(), file=sys.stderr)
         sys.exit(1)
+
+def _code_hash(fname):
+    return fname.rpartition('/')[2].partition('.')[0]
+
+def _check_known_jump_edges(code_hash, kje):
+    if kje is None:
+        log.warning('Code hash', code_hash, 'not found in jump edges file')
+    elif not kje:
+        log.warning('Known jump list for code hash', code_hash, 'is empty')
+
+def load_known_jump_edges(fj, code_hashes):
+    jx = open_index(fj)
+    if jx is None:
+        log.info('No index for known jump edge file, scanning it')
+        return find_known_jump_edges(fj, code_hashes)
+    #
+    log.info('Using known jump edge index with', len(jx), 'code hashes')
+    res = {}
+    for code_hash in code_hashes:
+        kje = jx.find(code_hash)
+        if kje is not None:
+            res[code_hash] = kje
+    jx.close()
+    return res
+
+def find_known_jump_edges(fj, code_hashes):
+    # The file is sorted so a single linear scan is enough for any number of (sorted) code hashes.
+    # For a single code hash build an index with `python -m envon.jumps` instead, see jumps.py
+    # "h_001dd42ca6f50d3cb606eca69dc5127ee42608656b4db9b5ac7fc0485bccd282":[[1382,4228],[97,98],[108,109],[1311,1316],[141,142]],\n
+    res  = {}
+    todo = sorted(code_hashes, reverse=True)
+    for line in fj:
+        t = line[1:67]
+        while todo and todo[-1] < t:
+            todo.pop()
+        if not todo:
+            break
+        if todo[-1] == t:
+            res[t] = json.loads(line[69:].rstrip().rstrip(',')) # the last line may have neither
+            todo.pop()
+    return res
+
+def _prepare_batch(input_dir, output_dir, workers, fj):
+    assert output_dir is not None
+    try:                    os.mkdir(output_dir)
+    except FileExistsError: pass
+    #
+    fnames = sorted(
+        fname
+        for fname in os.listdir(input_dir)
+        if  fname.endswith('.runbin.hex')
+    )
+    log.info('Batch of', len(fnames), 'contracts from', input_dir, 'to', output_dir)
+    #
+    kjes = None
+    if fj:
+        kjes = load_known_jump_edges(fj, [_code_hash(fname) for fname in fnames])
+    #
+    jobs = []
+    for fname in fnames:
+        code_hash = _code_hash(fname)
+        kje       = None
+        if kjes is not None:
+            kje = kjes.get(code_hash)
+            _check_known_jump_edges(code_hash, kje)
+        jobs.append((
+            os.path.join(input_dir,  fname),
+            os.path.join(output_dir, code_hash + '.evmlike'),
+            kje,
+        ))
+    #
+    if workers <= 0:
+        workers = os.cpu_count()
+    return jobs, workers
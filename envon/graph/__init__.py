@@ -1,3 +1,3 @@
-
 from .config import config
 from .graph  import make_graph_file, make_graph_memory_file, make_graph_ons_file
+from .render import wait_for_graphs
@@ -1,6 +1,8 @@
 
 class _config:
     def __init__(self):
-        self.DISABLED = True
+        self.DISABLED        = True
+        self.RENDER_JOBS     = 2         # dot processes at a time, see render.RenderQueue
+        self.RENDER_MAX_SIZE = 4_000_000 # bytes, bigger .dot files are written but not rendered
 
 config = _config()
@@ -6,29 +6,32 @@ from collections import deque
 from itertools   import chain
 
 from envon.analysis.Valuation import is_valuation
-from envon.helpers            import Log, run_command_bg
+from envon.helpers            import Log
 
-from . import config
+from .        import config
+from .render  import queue
 
 log = Log(__name__)
 
-DOT_COUNT = 0
-
 def dot_graph(analysis, highlights, only_marked):
     #
 
-def _make_graph_file(suffix, content):
+def _make_graph_file(analysis, suffix, content):
+    # numbered per analysis, like the instructions
     assert not config.DISABLED
-    global DOT_COUNT
     try:                    os.mkdir('graphs')
     except FileExistsError: pass
     #
-    prefix     = f'graphs/{DOT_COUNT:03}_{suffix}'
-    DOT_COUNT += 1
+    prefix               = f'graphs/{analysis.graph_count:03}_{suffix}'
+    analysis.graph_count += 1
     with open(prefix+'.dot', 'w') as f:
         f.write(content)
     #
-    run_command_bg('dot', '-Tsvg', prefix+'.dot', '-o', prefix+'.svg')
+    # dot takes minutes and GBs on the biggest graphs, those are left for rendering by hand if needed
+    if len(content) > config.RENDER_MAX_SIZE:
+        log.warning(f'Created graph {prefix}.dot, not rendering it, {len(content)} bytes is over {config.RENDER_MAX_SIZE}')
+        return
+    queue.submit('dot', '-Tsvg', prefix+'.dot', '-o', prefix+'.svg')
     #
     log.info(f'Created graph {prefix}.*')
 
@@ -36,13 +39,13 @@ def make_graph_file(analysis, highlights=None, only_marked=False):
     if config.DISABLED: return
     if  highlights is None:
         highlights = set()
-    _make_graph_file('analysis', dot_graph(analysis, highlights, only_marked))
+    _make_graph_file(analysis, 'analysis', dot_graph(analysis, highlights, only_marked))
 def dot_graph_mem(memory_n):
     #
 
 def make_graph_memory_file(memory_n):
     if config.DISABLED: return
-    _make_graph_file('memory', dot_graph_mem(memory_n))
+    _make_graph_file(memory_n._block._analysis, 'memory', dot_graph_mem(memory_n)) # pylint: disable=protected-access
 
 def set_of_ints_summary(s):
     res   = []
@@ -64,4 +67,4 @@ def dot_graph_ons(analysis, ctx):
 
 def make_graph_ons_file(analysis, ctx):
     if config.DISABLED: return
-    _make_graph_file('output', dot_graph_ons(analysis, ctx))
+    _make_graph_file(analysis, 'output', dot_graph_ons(analysis, ctx))
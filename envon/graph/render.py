@@ -0,0 +1,48 @@
+import atexit
+
+from collections import deque
+
+from envon.helpers import Log, run_command_bg
+
+from . import config
+
+log = Log(__name__)
+
+class RenderQueue:
+    # Renders the graph files in the background, with at most config.RENDER_JOBS dot processes at a time.
+    # The rest wait in order and are started as the earlier ones finish, checked whenever another graph
+    # is made, and at exit, which waits for all of them so that a run ends with its graphs complete.
+
+    def __init__(self):
+        self._running = []
+        self._waiting = deque()
+        self._atexit  = False
+
+    def __len__(self):
+        return len(self._running) + len(self._waiting)
+
+    def submit(self, *args):
+        if not self._atexit:
+            atexit.register(self.wait)
+            self._atexit = True
+        self._waiting.append(args)
+        self._start()
+
+    def _start(self):
+        self._running = [p for p in self._running if p.poll() is None]
+        while self._waiting and len(self._running) < max(config.RENDER_JOBS, 1):
+            self._running.append(run_command_bg(*self._waiting.popleft()))
+
+    def wait(self):
+        self._start()
+        if not self:
+            return
+        log.info('Waiting for', len(self), 'graphs to render')
+        while self._running:
+            self._running.pop(0).wait()
+            self._start()
+
+queue = RenderQueue()
+
+def wait_for_graphs():
+    queue.wait()
@@ -41,7 +41,7 @@ def run_command(*args, check=True, **kwargs):
 def run_command_bg(*args, **kwargs):
     assert all(type(a) is str for a in args), args
     log.info("Running background '" + "' '".join(args) + "'", stacklevel=2)
-    subprocess.Popen(args,              **kwargs) # pylint: disable=consider-using-with
+    return subprocess.Popen(args,       **kwargs) # pylint: disable=consider-using-with
 
 class LoopGuardException(Exception):
     pass
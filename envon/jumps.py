@@ -0,0 +1,117 @@
+
+import os
+import sys
+import json
+import mmap
+import logging
+import struct
+import argparse
+
+from envon.helpers import Log
+
+log = Log(__name__)
+
+# The known jump edges file is a sorted JSON object with one code hash per line:
+# "h_001dd42ca6f50d3cb606eca69dc5127ee42608656b4db9b5ac7fc0485bccd282":[[1382,4228],[97,98],[108,109],[1311,1316],[141,142]],\n
+#
+# The index is a header followed by fixed-width records, sorted by code hash:
+#   header: magic (8 bytes), size of the indexed jumps file (8 bytes, little endian)
+#   record: code hash (32 bytes), byte offset of its line in the jumps file (8 bytes, little endian)
+INDEX_MAGIC  = b'ENVONJI1'
+INDEX_HEADER = struct.Struct('<8sQ')
+INDEX_RECORD = struct.Struct('<32sQ')
+
+def index_name(jumps_name):
+    return jumps_name + '.idx'
+
+def build_index(jumps_name, out_name=None):
+    if out_name is None:
+        out_name = index_name(jumps_name)
+    log.info('Indexing known jump edge file', jumps_name, 'to', out_name)
+    count = 0
+    last  = b''
+    with open(jumps_name, 'rb') as fj, open(out_name, 'wb') as fo:
+        size = os.fstat(fj.fileno()).st_size
+        fo.write(INDEX_HEADER.pack(INDEX_MAGIC, size))
+        offset = 0
+        for line in fj:
+            if line[:3] == b'"h_':
+                h = bytes.fromhex(line[3:67].decode())
+                assert h > last, ('Jump edges file is not sorted', offset)
+                last = h
+                fo.write(INDEX_RECORD.pack(h, offset))
+                count += 1
+            offset += len(line)
+    log.info('Indexed', count, 'code hashes')
+    return count
+
+
+class JumpsIndex:
+
+    def __init__(self, fj, fx):
+        self._jumps = mmap.mmap(fj.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index = mmap.mmap(fx.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, size = INDEX_HEADER.unpack_from(self._index, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError('Bad known jump edge index magic ' + repr(magic))
+        if size != len(self._jumps):
+            raise ValueError(f'Known jump edge index is for a file of {size} bytes, not {len(self._jumps)}')
+        self._count = (len(self._index) - INDEX_HEADER.size) // INDEX_RECORD.size
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, i):
+        return INDEX_RECORD.unpack_from(self._index, INDEX_HEADER.size + i * INDEX_RECORD.size)
+
+    def find_offset(self, code_hash):
+        assert code_hash[:2] == 'h_', code_hash
+        h  = bytes.fromhex(code_hash[2:])
+        lo = 0
+        hi = self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record(mid)[0] < h: lo = mid + 1
+            else:                        hi = mid
+        if lo < self._count:
+            h2, offset = self._record(lo)
+            if h2 == h:
+                return offset
+        return None
+
+    def find(self, code_hash):
+        offset = self.find_offset(code_hash)
+        if offset is None:
+            return None
+        end  = self._jumps.find(b'\n', offset)
+        if end == -1:
+            end = len(self._jumps) # the last line, without a newline
+        line = self._jumps[offset:end].decode()
+        assert line[1:67] == code_hash, (line[:67], code_hash)
+        return json.loads(line[69:].rstrip().rstrip(','))
+
+    def close(self):
+        self._index.close()
+        self._jumps.close()
+
+
+def open_index(fj):
+    # Returns None if there is no (usable) index next to the known jump edge file
+    try:
+        with open(index_name(fj.name), 'rb') as fx:
+            return JumpsIndex(fj, fx)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        log.warning('Ignoring known jump edge index:', e)
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='envon.jumps', description='Build the index for fast lookups in a known jump edges file.')
+    parser.add_argument('jumps',           type=str, help='Sorted JSON file containing known jump edges')
+    parser.add_argument('--output', '-o',  type=str, help='Index file to write, [<jumps>.idx]')
+    args = parser.parse_args()
+    #
+    logging.basicConfig(format='%(levelname)-7s %(name)-40s %(filename)20s:%(lineno)-4d | %(message)s', level='INFO', stream=sys.stderr)
+    build_index(args.jumps, args.output)
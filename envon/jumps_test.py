@@ -0,0 +1,31 @@
+import os
+import tempfile
+
+from .jumps import build_index, open_index
+from .cli   import find_known_jump_edges
+
+HASHES = ['h_' + f'{i:02x}' * 32 for i in (0x01, 0x23, 0x45, 0xab)]
+
+def _jumps_file(d, newline_at_end):
+    # One record per line, the last one without a comma, and maybe without a newline
+    fname = os.path.join(d, 'jumps.json')
+    lines = [f'"{h}":[[{i},{i + 10}],[{i + 1},{i + 2}]]' for i, h in enumerate(HASHES)]
+    with open(fname, 'w') as f:
+        f.write(',\n'.join(lines) + ('\n' if newline_at_end else ''))
+    return fname
+
+def find_test():
+    with tempfile.TemporaryDirectory() as d:
+        for newline_at_end in (True, False):
+            fname = _jumps_file(d, newline_at_end)
+            assert build_index(fname) == len(HASHES)
+            missing = 'h_' + '77' * 32
+            with open(fname) as fj:
+                scanned = find_known_jump_edges(fj, sorted(HASHES + [missing]))
+            with open(fname) as fj:
+                jx = open_index(fj)
+                for i, h in enumerate(HASHES):
+                    assert jx.find(h) == scanned[h] == [[i, i + 10], [i + 1, i + 2]]
+                assert jx.find(missing) is None
+                assert missing not in scanned
+                jx.close()
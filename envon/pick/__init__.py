@@ -1 +1 @@
-from .pick import print_instructions
+from .pick import print_instructions, parse_pick
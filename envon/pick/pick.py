@@ -10,6 +10,30 @@ log = Log(__name__)
 
 MAX_ON_COUNT = 65536
 
+def parse_pick(s):
+    # 'SLOAD,SSTORE[0]=STOUCH' -> {'SLOAD': (None, -1), 'SSTORE': ('STOUCH', 0)}
+    # NAME picks all args of NAME, NAME[i]=NEW picks only arg i of NAME and renames it to NEW
+    pick = {}
+    log.debug('---- Will pick instructions ----')
+    for name in s.split(','):
+        abc, _, d = name.partition('=')
+        ab,  _, c =  abc.partition(']')
+        a,   _, b =   ab.partition('[')
+        assert not c, name
+        name     = a
+        _ai      = b
+        new_name = d
+        if _ai:
+            assert new_name, name
+            ai = int(_ai)
+            log.debug(f' -> arg {ai:4} of {name:15}' + ('as '+new_name if new_name else ' '))
+            pick[name] = new_name, ai
+        else:
+            log.debug(f' -> all args of {  name:15}')
+            pick[name] =     None, -1
+    log.debug('--------------------------------')
+    return pick
+
 def print_instructions(output_file, analysis, selections):
     vs = []
     for b in analysis:
@@ -23,6 +47,7 @@ def print_instructions(output_file, analysis, selections):
                     continue
                 if ai >= 0:
                     v.node.valuation = v.one_arg_form(new_name, ai)
+                    analysis.valuations_changed()
                 vs.append(v)
     #
     print_calc_with_jumps(output_file, analysis, vs)
@@ -107,17 +132,20 @@ class MarkedONsUpdate:
 def print_calc_with_jumps(fo, analysis, vs):
     mark_by_valuation(vs)
     mark_blocks(set(v.node._block for v in vs))
+    # after a partial analysis an unresolved jump may lead to any marked block
+    mark_blocks(set(n._block for n in analysis.unresolved_jumps))
     jumps = set()
     for b in analysis:
         if b.marked:
             if b.has_multiple_out_edges_at_least_1_marked():
                 # TODO: if it is JUMPI, we might be able to one_arg_form it first
                 jumps.add(b.get_jump())
+    # after a partial analysis keep the jumps with unknown targets computed, instead of trusting the edges found so far
+    jumps.update(n for n in analysis.unresolved_jumps if n._block.marked)
     jumps.discard(None)
     mark_by_valuation(n.valuation for n in jumps)
     make_graph_file(analysis)
     make_graph_file(analysis, only_marked=True)
-    log.debug(latest_origin_valuation.stats)
     #
     entry_b = analysis.get_entry_block()
     ctx     = MarkedONsUpdateContext()
@@ -126,13 +154,19 @@ def print_calc_with_jumps(fo, analysis, vs):
         # ctx.resolve_calcs() # only for debug!
         # make_graph_ons_file(analysis, ctx)
         pass
+    if analysis.partial is not None:
+        # and the marked blocks that only unresolved jumps lead to start from nothing
+        for _ in general_worklist([
+            MarkedONsUpdate(ctx, b)
+            for b in analysis
+            if  b.marked and b.marked_ons is None
+        ]): pass
     # Unmark blocks not reached from entry_b
     for b in analysis:
         if b.marked_ons is None: b.marked = False
     #
     ctx.resolve_calcs()
     make_graph_ons_file(analysis, ctx)
-    log.debug(latest_origin_valuation.stats)
     #
     bs = [b for b in analysis if b.marked]
     bs.append(None)
@@ -231,6 +265,13 @@ def print_calc_with_jumps(fo, analysis, vs):
     )
     res.discard(None)
     fo.write(repr(sorted(res)) + '\n')
+    #
+    if analysis.partial is not None:
+        p = analysis.partial
+        fo.write(
+            f'// PARTIAL updates {p["updates"]} max_updates {p["max_updates"]} max_time {p["max_time"]}ms'
+            f' unresolved_jumps {" ".join(repr(n._block) for n in analysis.unresolved_jumps)}\n'
+        )
 
 def stops_fallthrough(on_calc):
     return type(on_calc) is tuple and on_calc[0] in ('JUMP', 'RETURN')
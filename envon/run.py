@@ -0,0 +1,142 @@
+
+import io
+import os
+import multiprocessing
+
+from .assembly import disassemble_compact, read_runbin
+from .analysis import Analysis, Optimizer
+from .analysis.profiling import WorklistProfile
+from .graph    import make_graph_file, make_graph_memory_file, wait_for_graphs
+from .pick     import print_instructions
+
+from envon.helpers import Log
+
+log = Log(__name__)
+
+def run(fi, fo, skip, kje, pick, cache=None, profile=None, budget=(None, None)):
+    return run_runbin(read_runbin(fi), fo, skip, kje, pick, cache, profile, budget, fi.name)
+
+def run_runbin(runbin, fo, skip, kje, pick, cache=None, profile=None, budget=(None, None), name=None):
+    # name is what the profile is labelled with
+    key = None
+    if cache is not None and pick:
+        key = cache.key(runbin, skip, kje, pick)
+        # when profiling the analysis has to run anyway
+        out = cache.get(key) if profile is None else None
+        if out is not None:
+            log.info('Using cached result', key)
+            fo.write(out)
+            return False
+    #
+    a    = None
+    akey = None
+    p    = WorklistProfile() if profile is not None else None
+    o    = Optimizer(p, *budget)
+    try:
+        if cache is not None and cache.analyses and kje is not None:
+            akey = cache.analysis_key(runbin, skip)
+            a    = resume_saved_analysis(cache.get_analysis(akey), kje, o)
+        if a is None:
+            ens = disassemble_compact(runbin)
+            a   = Analysis()
+            a.analyze(ens, skip, kje)
+            o.optimize(a)
+    finally:
+        # also for a contract that failed or ran out of time, these are the ones worth looking at
+        if p is not None:
+            p.write(profile, name)
+    #
+    # before printing, which modifies the analysis
+    if akey is not None and not o.partial:
+        cache.put_analysis(akey, a)
+    #
+    make_graph_file(a)
+    make_graph_memory_file(a.get_entry_block().get_memphi())
+    #
+    if pick:
+        if p is not None:
+            a.latest_hops = p.hops
+        if key is not None:
+            fb = io.StringIO()
+            print_instructions(fb, a, pick)
+            out = fb.getvalue()
+            if not o.partial: # a bigger budget could give a different result
+                cache.put(key, out)
+            fo.write(out)
+        else:
+            print_instructions(fo, a, pick)
+        if p is not None:
+            # again, with the lookups of picking
+            p.write(profile, name)
+    return o.partial
+
+def resume_saved_analysis(a, kje, o):
+    # Continues a saved converged analysis with the known jumps added since, instead of starting over
+    if a is None:
+        return None
+    res = a.add_known_jumps(kje)
+    if res is None:
+        log.info('Saved analysis can not be continued with these known jumps, starting over')
+        return None
+    o.resume(a, *res)
+    return a
+
+
+# Set once per worker process by the pool initializer, so that they are not pickled for every job
+_skip    = False
+_pick    = {}
+_cache   = None
+_profile = None
+_budget  = (None, None)
+
+def _init_worker(skip, pick, cache, profile, budget):
+    global _skip, _pick, _cache, _profile, _budget
+    _skip    = skip
+    _pick    = pick
+    _cache   = cache
+    _profile = profile
+    _budget  = budget
+
+def profile_name(profile_dir, fo_name):
+    return os.path.join(profile_dir, os.path.basename(fo_name).rpartition('.')[0] + '.profile.json')
+
+def _run_job(job):
+    fi_name, fo_name, kje = job
+    log.info('Analyzing', fi_name)
+    hits = _cache.hits if _cache is not None else 0
+    profile = profile_name(_profile, fo_name) if _profile is not None else None
+    partial = False
+    try:
+        with open(fi_name) as fi, open(fo_name, 'w') as fo:
+            partial = run(fi, fo, _skip, kje, _pick, _cache, profile, _budget)
+        ok = True
+    except (Exception, SystemExit) as e: # pylint: disable=broad-except
+        # SystemExit too, as that would kill the worker without a result
+        log.exception('Failed', fi_name, repr(e))
+        try:                      os.remove(fo_name)
+        except FileNotFoundError: pass
+        ok = False
+    # the pool ends its workers without running atexit
+    wait_for_graphs()
+    hit = _cache is not None and _cache.hits > hits
+    return fi_name, ok, hit, partial
+
+def run_batch(jobs, workers, skip, pick, cache=None, profile=None, budget=(None, None)):
+    log.info('Batch of', len(jobs), 'contracts with', workers, 'workers')
+    failed  = 0
+    partial = 0
+    hits    = 0
+    with multiprocessing.Pool(workers, _init_worker, (skip, pick, cache, profile, budget)) as pool:
+        for i, (_, ok, hit, p) in enumerate(pool.imap_unordered(_run_job, jobs, chunksize=4)):
+            if not ok: failed  += 1
+            if p:      partial += 1
+            if hit:    hits    += 1
+            if i & 0x3FF == 0:
+                log.info('Completed', i, 'of', len(jobs), 'contracts')
+    log.info('Batch complete,', len(jobs) - failed, 'ok,', partial, 'of them partial,', failed, 'failed')
+    if cache is not None:
+        # the workers have their own copies of the cache, so count here
+        cache.hits   += hits
+        cache.misses += len(jobs) - hits
+        cache.evict()
+    return failed
@@ -0,0 +1,157 @@
+import io
+import os
+import random
+import sys
+import subprocess
+import tempfile
+
+from .run      import run, resume_saved_analysis
+from .cache    import ResultCache
+from .api      import analyze
+from .assembly import disassemble_compact
+from .analysis import Analysis, Optimizer
+from .pick     import print_instructions
+from .analysis import optimize
+
+# Small contracts: straight line storage, a loop, an internal function called from two places (stack PHIs)
+# and one called from three places behind branches on the calldata, so that each call can be reached without the others
+CONTRACTS = (
+    '60005460010160005500',
+    '60005b8054600101815560010180600a116002575000',
+    '600760016017565b600055601260026017565b600155005b549056',
+    '60003580601357600e60056033565b600055005b600103602657602160076033565b600155005b602e60096033565b600255005b549056',
+)
+PICK      = 'SLOAD,SSTORE'
+PICK_DICT = {name: (None, -1) for name in PICK.split(',')}
+
+def _separate_process(fname):
+    # what `python -m envon` prints for one contract in a process of its own
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    res  = subprocess.run(
+        [sys.executable, '-m', 'envon', '-i', fname, '-p', PICK, '-L', 'error'],
+        cwd=root, check=True, stdout=subprocess.PIPE, text=True,
+    )
+    return res.stdout
+
+def _ids(a):
+    return sorted(n._id for b in a for n in b) # pylint: disable=protected-access
+
+def _in_process(fname):
+    fo = io.StringIO()
+    with open(fname) as fi:
+        run(fi, fo, False, None, PICK_DICT)
+    return fo.getvalue()
+
+def many_contracts_one_process_test():
+    with tempfile.TemporaryDirectory() as d:
+        fnames = []
+        for i, code in enumerate(CONTRACTS):
+            fname = os.path.join(d, f'{i}.runbin.hex')
+            with open(fname, 'w') as f:
+                f.write(code)
+            fnames.append(fname)
+        expected = [_separate_process(fname) for fname in fnames]
+        assert all(expected)
+        # back to back, twice, each one as if it were alone
+        for _ in range(2):
+            for fname, out in zip(fnames, expected):
+                assert _in_process(fname) == out
+        # interleaved, all analyses alive at the same time, twice each
+        analyses = []
+        for code in CONTRACTS + CONTRACTS:
+            a = Analysis()
+            a.analyze(disassemble_compact(bytes.fromhex(code)), False, None)
+            analyses.append(a)
+        for a in analyses:
+            Optimizer().optimize(a)
+        for a, a2 in zip(analyses, analyses[len(CONTRACTS):]):
+            assert _ids(a) == _ids(a2)
+        for a, out in zip(analyses, expected + expected):
+            fo = io.StringIO()
+            print_instructions(fo, a, PICK_DICT)
+            assert fo.getvalue() == out
+
+def _blocks(out):
+    return set(line.partition(' ')[0] for line in out.splitlines() if line[:1] == '~')
+
+def partial_keeps_blocks_test():
+    # With every budget that runs out, the output still has all the blocks of the complete one
+    mask = optimize.BUDGET_MASK
+    optimize.BUDGET_MASK = 0
+    try:
+        for code in CONTRACTS:
+            full = analyze(code, PICK)
+            assert not full.partial
+            partials = 0
+            for max_updates in range(1000):
+                e = analyze(code, PICK, max_updates=max_updates, max_time=0)
+                if not e.partial:
+                    assert e.text == full.text
+                    break
+                partials += 1
+                assert e.lines()[-1].startswith('// PARTIAL')
+                assert _blocks(full.text) <= _blocks(e.text)
+            assert partials > 1
+    finally:
+        optimize.BUDGET_MASK = mask
+
+def _known_jump_edges(code):
+    # The jump edges of a complete analysis, as in a --jumps file
+    a = Analysis()
+    a.analyze(disassemble_compact(bytes.fromhex(code)), False, None)
+    Optimizer().optimize(a)
+    res = []
+    for b in a:
+        n = b.get_jump()
+        if n is not None:
+            for b2 in b.out_edges():
+                res.append([n.en().offset(), b2.offset])
+    return res
+
+def _structure(text, depth=6):
+    # The output with every output number replaced by its defining expression, up to depth, and the lines of
+    # each block in sorted order, as the numbering depends on the order in which the analysis found things
+    defs   = {}
+    blocks = []
+    for line in text.splitlines():
+        on, sep, cmd = line.partition(' = ')
+        if sep:
+            defs[on.strip()] = cmd.split()
+            blocks[-1][1].append(on.strip())
+        else:
+            blocks.append((line, []))
+    def expr(on, d):
+        if on not in defs:
+            return on
+        name, *args = defs[on]
+        if d == 0 or on == '0':
+            return name
+        return name + '(' + ','.join(expr(a, d - 1) for a in args) + ')'
+    return [
+        (head if head[:1] != '[' else sorted(expr(on, depth) for on in head[1:-1].split(', ') if on),
+         sorted(expr(on, depth) for on in ons))
+        for head, ons in blocks
+    ]
+
+def resume_matches_fresh_test():
+    # A saved analysis continued with more known jumps prints the same as a fresh one with all of them
+    rnd = random.Random(1)
+    with tempfile.TemporaryDirectory() as d:
+        cache   = ResultCache(d, 10_000_000, analyses=True)
+        resumed = 0
+        for code in CONTRACTS:
+            runbin = bytes.fromhex(code)
+            kje    = _known_jump_edges(code)
+            for skip in (False, True):
+                akey = cache.analysis_key(runbin, skip)
+                for _ in range(10):
+                    kje1 = [e for e in kje if rnd.random() < 0.6]
+                    analyze(runbin, PICK, skip, kje1, cache=cache) # saves the analysis
+                    a = resume_saved_analysis(cache.get_analysis(akey), kje, Optimizer())
+                    if a is None:
+                        continue
+                    resumed += 1
+                    fo = io.StringIO()
+                    print_instructions(fo, a, PICK_DICT)
+                    assert _structure(fo.getvalue()) == _structure(analyze(runbin, PICK, skip, kje).text)
+        assert resumed > 10
@@ -0,0 +1,53 @@
+import sys
+import time
+import argparse
+
+from envon.assembly                import disassemble_compact, read_runbin
+from envon.analysis                import Analysis, Optimizer
+from envon.analysis.profiling      import WorklistProfile
+
+# Update classes whose throughput is reported separately
+CLASSES = ('ValuationUpdate', 'PHIRefreshUpdate', 'BlockSkipUpdate', 'KillBlockUpdate')
+
+def analyze(runbin, skip):
+    p = WorklistProfile()
+    a = Analysis()
+    a.analyze(disassemble_compact(runbin), skip, None)
+    Optimizer(p).optimize(a)
+    return p
+
+def main(fnames, skip, repeat):
+    runbins = []
+    for fname in fnames:
+        with open(fname) as fi:
+            runbins.append(read_runbin(fi))
+    #
+    best = None
+    for _ in range(repeat):
+        t0      = time.perf_counter_ns()
+        classes = {}
+        for runbin in runbins:
+            for name, c in analyze(runbin, skip).classes.items():
+                acc     = classes.setdefault(name, [0, 0])
+                acc[0] += c[0]
+                acc[1] += c[1]
+        t = time.perf_counter_ns() - t0
+        if best is None or t < best[0]:
+            best = t, classes
+    #
+    t, classes = best
+    print(f'{len(runbins)} contracts, best of {repeat}: {t / 1e9:.3f} s', file=sys.stderr)
+    for name in CLASSES:
+        n, dt = classes.get(name, (0, 0))
+        if n:
+            print(f'{name:20} {n:9} updates {dt / 1e9:7.3f} s {1e9 * n / dt:10.0f} updates/s {dt / n:7.0f} ns/update', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the analysis and the throughput of each optimizer update class on a fixed contract set')
+    parser.add_argument('contracts',    type=str, nargs='+',                      help='runbin files to analyze')
+    parser.add_argument('--skip',   '-s', action='store_true',                    help='skip uncommon blocks, as envon -s')
+    parser.add_argument('--repeat', '-r', type=int,             default=5,        help='number of runs, the best is reported')
+    args = parser.parse_args()
+    #
+    main(args.contracts, args.skip, args.repeat)
@@ -0,0 +1,103 @@
+import sys
+import time
+import argparse
+import contextlib
+
+from collections import defaultdict
+
+import execute
+
+from execute_cli import StorageReader, parse_map, prepare_ctx
+
+# Representative arguments for the per-opcode microbenchmark, memory is the first argument where used
+OPCODE_SAMPLES = {
+    'PHI':          (5, 6),
+    'CALLER':       (),
+    'CALLVALUE':    (),
+    'CALLDATALOAD': (4,),
+    'JUMPI':        (0x1a, 1),
+    'MSTORE':       (0, 0x40, 0x80),
+    'MLOAD':        (0, 0x40),
+    'SHA3':         (0, 0, 0x40),
+    'SLOAD':        (0x1234,),
+    'ADD':          (0x1234, 0x5678),
+    'SUB':          (0x5678, 0x1234),
+    'MUL':          (0x1234, 0x5678),
+    'DIV':          (0x5678, 0x12),
+    'EXP':          (10, 18),
+    'LT':           (0x1234, 0x5678),
+    'GT':           (0x1234, 0x5678),
+    'EQ':           (0x1234, 0x5678),
+    'ISZERO':       (0x1234,),
+    'AND':          (0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF, 0x1234),
+    'OR':           (0x1234, 0x5678),
+    'NOT':          (0x1234,),
+    'SHL':          (0xe0, 1),
+    'SHR':          (0xe0, 0xa9059cbb00000000000000000000000000000000000000000000000000000000),
+    'BYTE':         (31, 0x1234),
+}
+
+def bench_opcodes(n):
+    ctx = {
+        'Block':     7500000,
+        'Address':   0x1000000000000000000000000000000000000001,
+        'Caller':    0x2000000000000000000000000000000000000002,
+        'Callvalue': 0,
+        'Calldata':  bytes.fromhex('a9059cbb' + '00' * 64),
+        'Storage':   defaultdict(dict),
+    }
+    state = execute.ExecutionState()
+    for name, avs in OPCODE_SAMPLES.items():
+        t0 = time.perf_counter()
+        for _ in range(n):
+            execute._execute(ctx, state, name, avs) # pylint: disable=protected-access
+        t = time.perf_counter() - t0
+        print(f'{name:15} {1e9 * t / n:7.0f} ns', file=sys.stderr)
+
+def main(fi, fm, fs, code_dir, repeat):
+    s_reader = StorageReader(fs)
+    code_map = parse_map(fm)
+    ctxs     = []
+    for line in fi:
+        ctx = prepare_ctx(line, code_map, code_dir)
+        ctx['Storage'] = s_reader.read_for_this_tx((ctx['Block'], ctx['Index']))
+        ctxs.append(ctx)
+    #
+    best = None
+    with open('/dev/null', 'w') as null, contextlib.redirect_stdout(null):
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for ctx in ctxs:
+                # fresh storage dicts, as SSTOREs modify them
+                ctx2 = ctx.copy()
+                ctx2['Storage'] = defaultdict(dict, ((a, m.copy()) for a, m in ctx['Storage'].items()))
+                execute.execute_tx(ctx2)
+            t = time.perf_counter() - t0
+            best = t if best is None else min(best, t)
+    #
+    print(f'{len(ctxs)} txs, best of {repeat}: {best:.3f} s, {len(ctxs) / best:.1f} tx/s', file=sys.stderr)
+    print(execute.PROGRAMS, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the EVM-like code execution on a fixed transaction sample')
+    parser.add_argument('--input',    '-i', type=argparse.FileType('r'),                  help='input file with transcations to excecute')
+    parser.add_argument('--addr-map', '-m', type=argparse.FileType('r'),                  help='input file with contract address to code hash pairs')
+    parser.add_argument('--storage',  '-s', type=argparse.FileType('r'),                  help='input file with accessed storage data per tx')
+    parser.add_argument('--code-dir', '-d', type=str,                    default='code/', help='directory with code files for each contract')
+    parser.add_argument('--repeat',   '-r', type=int,                    default=5,       help='number of runs, the best is reported')
+    parser.add_argument('--opcodes',  '-O', type=int,                    default=0,       help='only run the per-opcode microbenchmark, with this many calls per opcode')
+    args = parser.parse_args()
+    #
+    if args.opcodes:
+        bench_opcodes(args.opcodes)
+        sys.exit(0)
+    #
+    if args.input is None or args.addr_map is None or args.storage is None:
+        parser.print_usage()
+        sys.exit(1)
+    #
+    cd = args.code_dir
+    if cd[-1] == '/': cd = cd[:-1]
+    #
+    main(args.input, args.addr_map, args.storage, cd, args.repeat)
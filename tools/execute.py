@@ -2,6 +2,8 @@
 import sys
 import random
 
+from collections import OrderedDict
+
 from Crypto.Hash import keccak
 
 from envon.helpers import Log, u256, s256
@@ -213,22 +215,16 @@ def execute_msg(ctx, state):
         a = ctx['Codeaddr']
         h = ctx['Codemap'][hexint(a)]
         d = ctx['Codedir']
-        with open(f'{d}/h_{h:064x}.evmlike') as fic:
-            code = [l[:-1] for l in fic]
+        prog = PROGRAMS.get(d, h)
     except KeyError as e:
         not_found('No code mapping for contract', f'{a:040x}', repr(e), ctx=ctx)
         pass
-    except FileNotFoundError as e:
-        not_found('No code file for contract', f'{a:040x}', repr(e), f'{d}/h_{h:064x}.evmlike', ctx=ctx)
-        pass
     else:
-        if code:
-            lines = code[:-1]
-            # for c in code: print(c)
-            # gather = json.loads(code[-1])
-            # print(ctx)
-            debug('---> Executing contract at', f'{a:040x}', 'code hash', f'h_{h:064x}', 'lines', len(lines), 'calldata', ctx['Calldata'].hex(), ctx=ctx)
-            ok = execute_with_jumps(ctx, state, lines)
+        if prog is None:
+            not_found('No code file for contract', f'{a:040x}', f'{d}/h_{h:064x}.evmlike', ctx=ctx)
+        elif prog.has_code:
+            debug('---> Executing contract at', f'{a:040x}', 'code hash', f'h_{h:064x}', 'lines', len(prog.lines), 'calldata', ctx['Calldata'].hex(), ctx=ctx)
+            ok = execute_with_jumps(ctx, state, prog)
             debug('---> Execution complete, ok', ok, ctx=ctx)
             return ok
         else:
@@ -236,14 +232,126 @@ def execute_msg(ctx, state):
             pass
     return None
 
-def execute_with_jumps(ctx, state, lines):
+
+# Kinds of decoded lines, the first item of each tuple in Program.code:
+#   (LINE_BLOCK, block, phimap)
+#   (LINE_STOP,)
+#   (LINE_CONST, on, value, name)
+#   (LINE_OP,    on, name, args, has_none, rd, op)
+#   (LINE_JUMP,  on, name, args, has_none, rd, op) also for LINE_JUMPI
+# where rd is has_rd(name), False for PHI whose chosen arg may be unset, or None if the name has no encoding,
+# and op is OPS.get(name)
+LINE_BLOCK = 0
+LINE_STOP  = 1
+LINE_CONST = 2
+LINE_OP    = 3
+LINE_JUMP  = 4
+LINE_JUMPI = 5
+
+def decode_line(line):
+    if line[0] == '~':
+        block, _, _phimap = line.partition(' | ')
+        return LINE_BLOCK, block, _phimap.split()
+    elif line == 'STOP':
+        return (LINE_STOP,)
+    #
+    _on, _, _cmd = line.partition(' = ')
+    on   = int(_on)
+    cmd  = _cmd.split()
+    name = cmd[0]
+    args = tuple(int(a) if a != 'None' else None for a in cmd[1:])
+    #
+    if name[0] == '#':
+        assert not args
+        return LINE_CONST, on, int(name[1:], 16), 'CONSTANT_' + str(len(name)//2).rjust(2)
+    #
+    try:                  rd = name != 'PHI' and has_rd(name)
+    except KeyError:      rd = None
+    if   name == 'JUMP':  kind = LINE_JUMP
+    elif name == 'JUMPI': kind = LINE_JUMPI
+    else:                 kind = LINE_OP
+    return kind, on, name, args, None in args, rd, OPS.get(name)
+
+class Program:
+
+    def __init__(self, code):
+        # trailing comments, i.e. the '// PARTIAL ...' line of a partial analysis
+        while code and code[-1][:2] == '//':
+            code = code[:-1]
+        self.has_code = bool(code)
+        self.lines    = code[:-1]
+        # for c in code: print(c)
+        # gather = json.loads(code[-1])
+        self.code      = [decode_line(line) for line in self.lines]
+        self.block_map = {}
+        self.jump_map  = {}
+        for i, c in enumerate(self.code):
+            if c[0] == LINE_BLOCK:
+                _, block, phimap = c
+                self.block_map[block]               = (i-1, phimap)
+                self.jump_map[int(block[1:], 16)] = i-1
+        # rough memory footprint, the lines dominate
+        self.size = 100 + sum(150 + 2 * len(line) for line in code)
+
+    @staticmethod
+    def load(path):
+        try:
+            with open(path) as fic:
+                code = [l[:-1] for l in fic]
+        except FileNotFoundError:
+            return None
+        return Program(code)
+
+
+class ProgramCache:
+
+    # Missing code files are cached too (as None), with this cost
+    MISSING_SIZE = 100
+
+    def __init__(self, max_bytes=256_000_000):
+        self.max_bytes = max_bytes
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        self._size     = 0
+        self._programs = OrderedDict()
+
+    def __repr__(self):
+        total = self.hits + self.misses
+        rate  = 100 * self.hits / total if total else 0
+        return (
+            f'ProgramCache hits {self.hits} misses {self.misses} ({rate:.1f}% hit rate) evictions {self.evictions} '
+            f'programs {len(self._programs)} size {self._size / 1e6:.1f}/{self.max_bytes / 1e6:.0f}MB'
+        )
+
+    def get(self, code_dir, h):
+        k = code_dir, h
+        try:
+            prog = self._programs[k]
+        except KeyError:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._programs.move_to_end(k)
+            return prog
+        #
+        prog = Program.load(f'{code_dir}/h_{h:064x}.evmlike')
+        self._programs[k] = prog
+        self._size       += prog.size if prog is not None else self.MISSING_SIZE
+        while self._size > self.max_bytes and len(self._programs) > 1:
+            _, p2 = self._programs.popitem(last=False)
+            self._size     -= p2.size if p2 is not None else self.MISSING_SIZE
+            self.evictions += 1
+        return prog
+
+
+PROGRAMS = ProgramCache()
+
+def execute_with_jumps(ctx, state, prog):
     #
-    block_map  = {}
-    for i, line in enumerate(lines):
-        if line[0] == '~':
-            block, _, _phimap = line.partition(' | ')
-            phimap            = _phimap.split()
-            block_map[block]  = (i-1, phimap)
+    lines     = prog.lines
+    code      = prog.code
+    jump_map  = prog.jump_map
     #
     state_q = [state]
     i_max   = len(lines) - 1
@@ -254,92 +362,90 @@ def execute_with_jumps(ctx, state, lines):
             regs      = state.saved_regs
             cur_block = state.saved_cur_block
             i         = state.saved_i
-            line      = ''
             debug('- Resuming at', i)
             while i < i_max and state.gaz > 0:
                 state.gaz -= 1
                 i         += 1
-                line       = lines[i]
+                c          = code[i]
+                kind       = c[0]
                 #
-                if line[0] == '~':
-                    block, _, _ = line.partition(' | ')
-                    _, phimap   = block_map[block]
-                    # debug(block, '<-', cur_block)
-                    on = int(block[1:], 16)
-                    name = 'BLOCKID'
-                    debug(f'{state.gaz:5}| {on:4} = {name:>20}  {block}')
-                    debug(f'{state.gaz:5}| {on:4} = {" ?":>20}')
+                if kind == LINE_BLOCK:
+                    _, block, phimap = c
+                    if DEBUG:
+                        # debug(block, '<-', cur_block)
+                        on = int(block[1:], 16)
+                        name = 'BLOCKID'
+                        debug(f'{state.gaz:5}| {on:4} = {name:>20}  {block}')
+                        debug(f'{state.gaz:5}| {on:4} = {" ?":>20}')
                     try:
                         state.phiindex = phimap.index(cur_block)
                         cur_block      = block
                     except ValueError as e:
-                        warn('At', i, line, 'phimap', phimap, 'cur_block', cur_block, repr(e), ctx=ctx)
+                        warn('At', i, lines[i], 'phimap', phimap, 'cur_block', cur_block, repr(e), ctx=ctx)
                         break
                     #
-                elif line == 'STOP':
+                elif kind == LINE_STOP:
                     break
+                elif kind == LINE_CONST:
+                    _, on, v, name = c
+                    if DEBUG:
+                        debug(f'{state.gaz:5}| {on:4} = {name:>20}')
+                        debug(f'{state.gaz:5}| {on:4} = {str(hexify(v)):>20}')
+                        state.mem.debug()
+                    regs[on] = v
                 else:
-                    _on, _, _cmd = line.partition(' = ')
-                    on   = int(_on)
-                    cmd  = _cmd.split()
-                    name = cmd[0]
-                    args = [int(a) if a != 'None' else None for a in cmd[1:]]
+                    _, on, name, args, has_none, rd, op = c
+                    avs = ()
                     #
                     try:
-                        v = None
-                        if name[0] == '#':
-                            assert not args
-                            v = int(name[1:], 16)
-                            name = 'CONSTANT_' + str(len(name)//2).rjust(2)
-                            debug(f'{state.gaz:5}| {on:4} = {name:>20}')
-                            debug(f'{state.gaz:5}| {on:4} = {str(hexify(v)):>20}')
-                        else:
-                            avs = tuple(regs.get(a) if a is not None else UnknownValue() for a in args)
-                            debug(f'{state.gaz:5}| {on:4} = {name:>20} ', *(hexify(a) for a in avs), args, end='')
-                            # debug(f'{state.gaz:5}| {on:4} = {name:>20} ', end='')
-                            if name != 'PHI':
-                                assert all(a is not None for a in avs)
-                            v   = _execute(ctx, state, name, avs)
-                            debug()
-                            debug(f'{state.gaz:5}| {on:4} = {str(hexify(v)):>20}')
-                            if name != 'PHI' and has_rd(name):
-                                assert v is not None
-                        #
-                        state.mem.debug()
+                        if has_none: avs = tuple(regs.get(a) if a is not None else UnknownValue() for a in args)
+                        else:        avs = tuple([regs.get(a) for a in args]) # pylint: disable=consider-using-generator
+                        if DEBUG:
+                            debug(f'{state.gaz:5}| {on:4} = {name:>20} ', *(hexify(a) for a in avs), list(args), end='')
+                        if name != 'PHI':
+                            assert all(a is not None for a in avs)
                         #
-                        if   v is None: pass
-                        elif type(v) in (int, UnknownValue): regs[on] = v
-                        elif type(v) is JumpTarget:
-                            t = v.decide(block_map)
-                            if t:
-                                if t in block_map:
-                                    i, _ = block_map[t]
-                                    state.gaz += 1 # compensate block header
-                                else:
-                                    break
-                            # t = v.target
-                            # c = v.condition
-                            # if type(c) is int:
-                            #     if c != 0:
-                            #         if t in block_map:
-                            #             i, _ = block_map[t]
-                            #         else:
-                            #             break
-                            # else:
-                            #     assert type(c) is UnknownValue
-                            #     if t in block_map:
-                            #         debug('- Saving state at', i)
-                            #         s2 = state.copy()
-                            #         s2.saved_regs      = regs
-                            #         s2.saved_cur_block = cur_block
-                            #         s2.saved_i         = i
-                            #         state_q.append(s2)
-                            #         i, _ = block_map[t]
+                        if kind == LINE_OP:
+                            # same as _execute(ctx, state, name, avs), with the lookup done when decoding
+                            if op is None:
+                                v = _execute(ctx, state, name, avs)
+                            else:
+                                f, ints_only = op
+                                if ints_only and not all(type(av) is int for av in avs): v = UnknownValue()
+                                else:                                                    v = f(ctx, state, avs)
+                            if DEBUG:
+                                debug()
+                                debug(f'{state.gaz:5}| {on:4} = {str(hexify(v)):>20}')
+                            if rd is None: rd = has_rd(name) # raises for names without an encoding
+                            if rd:
+                                assert v is not None
+                            if DEBUG:
+                                state.mem.debug()
+                            #
+                            if   v is None: pass
+                            elif type(v) in (int, UnknownValue): regs[on] = v
+                            else:
+                                raise WarnError('v is ' + repr(v))
                         else:
-                            raise WarnError('v is ' + repr(v))
+                            # JUMP or JUMPI, see JumpTarget for the text form
+                            a0 = avs[0]
+                            t  = jump_map.get(a0) if type(a0) is int else None
+                            if kind == LINE_JUMP: cond = 1
+                            else:                 cond = avs[1]
+                            if DEBUG:
+                                debug()
+                                debug(f'{state.gaz:5}| {on:4} = {str(hexify(JumpTarget(f"~{a0:x}" if type(a0) is int else "~", cond))):>20}')
+                            if type(cond) is int:
+                                if cond != 0:
+                                    if t is None: break
+                                    i = t
+                                    state.gaz += 1 # compensate block header
+                            elif t is not None:
+                                i = t
+                                state.gaz += 1 # compensate block header
                         #
                     except Exception as e:
-                        log.exception('At', i, line, 'name', name, 'avs', hexify(avs), 'args', args, 'tx', (ctx['Block'], ctx['Index']))
+                        log.exception('At', i, lines[i], 'name', name, 'avs', hexify(avs), 'args', list(args), 'tx', (ctx['Block'], ctx['Index']))
                         if type(e) is not WarnError:
                             # break
                             return False
@@ -349,7 +455,7 @@ def execute_with_jumps(ctx, state, lines):
             else:
                 debug('Gaz left:', state.gaz, ctx=ctx)
     except:
-        warn('line', i, line, ctx=ctx)
+        warn('line', i, lines[i] if 0 <= i <= i_max else '', ctx=ctx)
         raise
     #
     # for i, v in enumerate(regs): debug(f' {i:4} = {v:64x}')
@@ -398,317 +504,390 @@ class JumpTarget:
 
 
 def _execute(ctx, state, name, avs):
-    if   name == 'PHI':
-        # for a in avs:
-        #     if type(a) is int:
-        #         return a
-        # raise EmptyPHIError()
-        return avs[state.phiindex]
-        #
-    elif name == 'CALLDATASIZE':
-        () = avs
-        return len(ctx['Calldata'])
-        #
-    elif name == 'CALLVALUE':
-        () = avs
-        return ctx['Callvalue']
-        #
-    elif name == 'CALLER':
-        () = avs
-        return ctx['Caller']
-        #
-    elif name == 'ADDRESS':
-        () = avs
-        return ctx['Address']
-        #
-    elif name == 'TIMESTAMP':
-        () = avs
-        return ctx['Timestamp']
-        #
-    elif name == 'ORIGIN':
-        () = avs
-        return ctx['Origin']
-        #
-    elif name == 'NUMBER':
-        () = avs
-        return ctx['Block']
-        #
-    elif name == 'CHAINID':
-        () = avs
-        return 1
-        #
-    elif name == 'DIFFICULTY':
-        () = avs
-        return ctx['Difficulty']
-        #
-    elif name == 'GAS':
-        () = avs
-        return ctx['Gaslimit']
-        #
-    elif name == 'GASLIMIT':
-        () = avs
-        return ctx['Gaslimit']
-        #
-    elif name == 'COINBASE':
-        () = avs
-        return ctx['Coinbase']
-        #
-    elif name == 'MSIZE':
-        () = avs
-        return state.mem.msize
-        #
-    elif name == 'RETURNDATASIZE':
-        () = avs
-        return UnknownValue()
-        #
-    elif name == 'CODESIZE':
-        () = avs
-        return UnknownValue()
-        #
-    elif name == 'GASPRICE':
-        () = avs
-        return UnknownValue()
-        #
-    elif name == 'JUMP':
-        a0, = avs
-        return JumpTarget(f'~{a0:x}' if type(a0) is int else '~', 1)
-        #
-    elif name == 'JUMPI':
-        a0, a1 = avs
-        return JumpTarget(f'~{a0:x}' if type(a0) is int else '~', a1)
-        #
-    elif name == 'STOUCH':
-        a0, = avs
-        if type(a0) is int:
-            state.sstores.add(a0)
-            state.sstore_n += 1
-            ctx['Storage'][ctx['Address']][a0] = UnknownValue()
-            debug(f' STOUCH {a0:#064x}', end='')
-        return None
-        #
-    elif name == 'SSTORE':
-        a0, a1 = avs
-        if type(a0) is int:
-            state.sstores.add(a0)
-            state.sstore_n += 1
-            ctx['Storage'][ctx['Address']][a0] = a1
-            debug(f' SSTORE {a0:#064x}', end='')
-        return None
-        #
-    elif name == 'MSTORE':
-        _, a1, a2 = avs
-        if type(a1) is int:
-            if type(a2) is int: state.mem.set_u256(   a1, a2)
-            else:               state.mem.set_unknown(a1, a1+32)
-        return None
-        #
-    elif name == 'MSTORE8':
-        _, a1, a2 = avs
-        if type(a1) is int:
-            if type(a2) is int: state.mem.set_byte(   a1, a2 & 0xFF)
-            else:               state.mem.set_unknown(a1, a1+1)
-        return None
-        #
-    elif not all(type(av) is int for av in avs):
-        return UnknownValue()
-        #
-    elif name == 'CALLDATALOAD':
-        a0, = avs
-        if a0 < 65536: return bytes_to_u256(ctx['Calldata'][a0:a0+32].ljust(32, b'\x00'))
-        else:          return UnknownValue()
-        #
-    elif name == 'CALLDATACOPY':
-        _, a1, a2, a3 = avs
-        if a2+a3 < 65536:
-            state.mem.set(a1, a1+a3, ctx['Calldata'][a2:a2+a3].ljust(a3, b'\x00'))
-        return None
-        #
-    elif name == 'ADD':
-        a0, a1 = avs
-        return u256(a0 + a1)
-        #
-    elif name == 'SUB':
-        a0, a1 = avs
-        return u256(a0 - a1)
-        #
-    elif name == 'MUL':
-        a0, a1 = avs
-        return u256(a0 * a1)
-        #
-    elif name == 'DIV':
-        a0, a1 = avs
-        return a0 // a1 if a1 != 0 else 0
-        #
-    elif name == 'SDIV':
-        a0, a1 = avs
-        return u256(s256(a0) // s256(a1)) if a1 != 0 else 0
-        #
-    elif name == 'MOD':
-        a0, a1 = avs
-        return a0 % a1 if a1 != 0 else 0
-        #
-    elif name == 'SMOD':
-        a0, a1 = avs
-        return u256(s256(a0) % s256(a1)) if a1 != 0 else 0
-        #
-    elif name == 'ADDMOD':
-        a0, a1, a2 = avs
-        return (a0 + a1) % a2 if a2 != 0 else 0
-        #
-    elif name == 'MULMOD':
-        a0, a1, a2 = avs
-        return (a0 * a1) % a2 if a2 != 0 else 0
-        #
-    elif name == 'EXP':
-        a0, a1 = avs
-        if a1 == 0: return 1
-        if a0 == 0: return 0
-        if a0 == 1: return 1
-        if a0 == 2: return u256(1 << min(a1, 256))
-        if a1 > 256:
-            warn('Too large EXP', a0, a1, ctx=ctx)
+    op = OPS.get(name)
+    if op is None:
+        if not all(type(av) is int for av in avs):
             return UnknownValue()
-        return exp_u256(a0, a1)
-        #
-    elif name == 'SIGNEXTEND':
-        a0, a1 = avs
-        if a0 < 31:
-            m = 1 << (8 * (a0 + 1))
-            r = a1 & (m - 1)
-            s = a1 &  m
-            return u256(r - s)
-        else:
-            return a1
-        #
-    elif name == 'LT':
-        a0, a1 = avs
-        return 1 if a0 < a1 else 0
-        #
-    elif name == 'GT':
-        a0, a1 = avs
-        return 1 if a0 > a1 else 0
-        #
-    elif name == 'SLT':
-        a0, a1 = avs
-        return 1 if s256(a0) < s256(a1) else 0
-        #
-    elif name == 'SGT':
-        a0, a1 = avs
-        return 1 if s256(a0) > s256(a1) else 0
-        #
-    elif name == 'EQ':
-        a0, a1 = avs
-        return 1 if a0 == a1 else 0
-        #
-    elif name == 'ISZERO':
-        a0, = avs
-        return 1 if a0 == 0 else 0
-        #
-    elif name == 'AND':
-        a0, a1 = avs
-        return a0 & a1
-        #
-    elif name == 'OR':
-        a0, a1 = avs
-        return a0 | a1
-        #
-    elif name == 'XOR':
-        a0, a1 = avs
-        return a0 ^ a1
-        #
-    elif name == 'NOT':
-        a0, = avs
-        return u256(~a0)
-        #
-    elif name == 'BYTE':
-        a0, a1 = avs
-        return (a1 >> (8 * (31 - a0))) & 0xFF if a0 < 32 else 0
-    elif name == 'SHL':
-        a0, a1 = avs
-        return u256(a1 << a0) if a0 < 256 else 0
-        #
-    elif name == 'SHR':
-        a0, a1 = avs
-        return u256(a1 >> a0) if a0 < 256 else 0
-        #
-    elif name == 'SAR':
-        a0, a1 = avs
-        return u256(s256(a1) >> a0) if a0 < 256 else 0
-        #
-    elif name == 'CODECOPY':
-        _, a1, a2, a3 = avs
-        # clear mem, since we don't have runbin here
-        state.mem.set_unknown(a1, a1+a3)
-        return None
-        #
-    elif name == 'RETURNDATACOPY':
-        _, a1, a2, a3 = avs
-        state.mem.set_unknown(a1, a1+a3)
-        return None
-        #
-    elif name == 'CALL':
-        _, a1, a2, a3, a4, a5, a6, a7 = avs
-        return _call_common(ctx, state, ctx['Address'], a1,             a2, a2,               a3, a4, a4+a5, a6, a6+a7)
-        #
-    elif name == 'CALLCODE':
-        _, a1, a2, a3, a4, a5, a6, a7 = avs
-        return _call_common(ctx, state, ctx['Address'], a1, ctx['Address'], a2,               a3, a4, a4+a5, a6, a6+a7)
-        #
-    elif name == 'DELEGATECALL':
-        _, a1, a2, a3, a4, a5, a6 = avs
-        return _call_common(ctx, state, ctx['Caller'],  a1, ctx['Address'], a2, ctx['Callvalue'], a3, a3+a4, a5, a5+a6)
-        #
-    elif name == 'STATICCALL':
-        _, a1, a2, a3, a4, a5, a6 = avs
-        return _call_common(ctx, state, ctx['Address'], a1, ctx['Address'], a2,                0, a3, a3+a4, a5, a5+a6)
-        #
-    elif name == 'MLOAD':
-        _, a1 = avs
-        return state.mem.get_u256(a1)
-        #
-    elif name == 'SHA3':
-        _, a1, a2 = avs
-        d = state.mem.get(a1, a1+a2)
-        if type(d) is UnknownValue: return UNKNOWN_SHA
-        else:                       return sha3(d)
-        #
-    elif name == 'SHA3i':
-        return sha3(b''.join(
-            u256_to_bytes(a)
-            for a in avs
-        ))
-        #
-    elif name == 'SLOAD':
-        a0, = avs
-        state.sloads.add(a0)
-        state.sload_n += 1
-        debug(f' SLOAD {a0:#064x}', end='')
-        return UnknownValue()
-        # print('\n\n\n\n\n', hexify(ctx['Address']), hexify(a0), hexify(ctx['Storage'][ctx['Address']]), '\n\n\n\n')
-        v = ctx['Storage'][ctx['Address']].get(a0)
-        return v if v is not None else UnknownValue()
-        #
-    elif name == 'BLOCKHASH':
-        a0, = avs
-        delta = ctx['Block'] - a0 - 1
-        if 0 <= delta < 256: return sha3(b'BLOCKHASH_abcdef01234567' + a0.to_bytes(8, 'big'))
-        else:                return 0
-        #
-    elif name == 'EXTCODESIZE':
-        a0, = avs
+        raise UnknownInstructionError(name)
+    f, ints_only = op
+    if ints_only and not all(type(av) is int for av in avs):
         return UnknownValue()
-        #
-    elif name == 'BALANCE':
-        a0, = avs
+    return f(ctx, state, avs)
+
+#
+# Handlers for _execute, registered in OPS below.
+# The ones before the UnknownValue check in OPS handle unknown arguments themselves,
+# the rest only get called when all arguments are known ints.
+#
+# They all take (ctx, state, avs), whether they use them or not.
+# pylint: disable=unused-argument
+
+def _op_phi(ctx, state, avs):
+    # for a in avs:
+    #     if type(a) is int:
+    #         return a
+    # raise EmptyPHIError()
+    return avs[state.phiindex]
+
+def _op_calldatasize(ctx, state, avs):
+    () = avs
+    return len(ctx['Calldata'])
+
+def _op_callvalue(ctx, state, avs):
+    () = avs
+    return ctx['Callvalue']
+
+def _op_caller(ctx, state, avs):
+    () = avs
+    return ctx['Caller']
+
+def _op_address(ctx, state, avs):
+    () = avs
+    return ctx['Address']
+
+def _op_timestamp(ctx, state, avs):
+    () = avs
+    return ctx['Timestamp']
+
+def _op_origin(ctx, state, avs):
+    () = avs
+    return ctx['Origin']
+
+def _op_number(ctx, state, avs):
+    () = avs
+    return ctx['Block']
+
+def _op_chainid(ctx, state, avs):
+    () = avs
+    return 1
+
+def _op_difficulty(ctx, state, avs):
+    () = avs
+    return ctx['Difficulty']
+
+def _op_gas(ctx, state, avs):
+    () = avs
+    return ctx['Gaslimit']
+
+def _op_gaslimit(ctx, state, avs):
+    () = avs
+    return ctx['Gaslimit']
+
+def _op_coinbase(ctx, state, avs):
+    () = avs
+    return ctx['Coinbase']
+
+def _op_msize(ctx, state, avs):
+    () = avs
+    return state.mem.msize
+
+def _op_unknown0(ctx, state, avs):
+    # RETURNDATASIZE, CODESIZE, GASPRICE
+    () = avs
+    return UnknownValue()
+
+def _op_jump(ctx, state, avs):
+    a0, = avs
+    return JumpTarget(f'~{a0:x}' if type(a0) is int else '~', 1)
+
+def _op_jumpi(ctx, state, avs):
+    a0, a1 = avs
+    return JumpTarget(f'~{a0:x}' if type(a0) is int else '~', a1)
+
+def _op_stouch(ctx, state, avs):
+    a0, = avs
+    if type(a0) is int:
+        state.sstores.add(a0)
+        state.sstore_n += 1
+        ctx['Storage'][ctx['Address']][a0] = UnknownValue()
+        debug(f' STOUCH {a0:#064x}', end='')
+    return None
+
+def _op_sstore(ctx, state, avs):
+    a0, a1 = avs
+    if type(a0) is int:
+        state.sstores.add(a0)
+        state.sstore_n += 1
+        ctx['Storage'][ctx['Address']][a0] = a1
+        debug(f' SSTORE {a0:#064x}', end='')
+    return None
+
+def _op_mstore(ctx, state, avs):
+    _, a1, a2 = avs
+    if type(a1) is int:
+        if type(a2) is int: state.mem.set_u256(   a1, a2)
+        else:               state.mem.set_unknown(a1, a1+32)
+    return None
+
+def _op_mstore8(ctx, state, avs):
+    _, a1, a2 = avs
+    if type(a1) is int:
+        if type(a2) is int: state.mem.set_byte(   a1, a2 & 0xFF)
+        else:               state.mem.set_unknown(a1, a1+1)
+    return None
+
+def _op_calldataload(ctx, state, avs):
+    a0, = avs
+    if a0 < 65536: return bytes_to_u256(ctx['Calldata'][a0:a0+32].ljust(32, b'\x00'))
+    else:          return UnknownValue()
+
+def _op_calldatacopy(ctx, state, avs):
+    _, a1, a2, a3 = avs
+    if a2+a3 < 65536:
+        state.mem.set(a1, a1+a3, ctx['Calldata'][a2:a2+a3].ljust(a3, b'\x00'))
+    return None
+
+def _op_add(ctx, state, avs):
+    a0, a1 = avs
+    return u256(a0 + a1)
+
+def _op_sub(ctx, state, avs):
+    a0, a1 = avs
+    return u256(a0 - a1)
+
+def _op_mul(ctx, state, avs):
+    a0, a1 = avs
+    return u256(a0 * a1)
+
+def _op_div(ctx, state, avs):
+    a0, a1 = avs
+    return a0 // a1 if a1 != 0 else 0
+
+def _op_sdiv(ctx, state, avs):
+    a0, a1 = avs
+    return u256(s256(a0) // s256(a1)) if a1 != 0 else 0
+
+def _op_mod(ctx, state, avs):
+    a0, a1 = avs
+    return a0 % a1 if a1 != 0 else 0
+
+def _op_smod(ctx, state, avs):
+    a0, a1 = avs
+    return u256(s256(a0) % s256(a1)) if a1 != 0 else 0
+
+def _op_addmod(ctx, state, avs):
+    a0, a1, a2 = avs
+    return (a0 + a1) % a2 if a2 != 0 else 0
+
+def _op_mulmod(ctx, state, avs):
+    a0, a1, a2 = avs
+    return (a0 * a1) % a2 if a2 != 0 else 0
+
+def _op_exp(ctx, state, avs):
+    a0, a1 = avs
+    if a1 == 0: return 1
+    if a0 == 0: return 0
+    if a0 == 1: return 1
+    if a0 == 2: return u256(1 << min(a1, 256))
+    if a1 > 256:
+        warn('Too large EXP', a0, a1, ctx=ctx)
         return UnknownValue()
-        #
-    elif name == 'FW':
-        warn('!! FW detected !!', ctx=ctx)
-        a0, = avs
-        return a0
-        #
+    return exp_u256(a0, a1)
+
+def _op_signextend(ctx, state, avs):
+    a0, a1 = avs
+    if a0 < 31:
+        m = 1 << (8 * (a0 + 1))
+        r = a1 & (m - 1)
+        s = a1 &  m
+        return u256(r - s)
     else:
-        raise UnknownInstructionError(name)
+        return a1
+
+def _op_lt(ctx, state, avs):
+    a0, a1 = avs
+    return 1 if a0 < a1 else 0
+
+def _op_gt(ctx, state, avs):
+    a0, a1 = avs
+    return 1 if a0 > a1 else 0
+
+def _op_slt(ctx, state, avs):
+    a0, a1 = avs
+    return 1 if s256(a0) < s256(a1) else 0
+
+def _op_sgt(ctx, state, avs):
+    a0, a1 = avs
+    return 1 if s256(a0) > s256(a1) else 0
+
+def _op_eq(ctx, state, avs):
+    a0, a1 = avs
+    return 1 if a0 == a1 else 0
+
+def _op_iszero(ctx, state, avs):
+    a0, = avs
+    return 1 if a0 == 0 else 0
+
+def _op_and(ctx, state, avs):
+    a0, a1 = avs
+    return a0 & a1
+
+def _op_or(ctx, state, avs):
+    a0, a1 = avs
+    return a0 | a1
+
+def _op_xor(ctx, state, avs):
+    a0, a1 = avs
+    return a0 ^ a1
+
+def _op_not(ctx, state, avs):
+    a0, = avs
+    return u256(~a0)
+
+def _op_byte(ctx, state, avs):
+    a0, a1 = avs
+    return (a1 >> (8 * (31 - a0))) & 0xFF if a0 < 32 else 0
+
+def _op_shl(ctx, state, avs):
+    a0, a1 = avs
+    return u256(a1 << a0) if a0 < 256 else 0
+
+def _op_shr(ctx, state, avs):
+    a0, a1 = avs
+    return u256(a1 >> a0) if a0 < 256 else 0
+
+def _op_sar(ctx, state, avs):
+    a0, a1 = avs
+    return u256(s256(a1) >> a0) if a0 < 256 else 0
+
+def _op_codecopy(ctx, state, avs):
+    _, a1, _, a3 = avs
+    # clear mem, since we don't have runbin here
+    state.mem.set_unknown(a1, a1+a3)
+    return None
+
+def _op_returndatacopy(ctx, state, avs):
+    _, a1, _, a3 = avs
+    state.mem.set_unknown(a1, a1+a3)
+    return None
+
+def _op_call(ctx, state, avs):
+    _, a1, a2, a3, a4, a5, a6, a7 = avs
+    return _call_common(ctx, state, ctx['Address'], a1,             a2, a2,               a3, a4, a4+a5, a6, a6+a7)
+
+def _op_callcode(ctx, state, avs):
+    _, a1, a2, a3, a4, a5, a6, a7 = avs
+    return _call_common(ctx, state, ctx['Address'], a1, ctx['Address'], a2,               a3, a4, a4+a5, a6, a6+a7)
+
+def _op_delegatecall(ctx, state, avs):
+    _, a1, a2, a3, a4, a5, a6 = avs
+    return _call_common(ctx, state, ctx['Caller'],  a1, ctx['Address'], a2, ctx['Callvalue'], a3, a3+a4, a5, a5+a6)
+
+def _op_staticcall(ctx, state, avs):
+    _, a1, a2, a3, a4, a5, a6 = avs
+    return _call_common(ctx, state, ctx['Address'], a1, ctx['Address'], a2,                0, a3, a3+a4, a5, a5+a6)
+
+def _op_mload(ctx, state, avs):
+    _, a1 = avs
+    return state.mem.get_u256(a1)
+
+def _op_sha3(ctx, state, avs):
+    _, a1, a2 = avs
+    d = state.mem.get(a1, a1+a2)
+    if type(d) is UnknownValue: return UNKNOWN_SHA
+    else:                       return sha3(d)
+
+def _op_sha3i(ctx, state, avs):
+    return sha3(b''.join(
+        u256_to_bytes(a)
+        for a in avs
+    ))
+
+def _op_sload(ctx, state, avs):
+    a0, = avs
+    state.sloads.add(a0)
+    state.sload_n += 1
+    debug(f' SLOAD {a0:#064x}', end='')
+    return UnknownValue()
+    # print('\n\n\n\n\n', hexify(ctx['Address']), hexify(a0), hexify(ctx['Storage'][ctx['Address']]), '\n\n\n\n')
+    # v = ctx['Storage'][ctx['Address']].get(a0)
+    # return v if v is not None else UnknownValue()
+
+def _op_blockhash(ctx, state, avs):
+    a0, = avs
+    delta = ctx['Block'] - a0 - 1
+    if 0 <= delta < 256: return sha3(b'BLOCKHASH_abcdef01234567' + a0.to_bytes(8, 'big'))
+    else:                return 0
+
+def _op_unknown1(ctx, state, avs):
+    # EXTCODESIZE, BALANCE
+    _, = avs
+    return UnknownValue()
+
+def _op_fw(ctx, state, avs):
+    warn('!! FW detected !!', ctx=ctx)
+    a0, = avs
+    return a0
+
+OPS = {
+    # NAME -> handler, ints_only (returns UnknownValue without calling the handler if any argument is not an int)
+    'PHI':            (_op_phi,            False),
+    'CALLDATASIZE':   (_op_calldatasize,   False),
+    'CALLVALUE':      (_op_callvalue,      False),
+    'CALLER':         (_op_caller,         False),
+    'ADDRESS':        (_op_address,        False),
+    'TIMESTAMP':      (_op_timestamp,      False),
+    'ORIGIN':         (_op_origin,         False),
+    'NUMBER':         (_op_number,         False),
+    'CHAINID':        (_op_chainid,        False),
+    'DIFFICULTY':     (_op_difficulty,     False),
+    'GAS':            (_op_gas,            False),
+    'GASLIMIT':       (_op_gaslimit,       False),
+    'COINBASE':       (_op_coinbase,       False),
+    'MSIZE':          (_op_msize,          False),
+    'RETURNDATASIZE': (_op_unknown0,       False),
+    'CODESIZE':       (_op_unknown0,       False),
+    'GASPRICE':       (_op_unknown0,       False),
+    'JUMP':           (_op_jump,           False),
+    'JUMPI':          (_op_jumpi,          False),
+    'STOUCH':         (_op_stouch,         False),
+    'SSTORE':         (_op_sstore,         False),
+    'MSTORE':         (_op_mstore,         False),
+    'MSTORE8':        (_op_mstore8,        False),
+    #
+    'CALLDATALOAD':   (_op_calldataload,   True),
+    'CALLDATACOPY':   (_op_calldatacopy,   True),
+    'ADD':            (_op_add,            True),
+    'SUB':            (_op_sub,            True),
+    'MUL':            (_op_mul,            True),
+    'DIV':            (_op_div,            True),
+    'SDIV':           (_op_sdiv,           True),
+    'MOD':            (_op_mod,            True),
+    'SMOD':           (_op_smod,           True),
+    'ADDMOD':         (_op_addmod,         True),
+    'MULMOD':         (_op_mulmod,         True),
+    'EXP':            (_op_exp,            True),
+    'SIGNEXTEND':     (_op_signextend,     True),
+    'LT':             (_op_lt,             True),
+    'GT':             (_op_gt,             True),
+    'SLT':            (_op_slt,            True),
+    'SGT':            (_op_sgt,            True),
+    'EQ':             (_op_eq,             True),
+    'ISZERO':         (_op_iszero,         True),
+    'AND':            (_op_and,            True),
+    'OR':             (_op_or,             True),
+    'XOR':            (_op_xor,            True),
+    'NOT':            (_op_not,            True),
+    'BYTE':           (_op_byte,           True),
+    'SHL':            (_op_shl,            True),
+    'SHR':            (_op_shr,            True),
+    'SAR':            (_op_sar,            True),
+    'CODECOPY':       (_op_codecopy,       True),
+    'RETURNDATACOPY': (_op_returndatacopy, True),
+    'CALL':           (_op_call,           True),
+    'CALLCODE':       (_op_callcode,       True),
+    'DELEGATECALL':   (_op_delegatecall,   True),
+    'STATICCALL':     (_op_staticcall,     True),
+    'MLOAD':          (_op_mload,          True),
+    'SHA3':           (_op_sha3,           True),
+    'SHA3i':          (_op_sha3i,          True),
+    'SLOAD':          (_op_sload,          True),
+    'BLOCKHASH':      (_op_blockhash,      True),
+    'EXTCODESIZE':    (_op_unknown1,       True),
+    'BALANCE':        (_op_unknown1,       True),
+    'FW':             (_op_fw,             True),
+}
+# pylint: enable=unused-argument
 
 def _call_common(ctx, state, caller, gaslim, addr, code_addr, value, i0, i1, o0, o1):
     # if value > ctx['Callvalue']: # we can't say that, there might be balance
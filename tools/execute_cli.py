@@ -1,11 +1,18 @@
 
+import io
+import os
 import sys
 import json
 import argparse
+import contextlib
+import multiprocessing
 
-from collections import defaultdict
+from collections import defaultdict, deque
 
-from execute import execute_tx, debug, warn, sha3
+import execute
+
+from execute     import execute_tx, debug, warn, sha3
+from storage_bin import BinaryStorageReader, is_binary_storage
 
 class StorageReader:
 
@@ -17,6 +24,31 @@ class StorageReader:
     def _readline(self):
         self.line = self.f.readline()
 
+    def _first_block_after(self, pos):
+        # Block of the first S line starting at or after pos, or None at the end of the file
+        f = self.f
+        f.seek(pos - 1 if pos > 0 else 0)
+        if pos > 0: f.readline()
+        while True:
+            line = f.readline()
+            if not line:        return None
+            if line[0] == 'S':  return int(line.split(maxsplit=2)[1])
+
+    def seek_block(self, block):
+        # The file is sorted by tx, so binary search for the first line of `block` instead of reading all lines before it
+        f = self.f
+        f.seek(0, 2)
+        lo = 0
+        hi = f.tell()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            b   = self._first_block_after(mid)
+            if b is not None and b < block: lo = mid + 1
+            else:                            hi = mid
+        f.seek(lo - 1 if lo > 0 else 0)
+        if lo > 0: f.readline()
+        self._readline()
+
     def read_for_this_tx(self, tx):
         res = defaultdict(dict)
         while self.line:
@@ -84,10 +116,8 @@ def prepare_ctx(line, code_map, code_dir):
         'Calldata':   bytes.fromhex(t['Calldata'  ]),
     }
 
-def main(fi, fm, fs, code_dir):
-    s_reader = StorageReader(fs)
-    code_map = parse_map(fm)
-    for i, line in enumerate(fi):
+def execute_txs(lines, s_reader, code_map, code_dir):
+    for i, line in enumerate(lines):
         # if i > 10000: break
         #
         ctx = prepare_ctx(line, code_map, code_dir)
@@ -99,13 +129,84 @@ def main(fi, fm, fs, code_dir):
         execute_tx(ctx)
         # return
 
+def open_storage(fs):
+    # Only a regular file can be binary, sniffing a pipe or stdin by name would lose what it read
+    if os.path.isfile(fs.name) and is_binary_storage(fs.name):
+        fs.close()
+        return BinaryStorageReader(fs.name)
+    return StorageReader(fs)
+
+def main(fi, fm, fs, code_dir):
+    s_reader = open_storage(fs)
+    code_map = parse_map(fm)
+    execute_txs(fi, s_reader, code_map, code_dir)
+    warn(execute.PROGRAMS)
+
+
+# Set once per worker process by the pool initializer
+_code_map     = None
+_code_dir     = None
+_storage_name = None
+
+def _init_worker(code_map, code_dir, storage_name):
+    global _code_map, _code_dir, _storage_name
+    _code_map     = code_map
+    _code_dir     = code_dir
+    _storage_name = storage_name
+
+def _execute_chunk(lines):
+    p0 = execute.PROGRAMS.hits, execute.PROGRAMS.misses, execute.PROGRAMS.evictions
+    fo = io.StringIO()
+    with open(_storage_name) as fs, contextlib.redirect_stdout(fo):
+        s_reader = open_storage(fs)
+        s_reader.seek_block(json.loads(lines[0])['Block'])
+        execute_txs(lines, s_reader, _code_map, _code_dir)
+    p1 = execute.PROGRAMS.hits, execute.PROGRAMS.misses, execute.PROGRAMS.evictions
+    return fo.getvalue(), tuple(b - a for a, b in zip(p0, p1))
+
+def read_chunks(fi, chunk_txs):
+    # Consecutive transactions, never splitting a block, so that each chunk is a block range
+    chunk = []
+    block = None
+    for line in fi:
+        b = json.loads(line)['Block']
+        if len(chunk) >= chunk_txs and b != block:
+            yield chunk
+            chunk = []
+        chunk.append(line)
+        block = b
+    if chunk:
+        yield chunk
+
+def main_parallel(fi, fm, fs, code_dir, workers, chunk_txs):
+    code_map = parse_map(fm)
+    fs.close()
+    pending  = deque()
+    with multiprocessing.Pool(workers, _init_worker, (code_map, code_dir, fs.name)) as pool:
+        def write_oldest():
+            out, stats = pending.popleft().get()
+            sys.stdout.write(out)
+            execute.PROGRAMS.hits      += stats[0]
+            execute.PROGRAMS.misses    += stats[1]
+            execute.PROGRAMS.evictions += stats[2]
+        # Keep a few chunks per worker in flight and write the results in order
+        for chunk in read_chunks(fi, chunk_txs):
+            pending.append(pool.apply_async(_execute_chunk, (chunk,)))
+            if len(pending) >= 2 * workers:
+                write_oldest()
+        while pending:
+            write_oldest()
+    warn(execute.PROGRAMS)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Simple EVM-like code execution')
     parser.add_argument('--input',    '-i', type=argparse.FileType('r'),                  help='input file with transcations to excecute')
     parser.add_argument('--addr-map', '-m', type=argparse.FileType('r'),                  help='input file with contract address to code hash pairs')
-    parser.add_argument('--storage',  '-s', type=argparse.FileType('r'),                  help='input file with accessed storage data per tx')
+    parser.add_argument('--storage',  '-s', type=argparse.FileType('r'),                  help='input file with accessed storage data per tx, text or binary (see storage_bin.py)')
     parser.add_argument('--code-dir', '-d', type=str,                    default='code/', help='directory with code files for each contract')
+    parser.add_argument('--cache-mb', '-c', type=int,                    default=256,     help='memory limit for the parsed code files kept, in MB')
+    parser.add_argument('--workers',  '-w', type=int,                    default=1,       help='number of worker processes, each executing a range of blocks')
+    parser.add_argument('--chunk',    '-k', type=int,                    default=1000,    help='minimum number of transcations per range of blocks given to a worker')
     args = parser.parse_args()
     #
     fi = args.input
@@ -118,4 +219,7 @@ if __name__ == '__main__':
     cd = args.code_dir
     if cd[-1] == '/': cd = cd[:-1]
     #
-    main(fi, fm, fs, cd)
+    execute.PROGRAMS.max_bytes = args.cache_mb * 1_000_000
+    #
+    if args.workers > 1: main_parallel(fi, fm, fs, cd, args.workers, args.chunk)
+    else:                main(fi, fm, fs, cd)
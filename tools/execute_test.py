@@ -0,0 +1,19 @@
+from execute import Program, ExecutionState, execute_with_jumps
+
+# The PHI picks register 7 for the edge from ~0, which nothing sets, and the code after it still runs
+PHI_UNSET = [
+    '~0 | ENTRY',
+    '1 = #10',
+    '2 = JUMP 1',
+    '~10 | ~0',
+    '3 = PHI 7',
+    '4 = #05',
+    '5 = SLOAD 4',
+    '[5]',
+]
+
+def phi_unset_arg_test():
+    ctx   = {'Block': 1, 'Index': 0}
+    state = ExecutionState()
+    assert execute_with_jumps(ctx, state, Program(PHI_UNSET))
+    assert state.sloads == {5}
@@ -0,0 +1,122 @@
+import sys
+import mmap
+import struct
+import argparse
+import tempfile
+
+from collections import defaultdict
+
+# Binary, tx-indexed form of the text storage access file read by execute_cli.StorageReader:
+#   header:   magic (8 bytes), number of txs (8 bytes), number of records (8 bytes)
+#   records:  contract (20 bytes), slot (32 bytes), value (32 bytes), grouped by tx in file order
+#   tx table: block (4 bytes), index (4 bytes), first record (8 bytes), number of records (4 bytes), sorted by tx
+# All integers are little endian, except contract, slot and value which are big endian like in the EVM.
+MAGIC    = b'ENVONST1'
+HEADER   = struct.Struct('<8sQQ')
+RECORD   = struct.Struct('<20s32s32s')
+TX_ENTRY = struct.Struct('<IIQI')
+
+def is_binary_storage(name):
+    with open(name, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def convert(fs, out_name):
+    txs = 0
+    n   = 0
+    with open(out_name, 'wb') as fo, tempfile.TemporaryFile() as ft:
+        fo.write(HEADER.pack(MAGIC, 0, 0))
+        tx = None
+        i0 = 0
+        for line in fs:
+            if line[0] != 'S': continue
+            ps = line.split()
+            if len(ps) == 4: ps.append('00')
+            [p0, p1, p2, p3, p4] = ps
+            assert p0 == 'S'
+            assert len(p3) == 120
+            assert 2 <= len(p4) <= 64
+            _tx = int(p1), int(p2)
+            if _tx != tx:
+                assert tx is None or _tx > tx, ('Storage file is not sorted', _tx, tx)
+                if tx is not None:
+                    ft.write(TX_ENTRY.pack(*tx, i0, n - i0))
+                    txs += 1
+                tx = _tx
+                i0 = n
+            fo.write(RECORD.pack(
+                bytes.fromhex(p3[  : 40]),
+                # p3[40:56] is ignored, like in StorageReader
+                bytes.fromhex(p3[56:120]),
+                int(p4, 16).to_bytes(32, 'big'),
+            ))
+            n += 1
+        if tx is not None:
+            ft.write(TX_ENTRY.pack(*tx, i0, n - i0))
+            txs += 1
+        #
+        ft.seek(0)
+        while True:
+            d = ft.read(1 << 20)
+            if not d: break
+            fo.write(d)
+        fo.seek(0)
+        fo.write(HEADER.pack(MAGIC, txs, n))
+    return txs, n
+
+
+class BinaryStorageReader:
+
+    def __init__(self, name):
+        with open(name, 'rb') as f:
+            self._m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._txs, self._records = HEADER.unpack_from(self._m, 0)
+        assert magic == MAGIC, magic
+        self._table = HEADER.size + self._records * RECORD.size
+        assert len(self._m) == self._table + self._txs * TX_ENTRY.size
+
+    def __len__(self):
+        return self._txs
+
+    def _tx_entry(self, i):
+        return TX_ENTRY.unpack_from(self._m, self._table + i * TX_ENTRY.size)
+
+    def _find(self, tx):
+        lo = 0
+        hi = self._txs
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._tx_entry(mid)[:2] < tx: lo = mid + 1
+            else:                            hi = mid
+        return lo
+
+    def seek_block(self, block):
+        # nothing to do, any tx can be read directly, see StorageReader.seek_block
+        pass
+
+    def read_for_this_tx(self, tx):
+        res = defaultdict(dict)
+        i   = self._find(tx)
+        if i < self._txs:
+            b, j, r0, c = self._tx_entry(i)
+            if (b, j) == tx:
+                m = self._m
+                for ca, sa, sc in RECORD.iter_unpack(m[HEADER.size + r0 * RECORD.size : HEADER.size + (r0 + c) * RECORD.size]):
+                    res[int.from_bytes(ca, 'big')][int.from_bytes(sa, 'big')] = int.from_bytes(sc, 'big')
+        return res
+
+    def close(self):
+        self._m.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert a storage access file to the binary form, which can be read at any tx')
+    parser.add_argument('--storage',  '-s', type=argparse.FileType('r'), help='input file with accessed storage data per tx')
+    parser.add_argument('--output',   '-o', type=str,                     help='binary file to write')
+    args = parser.parse_args()
+    #
+    if args.storage is None or args.output is None:
+        parser.print_usage()
+        sys.exit(1)
+    #
+    txs, n = convert(args.storage, args.output)
+    print(f'Converted {n} accesses of {txs} txs', file=sys.stderr)
@@ -0,0 +1,60 @@
+import io
+import os
+import tempfile
+
+from storage_bin import convert, BinaryStorageReader, is_binary_storage
+from execute_cli import StorageReader, open_storage
+
+def _line(block, index, contract, slot, value=None, ignored='00' * 8):
+    line = f'S {block} {index} {contract:040x}{ignored}{slot:064x}'
+    return line + ('' if value is None else f' {value:02x}') + '\n'
+
+# Sorted by tx, with other lines in between, a missing value, a full width value and the ignored middle part set
+STORAGE = ''.join([
+    'B 1\n',
+    _line(1, 0, 0xaa, 0, 5),
+    _line(1, 0, 0xaa, 1, 2 ** 256 - 1),
+    _line(1, 0, 0xbb, 0),
+    _line(1, 2, 0xaa, 0, 6, 'ff' * 8),
+    'B 3\n',
+    _line(3, 1, 0xcc, 2 ** 255, 7),
+    _line(3, 1, 0xcc, 2 ** 255, 8),
+])
+TXS = [(0, 5), (1, 0), (1, 1), (1, 2), (2, 0), (3, 1), (4, 0)]
+
+def _as_dict(res):
+    return {ca: dict(s) for ca, s in res.items()}
+
+def round_trip_test():
+    # The binary form reads the same storage as the text one for every tx, also for the txs it has no records of
+    with tempfile.TemporaryDirectory() as d:
+        name = os.path.join(d, 'storage.bin')
+        assert convert(io.StringIO(STORAGE), name) == (3, 6)
+        assert is_binary_storage(name)
+        r  = BinaryStorageReader(name)
+        rt = StorageReader(io.StringIO(STORAGE))
+        assert len(r) == 3
+        for tx in TXS:
+            assert _as_dict(r.read_for_this_tx(tx)) == _as_dict(rt.read_for_this_tx(tx)), tx
+        assert _as_dict(r.read_for_this_tx((1, 0))) == {0xaa: {0: 5, 1: 2 ** 256 - 1}, 0xbb: {0: 0}}
+        assert _as_dict(r.read_for_this_tx((1, 1))) == {}
+        rt.seek_block(3)
+        assert _as_dict(r.read_for_this_tx((3, 1))) == _as_dict(rt.read_for_this_tx((3, 1))) == {0xcc: {2 ** 255: 8}}
+        r.close()
+
+def open_storage_test():
+    # A text file read through a pipe (as from `-s <(zcat ...)` or `-s -`) keeps all its lines, a binary file is detected
+    r, w = os.pipe()
+    with os.fdopen(w, 'w') as fw:
+        fw.write(STORAGE)
+    with os.fdopen(r) as fs:
+        rt = open_storage(fs)
+        assert isinstance(rt, StorageReader)
+        assert _as_dict(rt.read_for_this_tx((1, 2))) == {0xaa: {0: 6}}
+    with tempfile.TemporaryDirectory() as d:
+        name = os.path.join(d, 'storage.bin')
+        convert(io.StringIO(STORAGE), name)
+        r = open_storage(open(name)) # pylint: disable=consider-using-with
+        assert isinstance(r, BinaryStorageReader)
+        assert _as_dict(r.read_for_this_tx((1, 2))) == {0xaa: {0: 6}}
+        r.close()